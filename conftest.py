@@ -0,0 +1,9 @@
+"""
+Test setup: importing src creates the storage backend, so point it at a throwaway SQLite file
+"""
+import os
+import tempfile
+
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="bot-tests-"), "bot.db"))
+os.environ.setdefault("CACHE_BACKEND", "memory")
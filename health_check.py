@@ -1,6 +1,7 @@
 """
 Health check endpoint for Render
 """
+import json
 import os
 import threading
 import time
@@ -8,6 +9,8 @@ import socket
 from http.server import BaseHTTPRequestHandler, HTTPServer
 import logging
 
+from src.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 class HealthHandler(BaseHTTPRequestHandler):
@@ -17,6 +20,11 @@ class HealthHandler(BaseHTTPRequestHandler):
             self.send_header('Content-type', 'application/json')
             self.end_headers()
             self.wfile.write(b'{"status": "ok", "service": "telegram-bot"}')
+        elif self.path == '/metrics':
+            self.send_response(200)
+            self.send_header('Content-type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps(metrics.snapshot()).encode())
         else:
             self.send_response(404)
             self.end_headers()
@@ -49,22 +57,22 @@ def run_health_server():
     available_port = find_available_port(port)
     
     if available_port != port:
-        print(f"⚠️ Port {port} is in use, using port {available_port} instead")
+        logger.warning(f"⚠️ Port {port} is in use, using port {available_port} instead")
     
     try:
         server = HTTPServer(('0.0.0.0', available_port), HealthHandler)
-        print(f'✅ Health check server running on port {available_port}')
+        logger.info(f'✅ Health check server running on port {available_port}')
         server.serve_forever()
     except OSError as e:
-        print(f"❌ Failed to start health server on port {available_port}: {e}")
+        logger.error(f"❌ Failed to start health server on port {available_port}: {e}")
         # Try one more time with random port
         try:
             server = HTTPServer(('0.0.0.0', 0), HealthHandler)
             actual_port = server.server_address[1]
-            print(f'✅ Health check server running on random port {actual_port}')
+            logger.info(f'✅ Health check server running on random port {actual_port}')
             server.serve_forever()
         except Exception as e2:
-            print(f"❌ Failed to start health server: {e2}")
+            logger.error(f"❌ Failed to start health server: {e2}")
 
 def start_health_server():
     """Start health server in a separate thread."""
@@ -5,6 +5,10 @@ A bot to track daily targets for group members.
 __version__ = "1.0.0"
 __author__ = "Target Tracker Bot"
 
+# Configure logging before the database module connects (and logs) on import
+from src.logs import setup_logging
+setup_logging()
+
 # Import key components for easier access
 from src.database import db
 from src.utils import is_admin, format_targets_message
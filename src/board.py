@@ -0,0 +1,200 @@
+"""
+Opt-in live /today board: one pinned message per group and day, edited in place
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes, CommandHandler
+
+from src.database import db
+from src.gate import update_gate
+from src.utils import format_targets_pages, is_admin
+
+logger = logging.getLogger(__name__)
+
+# Seconds changes are collected before the board is edited, so a burst of /done is one edit
+LIVE_BOARD_DEBOUNCE = float(os.getenv("LIVE_BOARD_DEBOUNCE", "5"))
+# Seconds a group's opt-in state is trusted before it is read again (it may change on another replica)
+LIVE_BOARD_STATE_TTL = 60
+
+# group_id -> (enabled, monotonic time it was read)
+_enabled = {}
+# Groups with a refresh scheduled or running
+_pending = set()
+# Groups that changed while their refresh was running, refreshed again once it is done
+_rerun = set()
+
+
+def _today() -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _remember(group_id: int, enabled: bool):
+    _enabled[group_id] = (enabled, time.monotonic())
+
+
+def is_board_enabled(group_id: int) -> bool:
+    """Whether a group uses the live board (cached for LIVE_BOARD_STATE_TTL)"""
+    cached = _enabled.get(group_id)
+    if cached and time.monotonic() - cached[1] < LIVE_BOARD_STATE_TTL:
+        return cached[0]
+
+    try:
+        enabled = db.get_live_board(group_id) is not None
+    except Exception as e:
+        logger.error(f"Error loading live board of {group_id}: {e}")
+        return False
+    _remember(group_id, enabled)
+    return enabled
+
+
+def request_board_refresh(context: ContextTypes.DEFAULT_TYPE, group_id: int, delay: float = LIVE_BOARD_DEBOUNCE):
+    """Schedule an edit of the group's board; requests while one is pending are merged into it"""
+    if group_id in _pending:
+        _rerun.add(group_id)
+        return
+    if not context.job_queue or not is_board_enabled(group_id):
+        return
+    _pending.add(group_id)
+    context.job_queue.run_once(refresh_board, delay, chat_id=group_id, name=f"board_{group_id}")
+
+
+def _board_text(targets) -> str:
+    pages = format_targets_pages(targets)
+    text = f"📌 *Live board* (updated {datetime.now():%H:%M})\n\n" + pages[0]
+    if len(pages) > 1:
+        text += "\n➡️ /today shows every page"
+    return text
+
+
+async def _post_board(bot, group_id: int, text: str, old_message_id=None):
+    """Send and pin a new board message, replacing the previous one (the caller claimed the post)"""
+    try:
+        message = await bot.send_message(chat_id=group_id, text=text, parse_mode="Markdown")
+    except Exception:
+        # Give up the claim so the next refresh can post it
+        await asyncio.to_thread(db.set_live_board_message, group_id, None, None)
+        raise
+    try:
+        await bot.pin_chat_message(chat_id=group_id, message_id=message.message_id, disable_notification=True)
+    except Exception as e:
+        logger.warning(f"⚠️ Couldn't pin live board in {group_id} (bot needs pin permission): {e}")
+    if old_message_id:
+        try:
+            await bot.unpin_chat_message(chat_id=group_id, message_id=old_message_id)
+        except Exception:
+            pass  # Already deleted or unpinned
+    await asyncio.to_thread(db.set_live_board_message, group_id, message.message_id, _today())
+
+
+async def refresh_board(context: ContextTypes.DEFAULT_TYPE):
+    """Edit the group's board, then refresh it again if it changed meanwhile"""
+    group_id = context.job.chat_id
+    _rerun.discard(group_id)
+    try:
+        await _refresh_board(context.bot, group_id)
+    finally:
+        _pending.discard(group_id)
+        if group_id in _rerun:
+            _rerun.discard(group_id)
+            request_board_refresh(context, group_id)
+
+
+async def _refresh_board(bot, group_id: int):
+    """Edit the group's board with today's targets, or post a new one (new day, or the old one was deleted)"""
+    try:
+        board = await asyncio.to_thread(db.get_live_board, group_id)
+        _remember(group_id, board is not None)
+        if board is None:
+            return
+        text = _board_text(await asyncio.to_thread(db.get_all_targets, group_id))
+    except Exception as e:
+        logger.error(f"Error loading live board of {group_id}: {e}")
+        return
+
+    today = _today()
+    stale_message_id = None
+    if board.get("message_id") and board.get("date") == today:
+        try:
+            await bot.edit_message_text(
+                text, chat_id=group_id, message_id=board["message_id"], parse_mode="Markdown"
+            )
+            return
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                return
+            # e.g. "Message to edit not found": the board was deleted, post it again
+            logger.info(f"📌 Recreating live board of {group_id}: {e}")
+            stale_message_id = board["message_id"]
+        except Exception as e:
+            logger.warning(f"Couldn't edit live board of {group_id}: {e}")
+            return
+
+    # Another replica may be posting the same board right now: only one claim wins
+    try:
+        if not await asyncio.to_thread(db.claim_live_board_post, group_id, today, stale_message_id):
+            return
+    except Exception as e:
+        logger.error(f"Error claiming live board of {group_id}: {e}")
+        return
+
+    try:
+        await _post_board(bot, group_id, text, board.get("message_id"))
+    except Exception as e:
+        logger.warning(f"Couldn't post live board in {group_id}: {e}")
+
+
+async def live_board_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Turn the group's live /today board on or off (admin only)"""
+    if not update.message:
+        return
+
+    group_id = update.message.chat.id
+
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+
+    # Check if user is admin
+    if not await is_admin(update, context):
+        await update.message.reply_text("🚫 This command is for admins only!")
+        return
+
+    value = context.args[0].lower() if context.args else ""
+    if value not in ("on", "off"):
+        await update.message.reply_text("❌ Usage: /liveboard on or /liveboard off")
+        return
+
+    if value == "off":
+        board = db.get_live_board(group_id)
+        db.set_live_board(group_id, False)
+        _remember(group_id, False)
+        if board and board.get("message_id"):
+            try:
+                await context.bot.unpin_chat_message(chat_id=group_id, message_id=board["message_id"])
+            except Exception:
+                pass
+        await update.message.reply_text("📌 Live board disabled.")
+        return
+
+    # Already on: keep the current board message
+    if db.get_live_board(group_id) is None and not db.set_live_board(group_id, True):
+        await update.message.reply_text("❌ This group isn't set up yet. Use /start first.")
+        return
+
+    _remember(group_id, True)
+    request_board_refresh(context, group_id, delay=0)
+    await update.message.reply_text(
+        "📌 Live board enabled! Today's targets are pinned and updated as members add or complete them."
+    )
+
+
+def setup_board_handlers(application):
+    """Setup live board handlers"""
+    application.add_handler(CommandHandler("liveboard", live_board_command))
@@ -3,17 +3,18 @@ Main bot file - Entry point for the bot
 """
 import os
 import logging
+from datetime import time
 from dotenv import load_dotenv
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, filters, CallbackQueryHandler
+
+from src.logs import setup_logging
 
 # Load environment variables
 load_dotenv()
 
-# Enable logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Enable logging (JSON lines on stdout, written off the event loop)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -24,27 +25,57 @@ def main():
     if not BOT_TOKEN:
         raise ValueError("❌ BOT_TOKEN environment variable is required!")
     
-    print("=" * 60)
-    print("🤖 Starting Target Tracker Bot")
-    print("=" * 60)
-    print(f"✅ Bot Token: {'✓ Set' if BOT_TOKEN else '✗ Missing'}")
+    logger.info("🤖 Starting Target Tracker Bot")
+    logger.info(f"✅ Bot Token: {'✓ Set' if BOT_TOKEN else '✗ Missing'}")
     
     # Import after environment is loaded
     from src.database import db
-    print(f"✅ MongoDB: {'Connected ✓' if db.client else 'Not Connected ✗'}")
+    logger.info(f"✅ MongoDB: {'Connected ✓' if db.client else 'Not Connected ✗'}")
     
     from src.handlers import (
         start, add_target, add_target_for_user, my_target,
-        today_targets, my_targets, mark_done, reset_data,
-        reset_callback, bot_status, help_command,
-        handle_group_message, error_handler
+        today_targets, my_targets, my_stats, leaderboard, mark_done, reset_data,
+        RESET_CALLBACK, reset_callback, TODAY_PAGE_CALLBACK, today_page_callback, bot_status, export_data, help_command,
+        handle_group_message, error_handler, archive_old_data_job
     )
     from src.registration import setup_registration_handlers, check_muted_users
     from src.sentences import setup_sentence_handlers
+    from src.triggers import setup_trigger_handlers
+    from src.nudges import setup_nudge_handlers
+    from src.board import setup_board_handlers
+    from src.warmup import warmup
+    from src.digest import DIGEST_HOUR, DIGEST_WEEKDAY, weekly_digest_job, resume_digest_round
+    from src import jobs
+    from src.persistence import DatabasePersistence
+    from src.ratelimit import rate_limit_commands
+    from src.callbacks import router
+    from src.gate import attach_update_gate
+    from src.metrics import MeteredApplication, count_db_calls
+    from src.tracing import TracedRequest
+    from health_check import start_health_server
+    
+    # Serve /health and /metrics from this process, so the metrics are the bot's own
+    count_db_calls(db)
+    start_health_server()
+    
+    # Create Application (warmup runs after initialization, before polling starts)
+    # user_data/chat_data (e.g. in-flight registrations) are persisted in the database
+    application = (
+        Application.builder()
+        .application_class(MeteredApplication)
+        .token(BOT_TOKEN)
+        .request(TracedRequest(connection_pool_size=256))
+        .persistence(DatabasePersistence())
+        .post_init(warmup)
+        .build()
+    )
+    logger.info("✅ Application created")
+    
+    # Each update gets a gate that looks up group/member state at most once (group -2, first of all)
+    application.add_handler(TypeHandler(Update, attach_update_gate), group=-2)
     
-    # Create Application
-    application = Application.builder().token(BOT_TOKEN).build()
-    print("✅ Application created")
+    # Rate limiting runs in group -1, before every command handler
+    application.add_handler(TypeHandler(Update, rate_limit_commands), group=-1)
     
     # Register command handlers for groups
     application.add_handler(CommandHandler("start", start, filters=filters.ChatType.GROUP | filters.ChatType.SUPERGROUP))
@@ -55,56 +86,58 @@ def main():
     application.add_handler(CommandHandler("today", today_targets))
     application.add_handler(CommandHandler("mytargets", my_targets))
     application.add_handler(CommandHandler("done", mark_done))
+    application.add_handler(CommandHandler("stats", my_stats))
+    application.add_handler(CommandHandler("leaderboard", leaderboard))
     application.add_handler(CommandHandler("reset", reset_data))
     application.add_handler(CommandHandler("status", bot_status))
+    application.add_handler(CommandHandler("export", export_data))
     
-    # Register callback handler for reset confirmation
-    application.add_handler(CallbackQueryHandler(reset_callback, pattern="^reset_"))
+    # Every button goes through one dispatcher; modules register their routes on `router`
+    application.add_handler(CallbackQueryHandler(router.dispatch))
+    
+    # Reset confirmation is non-blocking so other groups' updates keep flowing while a reset runs
+    router.add(RESET_CALLBACK, reset_callback, str, legacy="reset_", block=False)
+    router.add(TODAY_PAGE_CALLBACK, today_page_callback, int)
     
     # Register message handler for groups
     application.add_handler(MessageHandler(filters.ChatType.GROUP & filters.TEXT & ~filters.COMMAND, handle_group_message))
     
     # Setup registration handlers
-    print("🔄 Setting up registration handlers...")
+    logger.info("🔄 Setting up registration handlers...")
     setup_registration_handlers(application)
     
     # Setup sentence handlers
-    print("🔄 Setting up sentence handlers...")
+    logger.info("🔄 Setting up sentence handlers...")
     setup_sentence_handlers(application)
     
+    # Setup keyword trigger handlers
+    logger.info("🔄 Setting up trigger handlers...")
+    setup_trigger_handlers(application)
+    
+    # Setup daily target reminders
+    logger.info("🔄 Setting up target reminders...")
+    setup_nudge_handlers(application)
+    
+    # Setup live /today board
+    setup_board_handlers(application)
+    
     # Register error handler
     application.add_error_handler(error_handler)
     
     # Setup job queue for checking muted users
+    # Durable jobs: their schedule is persisted, and each run happens on one replica only
     job_queue = application.job_queue
     if job_queue:
-        job_queue.run_repeating(check_muted_users, interval=1800, first=10)
-        print("✅ Scheduled job for muted users check")
-    
-    # Get allowed group info
-    allowed_group = db.get_allowed_group()
-    if allowed_group:
-        print(f"✅ Authorized Group: {allowed_group['group_name']} (ID: {allowed_group['group_id']})")
-    else:
-        print("⚠️ No group authorized yet. Bot will work in the first group it's added to.")
-    
-    print("=" * 60)
-    print("📋 Bot Features:")
-    print("  ✅ New member auto-mute")
-    print("  ✅ Registration via DM with inline buttons")
-    print("  ✅ Declaration acceptance system")
-    print("  ✅ Auto-unmute after registration")
-    print("  ✅ Target tracking system")
-    print("  ✅ Sentence sharing with categories")
-    print("=" * 60)
-    print("🔧 Important Requirements:")
-    print("  1. Bot MUST be admin in the group")
-    print("  2. Bot needs these admin permissions:")
-    print("     • Delete messages")
-    print("     • Restrict members")
-    print("     • Ban members")
-    print("=" * 60)
-    print("🚀 Bot is starting...")
+        jobs.run_repeating(job_queue, check_muted_users, interval=1800, name="check_muted_users", first=10)
+        logger.info("✅ Scheduled job for muted users check")
+        jobs.run_daily(job_queue, archive_old_data_job, time(hour=3), name="archive_old_data")
+        logger.info("✅ Scheduled nightly archive job")
+        jobs.run_daily(job_queue, weekly_digest_job, time(hour=DIGEST_HOUR), name="weekly_digest", days=(DIGEST_WEEKDAY,))
+        resume_digest_round(job_queue)
+        logger.info("✅ Scheduled weekly digest job")
+    
+    logger.info("🔧 The bot must be a group admin with permission to delete messages, restrict and ban members")
+    logger.info("🚀 Bot is starting...")
     
     # Run the bot
     application.run_polling(allowed_updates=None, drop_pending_updates=True)
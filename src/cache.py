@@ -0,0 +1,337 @@
+"""
+In-process caches used by the database layer, and the cache tier shared by replicas
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry"""
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        # DB methods may be called from worker threads as well as the event loop
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def discard_where(self, predicate):
+        """Drop every entry whose key matches the predicate"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+
+class DailyLRUCache(LRUCache):
+    """LRU cache whose entries are all dropped when the local date changes"""
+
+    def __init__(self, maxsize: int = 1024):
+        super().__init__(maxsize)
+        self._day = date.today()
+
+    def _roll_over(self):
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self.clear()
+
+    def get(self, key, default=None):
+        self._roll_over()
+        return super().get(key, default)
+
+    def set(self, key, value):
+        self._roll_over()
+        super().set(key, value)
+
+
+# === SHARED CACHE TIER ===
+
+# Identifies this process, so replicas ignore their own invalidation messages
+REPLICA_ID = uuid.uuid4().hex
+# Seconds to wait before re-subscribing after the Redis connection dropped
+SUBSCRIBE_RETRY_DELAY = 5
+# Connect/read timeout of cache calls; they run on the event loop, so a slow Redis must not stall it
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.5"))
+# Seconds the shared cache is skipped (reads miss, writes are dropped) after a failed call
+REDIS_FAILURE_BACKOFF = float(os.getenv("REDIS_FAILURE_BACKOFF", "30"))
+
+
+class RedisError(Exception):
+    """Error reply from the Redis server"""
+
+
+class SharedCache(ABC):
+    """Key/value cache shared by every bot replica, plus a channel to broadcast
+    invalidations of the replicas' in-process caches.
+
+    Values must be JSON serializable. Listeners get the message dicts published
+    by other replicas (never this one's, which already applied them locally).
+    """
+
+    def __init__(self):
+        self._listeners = []
+
+    @abstractmethod
+    def get(self, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key: str, value, ttl: int = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def publish(self, message: dict):
+        raise NotImplementedError
+
+    def subscribe(self, listener):
+        """Call listener(message) for every invalidation published by another replica"""
+        self._listeners.append(listener)
+
+    def _dispatch(self, message: dict):
+        for listener in self._listeners:
+            try:
+                listener(message)
+            except Exception as e:
+                logger.error(f"Error handling cache invalidation {message}: {e}")
+
+
+class MemoryCache(SharedCache):
+    """Single-replica shared cache: a TTL dict, and no other replica to notify"""
+
+    def __init__(self):
+        super().__init__()
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value, ttl: int = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl if ttl else None, value)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def publish(self, message: dict):
+        pass
+
+
+class RedisConnection:
+    """Minimal blocking RESP2 client, enough for GET/SET/DEL and pub/sub"""
+
+    def __init__(self, url: str, timeout: float = 5):
+        parsed = urlparse(url)
+        self._sock = socket.create_connection((parsed.hostname or "localhost", parsed.port or 6379), timeout=timeout)
+        self._file = self._sock.makefile("rb")
+        if parsed.password:
+            self.execute(*filter(None, ["AUTH", parsed.username, parsed.password]))
+        if parsed.path.strip("/"):
+            self.execute("SELECT", parsed.path.strip("/"))
+
+    def send(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._sock.sendall(b"".join(parts))
+
+    def read_reply(self):
+        line = self._file.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RedisError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            return None if length < 0 else self._file.read(length + 2)[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def execute(self, *args):
+        self.send(*args)
+        return self.read_reply()
+
+    def close(self):
+        try:
+            self._sock.close()
+        except OSError:
+            pass
+
+
+class RedisCache(SharedCache):
+    """Shared cache on a Redis-protocol server (Redis, Valkey, KeyDB...).
+
+    Cache errors never reach the callers: reads miss and writes are dropped,
+    so a Redis outage only costs extra DB and API calls. Calls time out after
+    REDIS_TIMEOUT, and after a failure Redis is skipped for REDIS_FAILURE_BACKOFF.
+    """
+
+    def __init__(self, url: str, channel: str = "studybot:invalidate", prefix: str = "studybot:"):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self.prefix = prefix
+        self._conn = None
+        self._lock = threading.Lock()
+        self._subscriber = None
+        # Monotonic time until which calls are skipped after a failure
+        self._down_until = 0
+
+    def _execute(self, *args):
+        with self._lock:
+            reused = self._conn is not None
+            try:
+                if self._conn is None:
+                    self._conn = RedisConnection(self.url, timeout=REDIS_TIMEOUT)
+                return self._conn.execute(*args)
+            except (socket.timeout, ConnectionRefusedError):
+                self._drop_connection()
+                raise
+            except OSError:
+                self._drop_connection()
+                if not reused:
+                    raise
+            # An idle connection may have been closed by the server: retry once on a fresh one
+            try:
+                self._conn = RedisConnection(self.url, timeout=REDIS_TIMEOUT)
+                return self._conn.execute(*args)
+            except OSError:
+                self._drop_connection()
+                raise
+
+    def _drop_connection(self):
+        if self._conn:
+            self._conn.close()
+        self._conn = None
+
+    def _call(self, action: str, *args):
+        """Run a command, or return None if it failed or Redis is backing off"""
+        if time.monotonic() < self._down_until:
+            return None
+        try:
+            return self._execute(*args)
+        except (OSError, RedisError) as e:
+            self._down_until = time.monotonic() + REDIS_FAILURE_BACKOFF
+            logger.error(f"Error {action} shared cache, skipping it for {REDIS_FAILURE_BACKOFF:g}s: {e}")
+            return None
+
+    def get(self, key: str):
+        data = self._call("reading", "GET", self.prefix + key)
+        return None if data is None else json.loads(data)
+
+    def set(self, key: str, value, ttl: int = None):
+        args = ["SET", self.prefix + key, json.dumps(value)]
+        if ttl:
+            args += ["EX", int(ttl)]
+        self._call("writing", *args)
+
+    def delete(self, key: str):
+        self._call("writing", "DEL", self.prefix + key)
+
+    def publish(self, message: dict):
+        self._call("publishing to", "PUBLISH", self.channel, json.dumps({**message, "origin": REPLICA_ID}))
+
+    def subscribe(self, listener):
+        super().subscribe(listener)
+        if self._subscriber is None:
+            self._subscriber = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+            self._subscriber.start()
+
+    def _listen(self):
+        """Dispatch invalidations from other replicas, reconnecting forever"""
+        subscribed_before = False
+        while True:
+            conn = None
+            try:
+                conn = RedisConnection(self.url, timeout=None)
+                conn.send("SUBSCRIBE", self.channel)
+                while True:
+                    reply = conn.read_reply()
+                    if reply[0] == b"subscribe":
+                        # Messages sent while we were disconnected are lost: drop everything
+                        if subscribed_before:
+                            self._dispatch({"kind": "all"})
+                        subscribed_before = True
+                    elif reply[0] == b"message":
+                        message = json.loads(reply[2])
+                        if message.get("origin") != REPLICA_ID:
+                            self._dispatch(message)
+            except (OSError, RedisError, ValueError) as e:
+                logger.warning(f"⚠️ Cache invalidation channel lost ({e}), retrying in {SUBSCRIBE_RETRY_DELAY}s")
+            finally:
+                if conn:
+                    conn.close()
+            time.sleep(SUBSCRIBE_RETRY_DELAY)
+
+
+def create_shared_cache() -> SharedCache:
+    """Create the shared cache selected by CACHE_BACKEND (memory or redis)"""
+    if os.getenv("CACHE_BACKEND", "memory").lower() == "redis":
+        return RedisCache(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            channel=os.getenv("CACHE_CHANNEL", "studybot:invalidate")
+        )
+    return MemoryCache()
+
+
+shared_cache = create_shared_cache()
@@ -0,0 +1,115 @@
+"""
+Single callback query dispatcher with a compact, versioned callback-data codec
+"""
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Callback data is "<version><code>" followed by ":<arg>" per argument, e.g. "1l:65f0c3...";
+# bump the version if the layout ever changes, old buttons then go through the legacy parser
+CODEC_VERSION = "1"
+ARG_SEPARATOR = ":"
+# Telegram rejects callback data longer than this (in bytes)
+MAX_CALLBACK_DATA = 64
+
+
+def encode_callback(code: str, *args) -> str:
+    """Pack a route code and its arguments into callback data"""
+    parts = [str(arg) for arg in args]
+    # The last argument is taken as-is, so it may contain the separator (e.g. free-form category names)
+    if any(ARG_SEPARATOR in part for part in parts[:-1]):
+        raise ValueError(f"Callback argument can't contain {ARG_SEPARATOR!r}: {parts}")
+    data = ARG_SEPARATOR.join([CODEC_VERSION + code, *parts])
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f"Callback data too long: {data}")
+    return data
+
+
+class CallbackRoute:
+    __slots__ = ("code", "handler", "arg_types", "block")
+
+    def __init__(self, code: str, handler, arg_types, block: bool):
+        self.code = code
+        self.handler = handler
+        self.arg_types = arg_types
+        self.block = block
+
+    def parse(self, args):
+        """Convert raw string arguments to the route's types (ValueError if they don't fit)"""
+        if len(args) != len(self.arg_types):
+            raise ValueError(f"Expected {len(self.arg_types)} argument(s), got {len(args)}")
+        return [arg_type(arg) for arg_type, arg in zip(self.arg_types, args)]
+
+
+class CallbackRouter:
+    """Routes every callback query with one dict lookup on its code.
+
+    Buttons sent before the codec existed carry "prefix_arg" data; those are
+    matched by longest prefix in a character trie of the legacy prefixes.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._legacy = {}
+
+    def add(self, code: str, handler, *arg_types, legacy: str = None, block: bool = True):
+        """Route callback data with this code to handler(update, context, *typed_args).
+
+        legacy is the old "prefix_" (or exact data) the route's buttons used to carry.
+        block=False runs the handler as a task, so long handlers don't hold up other updates.
+        """
+        if code in self._routes or ARG_SEPARATOR in code:
+            raise ValueError(f"Invalid or duplicate callback code: {code!r}")
+        route = self._routes[code] = CallbackRoute(code, handler, arg_types, block)
+
+        if legacy:
+            node = self._legacy
+            for char in legacy:
+                node = node.setdefault(char, {})
+            node[None] = route
+        return route
+
+    def resolve(self, data: str):
+        """Find the route and raw arguments for callback data, or (None, None)"""
+        if data.startswith(CODEC_VERSION):
+            code, separator, rest = data[len(CODEC_VERSION):].partition(ARG_SEPARATOR)
+            route = self._routes.get(code)
+            if route:
+                return route, rest.split(ARG_SEPARATOR, max(len(route.arg_types) - 1, 0)) if separator else []
+
+        # Legacy "prefix_arg" data: longest registered prefix wins, the rest is the argument
+        node, match, matched_length = self._legacy, None, 0
+        for i, char in enumerate(data):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                match, matched_length = node[None], i + 1
+        if match is None:
+            return None, None
+        rest = data[matched_length:]
+        return match, [rest] if rest else []
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """CallbackQueryHandler callback for every button of the bot"""
+        query = update.callback_query
+        route, args = self.resolve(query.data or "")
+
+        try:
+            if route is None:
+                raise ValueError(f"No route for callback data {query.data!r}")
+            args = route.parse(args)
+        except ValueError as e:
+            logger.warning(f"⚠️ Unroutable callback: {e}")
+            await query.answer("⌛ This button is no longer valid.", show_alert=True)
+            return
+
+        if route.block:
+            await route.handler(update, context, *args)
+        else:
+            context.application.create_task(route.handler(update, context, *args), update=update)
+
+
+router = CallbackRouter()
@@ -1,16 +1,71 @@
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from pymongo import DeleteOne, IndexModel, MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, ConnectionFailure, DuplicateKeyError
 from dotenv import load_dotenv
-from bson import ObjectId
+from bson import Binary, ObjectId
+
+from src.storage import LEADERBOARD_PERIODS, STREAK_PERIOD, StorageBackend, leaderboard_period
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# (collection, keys, options) for every index the bot relies on; verified at startup
+INDEXES = [
+    ("users", [("user_id", 1)], {"unique": True}),
+    ("targets", [("user_id", 1), ("date", 1)], {"unique": True}),
+    ("targets", [("group_id", 1), ("date", 1)], {}),
+    # Oldest-first batches of the archive job
+    ("targets", [("date", 1)], {}),
+    ("group_settings", [("group_id", 1)], {"unique": True}),
+    ("registrations", [("user_id", 1), ("group_id", 1)], {"unique": True}),
+    # Covering index for the hot verification/status checks
+    ("registrations", [("user_id", 1), ("group_id", 1), ("status", 1)], {}),
+    # Per-group member listings: pending checks, warmup, digests
+    ("registrations", [("group_id", 1), ("status", 1), ("verified_at", 1)], {}),
+    ("muted_users", [("user_id", 1), ("group_id", 1)], {"unique": True}),
+    ("muted_users", [("muted_until", 1)], {"expireAfterSeconds": 0}),
+    # Covering index for the hot mute check
+    ("muted_users", [("user_id", 1), ("group_id", 1), ("muted_until", 1)], {}),
+    ("sentences", [("user_id", 1), ("group_id", 1)], {}),
+    ("sentences", [("created_at", 1)], {}),
+    ("sentences", [("group_id", 1), ("created_at", -1)], {}),
+    # Text index for /search; group_id is an equality prefix, so each search only walks one group's postings
+    ("sentences", [("group_id", 1), ("sentence", "text")], {"name": "group_sentence_text"}),
+    ("sentence_categories", [("group_id", 1), ("name", 1)], {"unique": True}),
+    ("triggers", [("group_id", 1), ("keyword", 1)], {"unique": True}),
+    ("leaderboard", [("group_id", 1), ("period", 1), ("user_id", 1)], {"unique": True}),
+    # Ranked order of a group's period: top-N reads walk the first N keys and stop
+    ("leaderboard", [("group_id", 1), ("period", 1), ("rate", -1), ("streak", -1)], {}),
+]
+
+# Projections: each read asks only for the fields its callers render
+TARGET_FIELDS = {"_id": 0, "username": 1, "target": 1, "date": 1, "created_at": 1, "completed": 1, "completed_at": 1}
+SENTENCE_FIELDS = {"sentence": 1, "username": 1, "category": 1, "likes": 1, "created_at": 1}
+# Existence checks project only indexed fields (and drop _id) so they are covered queries
+REGISTRATION_FIELDS = {"_id": 0, "status": 1}
+
+# Cold archive: collection -> date field that decides a document's age
+ARCHIVED_COLLECTIONS = {"targets": "date", "sentences": "created_at"}
+DUPLICATE_KEY_ERROR = 11000
+
+# Collections holding per-group data, all cleared by a group reset
+GROUP_COLLECTIONS = [
+    "targets", "group_settings", "registrations", "muted_users", "sentences", "sentence_categories", "triggers",
+    "leaderboard"
+]
+# Collections purged at once by a group reset, so archive partitions don't all hit the server together
+RESET_WORKERS = 4
 
-class MongoDB:
+
+class MongoDB(StorageBackend):
     def __init__(self):
+        super().__init__()
         self.mongo_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
         self.db_name = os.getenv("DB_NAME", "telegram_target_bot")
         self.client = None
@@ -23,45 +78,27 @@ class MongoDB:
             # Test connection
             self.client.admin.command('ping')
             self.db = self.client[self.db_name]
-            self._create_collections()
-            print("✅ Connected to MongoDB successfully!")
+            # Before anything can use the bot: claim_job and /search depend on the unique and text indexes
+            self.index_timings = self.ensure_indexes()
+            logger.info("✅ Connected to MongoDB successfully!")
         except ConnectionFailure as e:
-            print(f"❌ MongoDB connection failed: {e}")
+            logger.error(f"❌ MongoDB connection failed: {e}")
     
-    def _create_collections(self):
-        # Create collections if they don't exist
-        collections = self.db.list_collection_names()
-        
-        if "users" not in collections:
-            self.db.create_collection("users")
-            self.db.users.create_index("user_id", unique=True)
-        
-        if "targets" not in collections:
-            self.db.create_collection("targets")
-            self.db.targets.create_index([("user_id", 1), ("date", 1)], unique=True)
-            self.db.targets.create_index([("group_id", 1), ("date", 1)])
-        
-        if "group_settings" not in collections:
-            self.db.create_collection("group_settings")
-            self.db.group_settings.create_index("group_id", unique=True)
+    def ensure_indexes(self) -> Dict[str, float]:
+        """Create any missing indexes, one worker per collection; returns seconds taken per collection"""
+        by_collection = {}
+        for collection, keys, options in INDEXES:
+            by_collection.setdefault(collection, []).append(IndexModel(keys, **options))
         
-        if "registrations" not in collections:
-            self.db.create_collection("registrations")
-            self.db.registrations.create_index([("user_id", 1), ("group_id", 1)], unique=True)
+        def create(collection):
+            started = time.perf_counter()
+            # create_indexes is idempotent: existing indexes are only verified
+            self.db[collection].create_indexes(by_collection[collection])
+            return time.perf_counter() - started
         
-        if "muted_users" not in collections:
-            self.db.create_collection("muted_users")
-            self.db.muted_users.create_index([("user_id", 1), ("group_id", 1)], unique=True)
-            self.db.muted_users.create_index("muted_until", expireAfterSeconds=0)
-        
-        if "sentences" not in collections:
-            self.db.create_collection("sentences")
-            self.db.sentences.create_index([("user_id", 1), ("group_id", 1)])
-            self.db.sentences.create_index("created_at")
-        
-        if "sentence_categories" not in collections:
-            self.db.create_collection("sentence_categories")
-            self.db.sentence_categories.create_index([("group_id", 1), ("name", 1)], unique=True)
+        with ThreadPoolExecutor(max_workers=len(by_collection)) as pool:
+            timings = dict(zip(by_collection, pool.map(create, by_collection)))
+        return timings
     
     # === TARGET FUNCTIONS ===
     
@@ -81,20 +118,29 @@ class MongoDB:
         }
         
         try:
-            self.db.targets.update_one(
+            previous = self.db.targets.find_one_and_update(
                 {"user_id": user_id, "date": date},
-                {"$set": target_data},
+                {"$set": target_data, "$unset": {"completed_at": ""}},
+                projection={"_id": 0, "completed": 1},
                 upsert=True
             )
+            # A new target counts as set; replacing a completed one takes the completion back
+            if previous is None:
+                self._update_leaderboard(group_id, user_id, username, date, targets_set=1)
+            elif previous.get("completed"):
+                self._update_leaderboard(group_id, user_id, username, date, completed=-1)
+            self._cache_target(
+                user_id, date,
+                {field: target_data[field] for field in TARGET_FIELDS if field in target_data}
+            )
+            self._publish_invalidation("target", group_id, user_id)
             return True
         except Exception as e:
-            print(f"Error adding target: {e}")
+            logger.error(f"Error adding target: {e}")
             return False
     
-    def get_today_target(self, user_id: int):
-        """Get today's target for a user"""
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        return self.db.targets.find_one({"user_id": user_id, "date": today})
+    def _find_target(self, user_id: int, date: datetime):
+        return self.db.targets.find_one({"user_id": user_id, "date": date}, TARGET_FIELDS)
     
     def get_all_targets(self, group_id: int, date: datetime = None):
         """Get all targets for a group on a specific date"""
@@ -104,23 +150,35 @@ class MongoDB:
         return list(self.db.targets.find({
             "group_id": group_id,
             "date": date
-        }))
+        }, TARGET_FIELDS))
     
     def get_user_targets(self, user_id: int, limit: int = 7):
         """Get recent targets for a user"""
         return list(self.db.targets.find(
-            {"user_id": user_id}
+            {"user_id": user_id},
+            {"_id": 0, "target": 1, "date": 1, "completed": 1}
         ).sort("date", -1).limit(limit))
     
-    def mark_target_completed(self, user_id: int, date: datetime = None):
-        """Mark a target as completed"""
+    def mark_target_completed(self, user_id: int, date: datetime = None, group_id: int = None):
+        """Mark a target as completed, returning the updated target (None if there was none)"""
         if date is None:
             date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         
-        return self.db.targets.update_one(
+        completed_at = datetime.now()
+        # One round trip: the write hands back the previous document, for the leaderboard and the cache
+        target = self.db.targets.find_one_and_update(
             {"user_id": user_id, "date": date},
-            {"$set": {"completed": True, "completed_at": datetime.now()}}
+            {"$set": {"completed": True, "completed_at": completed_at}},
+            projection={**TARGET_FIELDS, "group_id": 1}
         )
+        if target:
+            target_group = target.pop("group_id", group_id)
+            if not target.get("completed"):
+                self._update_leaderboard(target_group, user_id, target.get("username"), date, completed=1)
+            target.update(completed=True, completed_at=completed_at)
+        self._cache_target(user_id, date, target)
+        self._publish_invalidation("target", group_id, user_id)
+        return target
     
     # === SENTENCE FUNCTIONS ===
     
@@ -141,7 +199,7 @@ class MongoDB:
             result = self.db.sentences.insert_one(sentence_data)
             return str(result.inserted_id)
         except Exception as e:
-            print(f"Error adding sentence: {e}")
+            logger.error(f"Error adding sentence: {e}")
             return None
     
     def get_user_sentences(self, user_id: int, group_id: int = None, limit: int = 10):
@@ -150,7 +208,7 @@ class MongoDB:
         if group_id:
             query["group_id"] = group_id
         
-        return list(self.db.sentences.find(query).sort("created_at", -1).limit(limit))
+        return list(self.db.sentences.find(query, SENTENCE_FIELDS).sort("created_at", -1).limit(limit))
     
     def get_group_sentences(self, group_id: int, category: str = None, limit: int = 20):
         """Get recent sentences for a group"""
@@ -158,39 +216,60 @@ class MongoDB:
         if category and category != "all":
             query["category"] = category
         
-        return list(self.db.sentences.find(query).sort("created_at", -1).limit(limit))
+        return list(self.db.sentences.find(query, SENTENCE_FIELDS).sort("created_at", -1).limit(limit))
+    
+    def search_sentences(self, group_id: int, terms: str, page: int = 0, page_size: int = 5) -> Tuple[List[Dict], bool]:
+        """Full-text search over a group's sentences, ranked by relevance then recency"""
+        cursor = self.db.sentences.find(
+            {"group_id": group_id, "$text": {"$search": terms}},
+            {"score": {"$meta": "textScore"}, **SENTENCE_FIELDS}
+        ).sort([
+            ("score", {"$meta": "textScore"}),
+            ("created_at", -1)
+        ]).skip(page * page_size).limit(page_size + 1)
+        
+        results = list(cursor)
+        has_more = len(results) > page_size
+        return results[:page_size], has_more
     
-    def like_sentence(self, sentence_id: str, user_id: int):
-        """Like a sentence"""
+    def like_sentence(self, sentence_id: str, user_id: int) -> Optional[bool]:
+        """Like a sentence, or unlike it if the user already liked it.
+        
+        Returns True if the user now likes it, False if the like was removed, None on failure.
+        """
         try:
-            # Check if already liked
-            sentence = self.db.sentences.find_one({"_id": ObjectId(sentence_id)})
-            if not sentence:
-                return False
+            # Like only if not liked yet; the filter does the membership check server-side
+            result = self.db.sentences.update_one(
+                {"_id": ObjectId(sentence_id), "liked_by": {"$ne": user_id}},
+                {
+                    "$inc": {"likes": 1},
+                    "$push": {"liked_by": user_id}
+                }
+            )
+            if result.modified_count > 0:
+                return True
             
-            if user_id in sentence.get("liked_by", []):
-                # Unlike
-                result = self.db.sentences.update_one(
-                    {"_id": ObjectId(sentence_id)},
-                    {
-                        "$inc": {"likes": -1},
-                        "$pull": {"liked_by": user_id}
-                    }
-                )
-                return result.modified_count > 0
-            else:
-                # Like
-                result = self.db.sentences.update_one(
-                    {"_id": ObjectId(sentence_id)},
-                    {
-                        "$inc": {"likes": 1},
-                        "$push": {"liked_by": user_id}
-                    }
-                )
-                return result.modified_count > 0
+            # Already liked: unlike
+            result = self.db.sentences.update_one(
+                {"_id": ObjectId(sentence_id), "liked_by": user_id},
+                {
+                    "$inc": {"likes": -1},
+                    "$pull": {"liked_by": user_id}
+                }
+            )
+            return False if result.modified_count > 0 else None
         except Exception as e:
-            print(f"Error liking sentence: {e}")
-            return False
+            logger.error(f"Error liking sentence: {e}")
+            return None
+    
+    def get_sentence_likes(self, sentence_id: str) -> Optional[int]:
+        """Get the like count of a sentence"""
+        try:
+            sentence = self.db.sentences.find_one({"_id": ObjectId(sentence_id)}, {"_id": 0, "likes": 1})
+        except Exception as e:
+            logger.error(f"Error getting sentence likes: {e}")
+            return None
+        return sentence.get("likes", 0) if sentence else None
     
     def get_sentence_categories(self, group_id: int):
         """Get all sentence categories for a group"""
@@ -219,7 +298,7 @@ class MongoDB:
             )
             return True
         except Exception as e:
-            print(f"Error adding category: {e}")
+            logger.error(f"Error adding category: {e}")
             return False
     
     # === REGISTRATION FUNCTIONS ===
@@ -243,45 +322,133 @@ class MongoDB:
             )
             return result.acknowledged  # Return True if successful
         except Exception as e:
-            print(f"Error creating registration: {e}")
+            logger.error(f"Error creating registration: {e}")
             return None
     
+    def register_new_members(self, group_id: int, members: List[Tuple[int, str]], hours: int = 24):
+        """Create pending registrations and mutes for many joining users at once"""
+        now = datetime.now()
+        muted_until = now + timedelta(hours=hours)
+        
+        registration_ops = [
+            UpdateOne(
+                {"user_id": user_id, "group_id": group_id},
+                {"$set": {
+                    "user_id": user_id,
+                    "group_id": group_id,
+                    "username": username,
+                    "status": "pending",
+                    "created_at": now,
+                    "updated_at": now
+                }, "$unset": {"reminder_hour": ""}},
+                upsert=True
+            )
+            for user_id, username in members
+        ]
+        mute_ops = [
+            UpdateOne(
+                {"user_id": user_id, "group_id": group_id},
+                {"$set": {
+                    "user_id": user_id,
+                    "group_id": group_id,
+                    "muted_at": now,
+                    "muted_until": muted_until,
+                    "reason": "pending_registration"
+                }},
+                upsert=True
+            )
+            for user_id, _ in members
+        ]
+        
+        try:
+            self.db.registrations.bulk_write(registration_ops, ordered=False)
+            self.db.muted_users.bulk_write(mute_ops, ordered=False)
+            return True
+        except Exception as e:
+            logger.error(f"Error registering new members: {e}")
+            return False
+    
+    def get_verified_user_ids(self, group_id: int, user_ids: List[int]) -> set:
+        """Get which of the given users are verified in group (one covered query)"""
+        cursor = self.db.registrations.find(
+            {"user_id": {"$in": user_ids}, "group_id": group_id, "status": "verified"},
+            {"_id": 0, "user_id": 1}
+        )
+        return {registration["user_id"] for registration in cursor}
+    
     def get_registration(self, user_id: int, group_id: int):
-        """Get registration data for user"""
-        return self.db.registrations.find_one({"user_id": user_id, "group_id": group_id})
+        """Get registration status for user (covered by the user/group/status index)"""
+        return self.db.registrations.find_one({"user_id": user_id, "group_id": group_id}, REGISTRATION_FIELDS)
+    
+    def get_pending_registrations(self, group_id: int) -> List[Dict]:
+        """Get registrations still waiting for declaration acceptance"""
+        return list(self.db.registrations.find(
+            {"group_id": group_id, "status": "pending"},
+            {"_id": 0, "user_id": 1, "username": 1, "created_at": 1, "reminder_hour": 1}
+        ))
+    
+    def mark_reminder_sent(self, user_id: int, group_id: int, hour: int) -> bool:
+        """Record the registration reminder slot a pending user was last sent"""
+        result = self.db.registrations.update_one(
+            {"user_id": user_id, "group_id": group_id},
+            {"$set": {"reminder_hour": hour}}
+        )
+        return result.matched_count > 0
     
     def verify_registration(self, user_id: int, group_id: int):
         """Verify registration"""
-        registration = self.db.registrations.find_one({
-            "user_id": user_id,
-            "group_id": group_id
-        })
+        result = self.db.registrations.update_one(
+            {"user_id": user_id, "group_id": group_id},
+            {"$set": {
+                "status": "verified",
+                "verified_at": datetime.now(),
+                "updated_at": datetime.now()
+            }}
+        )
         
-        if registration:
-            self.db.registrations.update_one(
-                {"user_id": user_id, "group_id": group_id},
-                {"$set": {
-                    "status": "verified",
-                    "verified_at": datetime.now(),
-                    "updated_at": datetime.now()
-                }}
-            )
-            
+        if result.matched_count:
             # Remove from muted users
             self.db.muted_users.delete_one({"user_id": user_id, "group_id": group_id})
+            self._remember_verified(user_id, group_id)
             
             return True
         return False
     
-    def is_user_verified(self, user_id: int, group_id: int) -> bool:
-        """Check if user is verified in group"""
+    def _find_verified(self, user_id: int, group_id: int) -> bool:
         registration = self.db.registrations.find_one({
             "user_id": user_id,
             "group_id": group_id,
             "status": "verified"
-        })
+        }, REGISTRATION_FIELDS)
         return registration is not None
     
+    def load_verified_members(self, group_id: int) -> int:
+        """Load every verified member of a group into the membership cache"""
+        cursor = self.db.registrations.find(
+            {"group_id": group_id, "status": "verified"},
+            {"_id": 0, "user_id": 1}
+        )
+        members = {registration["user_id"] for registration in cursor}
+        self.verified_members[group_id] = members
+        return len(members)
+    
+    def mark_registration_left(self, user_id: int, group_id: int) -> bool:
+        """Mark a user's registration as left (user left the group)"""
+        self._forget_verified(user_id, group_id)
+        result = self.db.registrations.update_one(
+            {"user_id": user_id, "group_id": group_id},
+            {"$set": {"status": "left_group", "left_at": datetime.now()}}
+        )
+        self._publish_invalidation("verified", group_id, user_id)
+        return result.matched_count > 0
+    
+    def delete_registration(self, user_id: int, group_id: int) -> bool:
+        """Delete a user's registration record"""
+        self._forget_verified(user_id, group_id)
+        result = self.db.registrations.delete_one({"user_id": user_id, "group_id": group_id})
+        self._publish_invalidation("verified", group_id, user_id)
+        return result.deleted_count > 0
+    
     # === MUTE FUNCTIONS ===
     
     def mute_user(self, user_id: int, group_id: int, hours: int = 24):
@@ -304,7 +471,7 @@ class MongoDB:
             )
             return True
         except Exception as e:
-            print(f"Error muting user: {e}")
+            logger.error(f"Error muting user: {e}")
             return False
     
     def is_user_muted(self, user_id: int, group_id: int) -> bool:
@@ -313,7 +480,7 @@ class MongoDB:
             "user_id": user_id,
             "group_id": group_id,
             "muted_until": {"$gt": datetime.now()}
-        })
+        }, {"_id": 0, "muted_until": 1})
         return mute_record is not None
     
     def unmute_user(self, user_id: int, group_id: int):
@@ -326,7 +493,7 @@ class MongoDB:
         return list(self.db.muted_users.find({
             "group_id": group_id,
             "muted_until": {"$gt": datetime.now()}
-        }))
+        }, {"_id": 0, "user_id": 1, "muted_until": 1}))
     
     # === GROUP SETTINGS FUNCTIONS ===
     
@@ -341,43 +508,437 @@ class MongoDB:
             }},
             upsert=True
         )
+        if self.allowed_groups is not None:
+            self.allowed_groups.add(group_id)
+        self._publish_invalidation("allowed", group_id)
     
-    def is_group_allowed(self, group_id: int) -> bool:
-        """Check if a group is allowed"""
-        # If no groups are set, allow all (for initial setup)
-        count = self.db.group_settings.count_documents({})
-        if count == 0:
-            return True
-        
-        return self.db.group_settings.find_one({"group_id": group_id}) is not None
+    def load_allowed_groups(self) -> set:
+        """Load the authorized group ids into memory (covered by the group_id index)"""
+        cursor = self.db.group_settings.find({}, {"_id": 0, "group_id": 1}, hint=[("group_id", 1)])
+        self.allowed_groups = {group["group_id"] for group in cursor}
+        return self.allowed_groups
     
     def get_allowed_group(self):
         """Get the allowed group info"""
-        return self.db.group_settings.find_one()
+        return self.db.group_settings.find_one({}, {"_id": 0, "group_id": 1, "group_name": 1})
+    
+    def get_allowed_groups(self) -> List[Dict]:
+        """Get info for every authorized group"""
+        return list(self.db.group_settings.find({}, {"_id": 0, "group_id": 1, "group_name": 1}))
+    
+    def set_nudge_time(self, group_id: int, nudge_time: Optional[str]) -> bool:
+        """Set (HH:MM) or clear (None) the time of a group's daily target reminder"""
+        update = {"$set": {"nudge_time": nudge_time}} if nudge_time else {"$unset": {"nudge_time": ""}}
+        result = self.db.group_settings.update_one({"group_id": group_id}, update)
+        return result.matched_count > 0
+    
+    def get_nudge_times(self) -> List[Dict]:
+        """Get every group with a daily target reminder and its time"""
+        return list(self.db.group_settings.find(
+            {"nudge_time": {"$exists": True}},
+            {"_id": 0, "group_id": 1, "nudge_time": 1}
+        ))
+    
+    def get_nudge_time(self, group_id: int) -> Optional[str]:
+        """Get the HH:MM time of a group's daily target reminder, None if disabled"""
+        settings = self.db.group_settings.find_one({"group_id": group_id}, {"_id": 0, "nudge_time": 1})
+        return settings.get("nudge_time") if settings else None
+    
+    def set_live_board(self, group_id: int, enabled: bool) -> bool:
+        """Opt a group in (with no board message yet) or out of the live /today board"""
+        update = {"$set": {"live_board": {"message_id": None, "date": None}}} if enabled else {"$unset": {"live_board": ""}}
+        result = self.db.group_settings.update_one({"group_id": group_id}, update)
+        return result.matched_count > 0
+    
+    def get_live_board(self, group_id: int) -> Optional[Dict]:
+        """Get a group's live board ({message_id, date} of its current message), None if not enabled"""
+        settings = self.db.group_settings.find_one(
+            {"group_id": group_id, "live_board": {"$exists": True}},
+            {"_id": 0, "live_board": 1}
+        )
+        return settings["live_board"] if settings else None
+    
+    def set_live_board_message(self, group_id: int, message_id: int, date: datetime):
+        """Remember the message currently showing a group's live board (only while enabled)"""
+        self.db.group_settings.update_one(
+            {"group_id": group_id, "live_board": {"$exists": True}},
+            {"$set": {"live_board": {"message_id": message_id, "date": date}}}
+        )
+    
+    def claim_live_board_post(self, group_id: int, date: datetime, stale_message_id: int = None) -> bool:
+        """Claim posting a group's board for a date: only one caller wins while the board isn't on that
+        date yet, or still points at stale_message_id (e.g. a deleted message). The winner posts it."""
+        claimable = [{"live_board.date": {"$ne": date}}]
+        if stale_message_id:
+            claimable.append({"live_board.message_id": stale_message_id})
+        result = self.db.group_settings.update_one(
+            {"group_id": group_id, "live_board": {"$exists": True}, "$or": claimable},
+            {"$set": {"live_board": {"message_id": None, "date": date}}}
+        )
+        return result.modified_count > 0
+    
+    def get_members_without_target(self, group_id: int, date: datetime = None) -> List[Dict]:
+        """Get the verified members of a group who have no target on a date (today by default)"""
+        if date is None:
+            date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        # Verified registrations minus the day's targets, in one aggregation;
+        # each lookup is a point read on the unique (user_id, date) index
+        return list(self.db.registrations.aggregate([
+            {"$match": {"group_id": group_id, "status": "verified"}},
+            {"$lookup": {
+                "from": "targets",
+                "localField": "user_id",
+                "foreignField": "user_id",
+                "pipeline": [{"$match": {"date": date}}, {"$project": {"_id": 1}}],
+                "as": "target"
+            }},
+            {"$match": {"target": {"$size": 0}}},
+            {"$project": {"_id": 0, "user_id": 1, "username": 1}}
+        ]))
+    
+    # === TRIGGER FUNCTIONS ===
+    
+    def add_trigger(self, group_id: int, keyword: str, response: str, cooldown: int):
+        """Add or replace a keyword trigger for a group"""
+        try:
+            self.db.triggers.update_one(
+                {"group_id": group_id, "keyword": keyword},
+                {"$set": {
+                    "group_id": group_id,
+                    "keyword": keyword,
+                    "response": response,
+                    "cooldown": cooldown,
+                    "updated_at": datetime.now()
+                }},
+                upsert=True
+            )
+            self._publish_invalidation("triggers", group_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error adding trigger: {e}")
+            return False
+    
+    def remove_trigger(self, group_id: int, keyword: str) -> bool:
+        """Remove a keyword trigger from a group"""
+        result = self.db.triggers.delete_one({"group_id": group_id, "keyword": keyword})
+        self._publish_invalidation("triggers", group_id)
+        return result.deleted_count > 0
+    
+    def get_triggers(self, group_id: int) -> List[Dict]:
+        """Get all keyword triggers of a group"""
+        return list(self.db.triggers.find(
+            {"group_id": group_id},
+            {"_id": 0, "keyword": 1, "response": 1, "cooldown": 1}
+        ).sort("keyword", 1))
+    
+    # === LEADERBOARD FUNCTIONS ===
+    
+    def _update_streak(self, group_id: int, user_id: int, username: str, date: datetime, completed: int) -> int:
+        """Apply a completion (completed > 0) or a taken back completion of date to the member's
+        running streak; returns the new streak"""
+        if completed > 0:
+            # Completing the day after the last completion extends the streak, a gap restarts it
+            streak = {
+                "streak": {"$switch": {
+                    "branches": [
+                        {"case": {"$eq": ["$last_completed", date]}, "then": "$streak"},
+                        {"case": {"$eq": ["$last_completed", date - timedelta(days=1)]}, "then": {"$add": ["$streak", 1]}},
+                    ],
+                    "default": 1
+                }},
+                "last_completed": {"$max": ["$last_completed", date]}
+            }
+        else:
+            # Only the latest completion can be taken back: the run then ends the day before
+            taken_back = {"$eq": ["$last_completed", date]}
+            streak = {
+                "streak": {"$cond": [taken_back, {"$max": [{"$subtract": ["$streak", 1]}, 0]}, "$streak"]},
+                "last_completed": {"$cond": [
+                    taken_back,
+                    {"$cond": [{"$gt": ["$streak", 1]}, date - timedelta(days=1), None]},
+                    "$last_completed"
+                ]}
+            }
+        
+        entry = self.db.leaderboard.find_one_and_update(
+            {"group_id": group_id, "period": STREAK_PERIOD, "user_id": user_id},
+            [{"$set": {**streak, "username": {"$literal": username}}}, {"$set": {"streak": {"$ifNull": ["$streak", 0]}}}],
+            projection={"_id": 0, "streak": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return entry["streak"]
+    
+    def _update_leaderboard(self, group_id: int, user_id: int, username: str, date: datetime,
+                            targets_set: int = 0, completed: int = 0):
+        """Apply one target change to the user's streak and their week and month leaderboard entries"""
+        counts = {
+            "username": {"$literal": username},
+            "targets_set": {"$add": [{"$ifNull": ["$targets_set", 0]}, targets_set]},
+            "completed": {"$add": [{"$ifNull": ["$completed", 0]}, completed]},
+        }
+        try:
+            if completed:
+                counts["streak"] = {"$literal": self._update_streak(group_id, user_id, username, date, completed)}
+            
+            pipeline = [
+                {"$set": counts},
+                {"$set": {
+                    "rate": {"$cond": [{"$gt": ["$targets_set", 0]}, {"$divide": ["$completed", "$targets_set"]}, 0]},
+                    "streak": {"$ifNull": ["$streak", 0]}
+                }}
+            ]
+            self.db.leaderboard.bulk_write([
+                UpdateOne(
+                    {"group_id": group_id, "period": leaderboard_period(kind, date), "user_id": user_id},
+                    pipeline,
+                    upsert=True
+                )
+                for kind in LEADERBOARD_PERIODS
+            ])
+        except Exception as e:
+            logger.error(f"Error updating leaderboard: {e}")
+    
+    def get_leaderboard(self, group_id: int, period: str, limit: int = 10) -> List[Dict]:
+        """Get the top members of a group for a period key, best completion rate then streak first"""
+        return list(self.db.leaderboard.find(
+            {"group_id": group_id, "period": period},
+            {"_id": 0, "user_id": 1, "username": 1, "targets_set": 1, "completed": 1, "rate": 1, "streak": 1}
+        ).sort([("rate", -1), ("streak", -1)]).limit(limit))
+    
+    # === DIGEST FUNCTIONS ===
+    
+    def get_weekly_digest(self, group_id: int, since: datetime, limit: int = 3) -> Dict:
+        """Summarize a group's week in one aggregation: completion, top streaks,
+        most liked sentences and newly verified members"""
+        pipeline = [
+            {"$match": {"group_id": group_id, "date": {"$gte": since}}},
+            {"$project": {"_id": 0, "source": {"$literal": "target"}, "completed": 1}},
+            {"$unionWith": {"coll": "sentences", "pipeline": [
+                {"$match": {"group_id": group_id, "created_at": {"$gte": since}, "likes": {"$gt": 0}}},
+                {"$sort": {"likes": -1}},
+                {"$limit": limit},
+                {"$project": {"_id": 0, "source": {"$literal": "sentence"}, "username": 1, "sentence": 1, "likes": 1}}
+            ]}},
+            {"$unionWith": {"coll": "registrations", "pipeline": [
+                {"$match": {"group_id": group_id, "status": "verified", "verified_at": {"$gte": since}}},
+                {"$project": {"_id": 0, "source": {"$literal": "member"}, "username": 1}}
+            ]}},
+            # Streaks are already maintained by the leaderboard; only runs still going this week count
+            {"$unionWith": {"coll": "leaderboard", "pipeline": [
+                {"$match": {
+                    "group_id": group_id, "period": STREAK_PERIOD, "streak": {"$gt": 1}, "last_completed": {"$gte": since}
+                }},
+                {"$sort": {"streak": -1}},
+                {"$limit": limit},
+                {"$project": {"_id": 0, "source": {"$literal": "streak"}, "username": 1, "streak": 1}}
+            ]}},
+            {"$facet": {
+                "completion": [
+                    {"$match": {"source": "target"}},
+                    {"$group": {"_id": None, "total": {"$sum": 1}, "completed": {"$sum": {"$cond": ["$completed", 1, 0]}}}}
+                ],
+                "top_streaks": [{"$match": {"source": "streak"}}, {"$sort": {"streak": -1}}],
+                "top_sentences": [{"$match": {"source": "sentence"}}, {"$sort": {"likes": -1}}],
+                "new_members": [{"$match": {"source": "member"}}]
+            }}
+        ]
+        
+        result = next(self.db.targets.aggregate(pipeline))
+        completion = result.pop("completion") or [{"total": 0, "completed": 0}]
+        return {"total": completion[0]["total"], "completed": completion[0]["completed"], **result}
+    
+    def claim_digest(self, group_id: int, round_at: datetime) -> bool:
+        """Claim sending a group's digest of a round: only the first caller wins, even across restarts"""
+        result = self.db.group_settings.update_one(
+            {"group_id": group_id, "last_digest": {"$ne": round_at}},
+            {"$set": {"last_digest": round_at}}
+        )
+        return result.modified_count > 0
+    
+    # === SCHEDULED JOB FUNCTIONS ===
+    
+    def get_job_state(self, name: str) -> Optional[Dict]:
+        """Get the persisted schedule of a job"""
+        return self.db.scheduled_jobs.find_one({"_id": name}, {"_id": 0, "next_run": 1, "last_run": 1})
+    
+    def claim_job(self, name: str, now: datetime, next_run: datetime, owner: str, lease_seconds: int) -> bool:
+        """Claim a job's due run: only succeeds if the run is due and no other replica holds the lease.
+        The claim moves next_run forward, so a replica firing the same run later gets False."""
+        try:
+            self.db.scheduled_jobs.update_one(
+                {
+                    "_id": name,
+                    "next_run": {"$lte": now},
+                    "$or": [{"lease_until": None}, {"lease_until": {"$lte": now}}]
+                },
+                {"$set": {
+                    "next_run": next_run,
+                    "lease_owner": owner,
+                    "lease_until": now + timedelta(seconds=lease_seconds)
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The job exists but isn't claimable, so the upsert tried to insert it again
+            return False
+    
+    def release_job(self, name: str, owner: str, now: datetime):
+        """Release a job's lease after a run; now is on the caller's clock, like claim_job's"""
+        self.db.scheduled_jobs.update_one(
+            {"_id": name, "lease_owner": owner},
+            {"$set": {"lease_until": None, "last_run": now}}
+        )
+    
+    def delete_job_state(self, name: str):
+        """Forget a job's persisted schedule"""
+        self.db.scheduled_jobs.delete_one({"_id": name})
+    
+    # === PERSISTENCE FUNCTIONS ===
+    
+    def load_persisted(self, kind: str, key: str) -> Optional[bytes]:
+        """Get a serialized bot persistence entry (user_data, chat_data...)"""
+        doc = self.db.persistence.find_one({"_id": f"{kind}:{key}"}, {"_id": 0, "data": 1})
+        return bytes(doc["data"]) if doc else None
+    
+    def save_persisted(self, entries: List[Tuple[str, str, Optional[bytes]]]):
+        """Write (kind, key, data) persistence entries in one batch; data None deletes the entry"""
+        now = datetime.now()
+        ops = [
+            DeleteOne({"_id": f"{kind}:{key}"}) if data is None else UpdateOne(
+                {"_id": f"{kind}:{key}"},
+                {"$set": {"kind": kind, "key": key, "data": Binary(data), "updated_at": now}},
+                upsert=True
+            )
+            for kind, key, data in entries
+        ]
+        if ops:
+            self.db.persistence.bulk_write(ops, ordered=False)
+    
+    # === ARCHIVE FUNCTIONS ===
+    
+    def _archive_collection(self, collection: str, partition: str):
+        """Get (creating if needed) a zstd-compressed monthly archive collection"""
+        name = f"{collection}_archive_{partition}"
+        try:
+            self.db.create_collection(
+                name,
+                storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+            )
+            self.db[name].create_index([("group_id", 1), ("user_id", 1)])
+        except CollectionInvalid:
+            pass  # Already exists
+        return self.db[name]
+    
+    def get_archive_collections(self, collection: str) -> List[str]:
+        """List the archive partitions of a collection, oldest first"""
+        return sorted(self.db.list_collection_names(filter={"name": {"$regex": f"^{collection}_archive_"}}))
+    
+    def archive_old_data(self, horizon_days: int = None, batch_size: int = 1000) -> Dict[str, int]:
+        """Move targets and sentences older than the horizon into monthly archive collections"""
+        if horizon_days is None:
+            horizon_days = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+        cutoff = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=horizon_days)
+        
+        moved = {}
+        for collection, date_field in ARCHIVED_COLLECTIONS.items():
+            moved[collection] = 0
+            hot = self.db[collection]
+            
+            while True:
+                batch = list(hot.find({date_field: {"$lt": cutoff}}).sort(date_field, 1).limit(batch_size))
+                if not batch:
+                    break
+                
+                partitions = {}
+                for doc in batch:
+                    partitions.setdefault(doc[date_field].strftime("%Y_%m"), []).append(doc)
+                
+                for partition, docs in partitions.items():
+                    try:
+                        self._archive_collection(collection, partition).insert_many(docs, ordered=False)
+                    except BulkWriteError as e:
+                        # Documents copied by an interrupted earlier run are already archived
+                        if any(err["code"] != DUPLICATE_KEY_ERROR for err in e.details["writeErrors"]):
+                            raise
+                
+                # Only delete once every document of the batch is safely in the archive
+                hot.delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+                moved[collection] += len(batch)
+        
+        return moved
+    
+    def get_target_stats(self, user_id: int, group_id: int, include_archive: bool = False) -> Dict:
+        """Get target totals for a user; archived history is included on request (slower)"""
+        pipeline = [{"$match": {"user_id": user_id, "group_id": group_id}}]
+        
+        if include_archive:
+            for name in self.get_archive_collections("targets"):
+                pipeline.append({"$unionWith": {
+                    "coll": name,
+                    "pipeline": [{"$match": {"user_id": user_id, "group_id": group_id}}]
+                }})
+        
+        pipeline.append({"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "completed": {"$sum": {"$cond": ["$completed", 1, 0]}},
+            "first_date": {"$min": "$date"}
+        }})
+        
+        result = list(self.db.targets.aggregate(pipeline))
+        if not result:
+            return {"total": 0, "completed": 0, "first_date": None}
+        return result[0]
+    
+    # === EXPORT FUNCTIONS ===
+    
+    def iter_group_documents(self, collection: str, group_id: int, fields: List[str], batch_size: int = 500):
+        """Stream a group's documents from a collection, fetching only the given fields"""
+        projection = {"_id": 0, **{field: 1 for field in fields}}
+        return self.db[collection].find({"group_id": group_id}, projection, batch_size=batch_size)
     
     # === RESET FUNCTION ===
     
-    def reset_all_data(self, group_id: int = None):
-        """Reset all data (for testing)"""
+    def _purge_group_collection(self, collection: str, group_id: int, batch_size: int, progress=None) -> int:
+        """Delete a group's documents from one collection in bounded batches"""
+        deleted = 0
+        while True:
+            ids = [doc["_id"] for doc in self.db[collection].find({"group_id": group_id}, {"_id": 1}).limit(batch_size)]
+            if not ids:
+                break
+            deleted += self.db[collection].delete_many({"_id": {"$in": ids}}).deleted_count
+            if progress:
+                progress(collection, deleted)
+        return deleted
+    
+    def reset_all_data(self, group_id: int, batch_size: int = 1000, progress=None):
+        """Reset all data of a group (for testing).
+        
+        Collections are purged concurrently (up to RESET_WORKERS at a time), in batches so
+        no single delete holds the server for long. progress(collection, deleted_so_far) is called
+        from the worker threads after every batch.
+        """
         try:
-            if group_id:
-                self.db.targets.delete_many({"group_id": group_id})
-                self.db.group_settings.delete_one({"group_id": group_id})
-                self.db.registrations.delete_many({"group_id": group_id})
-                self.db.muted_users.delete_many({"group_id": group_id})
-                self.db.sentences.delete_many({"group_id": group_id})
-                self.db.sentence_categories.delete_many({"group_id": group_id})
-            else:
-                self.db.targets.delete_many({})
-                self.db.group_settings.delete_many({})
-                self.db.registrations.delete_many({})
-                self.db.muted_users.delete_many({})
-                self.db.sentences.delete_many({})
-                self.db.sentence_categories.delete_many({})
+            collections = GROUP_COLLECTIONS + [
+                name for collection in ARCHIVED_COLLECTIONS for name in self.get_archive_collections(collection)
+            ]
+            with ThreadPoolExecutor(max_workers=min(len(collections), RESET_WORKERS)) as pool:
+                futures = [
+                    pool.submit(self._purge_group_collection, collection, group_id, batch_size, progress)
+                    for collection in collections
+                ]
+                for future in futures:
+                    future.result()
             return True
         except Exception as e:
-            print(f"Error resetting data: {e}")
+            logger.error(f"Error resetting data: {e}")
             return False
+        finally:
+            self.invalidate_group(group_id)
+            self._publish_invalidation("group", group_id)
     
     def close(self):
         """Close MongoDB connection"""
@@ -385,5 +946,14 @@ class MongoDB:
             self.client.close()
 
 
+def create_backend() -> StorageBackend:
+    """Create the storage backend selected by STORAGE_BACKEND (mongodb or sqlite)"""
+    backend = os.getenv("STORAGE_BACKEND", "mongodb").lower()
+    if backend == "sqlite":
+        from src.sqlite_backend import SQLiteDB
+        return SQLiteDB()
+    return MongoDB()
+
+
 # Global database instance
-db = MongoDB()
\ No newline at end of file
+db = create_backend()
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Weekly digest posted in every authorized group
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+from telegram.ext import ContextTypes
+from telegram.helpers import escape_markdown
+
+from src.database import db
+
+logger = logging.getLogger(__name__)
+
+# When the digest goes out: weekday as PTB counts it (0 = Sunday) and hour of day
+DIGEST_WEEKDAY = int(os.getenv("DIGEST_WEEKDAY", "0"))
+DIGEST_HOUR = int(os.getenv("DIGEST_HOUR", "18"))
+# Seconds between two groups' digests, so their aggregations and sends don't pile up
+DIGEST_STAGGER = float(os.getenv("DIGEST_STAGGER", "30"))
+# A round interrupted by a restart is picked up again if the bot is back within this many hours
+DIGEST_RESUME_HOURS = float(os.getenv("DIGEST_RESUME_HOURS", "6"))
+# Entries shown per digest section
+DIGEST_TOP = 3
+
+JOB_NAME = "weekly_digest"
+
+
+def _md(text) -> str:
+    """Escape user content, so a stray * or _ can't break the Markdown of the whole digest"""
+    return escape_markdown(str(text), version=1)
+
+
+def format_digest(digest: dict) -> str:
+    """Render a group's weekly digest"""
+    rate = int(digest["completed"] / digest["total"] * 100) if digest["total"] else 0
+    message = (
+        "📰 *Weekly Digest*\n\n"
+        f"🎯 *Targets set:* {digest['total']}\n"
+        f"✅ *Completed:* {digest['completed']} ({rate}%)\n"
+    )
+
+    if digest["top_streaks"]:
+        message += "\n🔥 *Top Streaks:*\n"
+        for entry in digest["top_streaks"]:
+            message += f"• @{_md(entry['username'])}: {entry['streak']} days\n"
+
+    if digest["top_sentences"]:
+        message += "\n👍 *Most Liked:*\n"
+        for sentence in digest["top_sentences"]:
+            text = sentence["sentence"]
+            if len(text) > 80:
+                text = text[:77] + "..."
+            message += f"• {_md(text)} - @{_md(sentence['username'])} ({sentence['likes']})\n"
+
+    if digest["new_members"]:
+        names = ", ".join(f"@{_md(member['username'])}" for member in digest["new_members"] if member.get("username"))
+        message += f"\n👋 *New Members:* {len(digest['new_members'])}"
+        message += f"\n{names}\n" if names else "\n"
+
+    return message
+
+
+def _current_round():
+    """Start of the latest claimed digest round (naive UTC), from the weekly job's persisted schedule"""
+    state = db.get_job_state(JOB_NAME)
+    if not state or not state.get("next_run"):
+        return None
+    # Claiming a round moves next_run one week ahead
+    return state["next_run"] - timedelta(weeks=1)
+
+
+async def send_group_digest(bot, group_id: int):
+    """Build and post one group's digest"""
+    since = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=6)
+    digest = await asyncio.to_thread(db.get_weekly_digest, group_id, since, DIGEST_TOP)
+    await bot.send_message(chat_id=group_id, text=format_digest(digest), parse_mode="Markdown")
+
+
+async def send_digest_round(context: ContextTypes.DEFAULT_TYPE):
+    """Post the digest of every authorized group not yet served this round, DIGEST_STAGGER seconds apart.
+    Each group is claimed in the database just before its send, so a restarted round skips the groups
+    already done, and replicas running the same round never post twice."""
+    round_at = context.job.data
+    try:
+        groups = await asyncio.to_thread(db.get_allowed_groups)
+    except Exception as e:
+        logger.error(f"Error in send_digest_round: {e}")
+        return
+
+    sent = 0
+    for group in groups:
+        group_id = group["group_id"]
+        try:
+            if not await asyncio.to_thread(db.claim_digest, group_id, round_at):
+                continue
+            await send_group_digest(context.bot, group_id)
+            sent += 1
+            logger.info(f"📰 Sent weekly digest to {group_id}")
+        except Exception as e:
+            logger.error(f"Error sending weekly digest to {group_id}: {e}")
+        await asyncio.sleep(DIGEST_STAGGER)
+    logger.info(f"📰 Weekly digest round finished: {sent} of {len(groups)} group(s) sent")
+
+
+async def weekly_digest_job(context: ContextTypes.DEFAULT_TYPE):
+    """Start this week's digest round in the background (scheduled job)"""
+    try:
+        round_at = await asyncio.to_thread(_current_round)
+    except Exception as e:
+        logger.error(f"Error in weekly_digest_job: {e}")
+        return
+    if round_at:
+        context.job_queue.run_once(send_digest_round, 0, data=round_at, name="digest_round")
+
+
+def resume_digest_round(job_queue):
+    """Finish a round a restart interrupted: its groups not claimed yet still get their digest"""
+    try:
+        round_at = _current_round()
+    except Exception as e:
+        logger.error(f"Error loading the digest round: {e}")
+        return
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    if round_at and timedelta(0) <= now - round_at <= timedelta(hours=DIGEST_RESUME_HOURS):
+        job_queue.run_once(send_digest_round, 0, data=round_at, name="digest_round")
+        logger.info("📰 Resuming the weekly digest round")
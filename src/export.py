@@ -0,0 +1,77 @@
+"""
+Streaming export of group history for admins
+"""
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from src.database import db
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# Exported collections and their columns, in output order
+EXPORT_COLUMNS = {
+    "targets": ["date", "user_id", "username", "target", "completed", "created_at", "completed_at"],
+    "sentences": ["created_at", "user_id", "username", "category", "sentence", "likes"],
+    "registrations": ["user_id", "username", "status", "created_at", "verified_at", "left_at"],
+}
+
+
+def _format_value(value):
+    """Render a document value for export"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_rows(documents, columns):
+    """Yield encoded CSV lines, header first, reusing one small buffer"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    for row in _iter_csv_values(documents, columns):
+        writer.writerow(row)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def _iter_csv_values(documents, columns):
+    """Yield the header and then one value list per document"""
+    yield columns
+    for document in documents:
+        yield [_format_value(document.get(column, "")) for column in columns]
+
+
+def _ndjson_rows(documents, columns):
+    """Yield encoded NDJSON lines"""
+    for document in documents:
+        record = {column: _format_value(document.get(column)) for column in columns}
+        yield (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+
+
+def build_export(group_id: int, collection: str, fmt: str = "csv"):
+    """Stream one collection of a group into a gzipped temporary file.
+
+    Blocking: run it in a worker thread. Rows flow cursor -> encoder -> gzip -> disk,
+    so memory stays flat regardless of history size. Returns (file, row_count) with the
+    file rewound for upload; the caller closes it.
+    """
+    columns = EXPORT_COLUMNS[collection]
+    documents = db.iter_group_documents(collection, group_id, columns)
+    encode = _csv_rows if fmt == "csv" else _ndjson_rows
+
+    output = tempfile.TemporaryFile()
+    rows = 0
+    with gzip.GzipFile(fileobj=output, mode="wb") as compressed:
+        for line in encode(documents, columns):
+            compressed.write(line)
+            rows += 1
+
+    output.seek(0)
+    if fmt == "csv":
+        rows -= 1  # Header line
+    return output, rows
@@ -0,0 +1,60 @@
+"""
+Update-scoped gate: group authorization and member verification/mute state, looked up once per update
+"""
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from src.database import db
+from src.metrics import metrics
+
+
+class UpdateGate:
+    """State of an update's chat and user. Each check hits storage on first use only,
+    so an update that passes through several handlers (or checks twice) pays once.
+    """
+
+    __slots__ = ("group_id", "user_id", "_resolved")
+
+    def __init__(self, group_id, user_id):
+        self.group_id = group_id
+        self.user_id = user_id
+        self._resolved = {}
+
+    def _resolve(self, key: str, lookup, *args) -> bool:
+        if key in self._resolved:
+            metrics.inc("gate_memo_hits")
+            return self._resolved[key]
+        metrics.inc("gate_lookups")
+        value = self._resolved[key] = bool(lookup(*args))
+        return value
+
+    @property
+    def group_allowed(self) -> bool:
+        return self._resolve("allowed", db.is_group_allowed, self.group_id)
+
+    @property
+    def user_verified(self) -> bool:
+        return self._resolve("verified", db.is_user_verified, self.user_id, self.group_id)
+
+    @property
+    def user_muted(self) -> bool:
+        return self._resolve("muted", db.is_user_muted, self.user_id, self.group_id)
+
+
+def _new_gate(update: Update) -> UpdateGate:
+    chat = update.effective_chat
+    user = update.effective_user
+    return UpdateGate(chat.id if chat else None, user.id if user else None)
+
+
+async def attach_update_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Give every update a fresh gate on its context (handler group -2, before anything else)"""
+    context.gate = _new_gate(update)
+
+
+def update_gate(update: Update, context: ContextTypes.DEFAULT_TYPE) -> UpdateGate:
+    """The update's gate; created here if the middleware isn't registered (e.g. in src/main.py)"""
+    gate = getattr(context, "gate", None)
+    if gate is None:
+        gate = context.gate = _new_gate(update)
+    return gate
@@ -4,9 +4,35 @@ Command handlers for the bot
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler
 from datetime import datetime
+import asyncio
+import logging
+import os
 
+from src.cache import LRUCache
+from src.callbacks import encode_callback
 from src.database import db
-from src.utils import is_admin, format_targets_message
+from src.gate import update_gate
+from src.tracing import span
+from src.storage import LEADERBOARD_PERIODS, leaderboard_period
+from src.utils import is_admin, format_targets_pages
+from src.export import EXPORT_COLUMNS, EXPORT_FORMATS, build_export
+from src.moderation import queue_deletion, remind_unverified
+from src.triggers import invalidate_triggers, reply_to_triggers
+from src.nudges import unschedule_nudge
+from src.board import is_board_enabled, request_board_refresh
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress edits of the reset confirmation message
+RESET_PROGRESS_INTERVAL = 1.5
+# Members shown by /leaderboard
+LEADERBOARD_SIZE = 10
+# Callback route codes of the reset confirmation and /today page buttons (see src/callbacks.py)
+RESET_CALLBACK = "x"
+TODAY_PAGE_CALLBACK = "t"
+
+# Rendered /today pages per (group_id, message_id), so page buttons don't query or render again
+today_pages = LRUCache(int(os.getenv("TODAY_PAGE_CACHE_SIZE", "256")))
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -22,7 +48,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return  # Private chat handled by registration module
     
     # Check if group is allowed
-    if not db.is_group_allowed(chat_id):
+    if not update_gate(update, context).group_allowed:
         # Set this group as allowed (first group that uses /start)
         group_name = update.message.chat.title or f"Group_{chat_id}"
         db.set_allowed_group(chat_id, group_name)
@@ -60,15 +86,21 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "📌 `/mytarget` - Check your today's target\n"
         "📌 `/today` - See all targets for today\n"
         "📌 `/mytargets` - See your recent targets (last 7 days)\n"
-        "📌 `/done` - Mark today's target as completed\n\n"
+        "📌 `/done` - Mark today's target as completed\n"
+        "📌 `/stats` - Your target statistics\n"
+        "📌 `/leaderboard [week|month]` - Group ranking\n\n"
         "*Sentence/Goal Sharing:*\n"
         "📝 `/addsentence <sentence>` - Share a goal or achievement\n"
         "📚 `/sentences` - View all shared sentences\n"
-        "👤 `/mysentences` - View your sentences\n\n"
+        "👤 `/mysentences` - View your sentences\n"
+        "🔍 `/search <words>` - Search shared sentences\n\n"
         "*Admin Commands:*\n"
         "🛠 `/reset` - Clear all bot data (testing only)\n"
         "🛠 `/addtargetfor @username <target>` - Add target for a user\n"
         "🛠 `/status` - Check bot status\n"
+        "🛠 `/export` - Export group history (sent in DM)\n"
+        "🛠 `/nudgetime <HH:MM|off>` - Daily target reminder\n"
+        "🛠 `/liveboard <on|off>` - Pinned live /today board\n"
         "🛠 `/help` - Show this help message\n\n"
         "🔐 *New Members:*\n"
         "New members will be muted and need to register via DM"
@@ -87,7 +119,7 @@ async def add_target(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = update.message.from_user.username or update.message.from_user.first_name
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -98,6 +130,7 @@ async def add_target(update: Update, context: ContextTypes.DEFAULT_TYPE):
     target = " ".join(context.args)
     
     if db.add_target(group_id, user_id, username, target):
+        request_board_refresh(context, group_id)
         await update.message.reply_text(f"✅ Target added!\n📝 *Your Target:* {target}", parse_mode="Markdown")
     else:
         await update.message.reply_text("❌ Failed to add target. Please try again.")
@@ -111,7 +144,7 @@ async def add_target_for_user(update: Update, context: ContextTypes.DEFAULT_TYPE
     group_id = update.message.chat.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -132,6 +165,7 @@ async def add_target_for_user(update: Update, context: ContextTypes.DEFAULT_TYPE
     user_id_hash = abs(hash(username)) % 1000000
     
     if db.add_target(group_id, user_id_hash, username, target):
+        request_board_refresh(context, group_id)
         await update.message.reply_text(f"✅ Target added for @{username}!\n📝 *Target:* {target}", parse_mode="Markdown")
     else:
         await update.message.reply_text("❌ Failed to add target.")
@@ -146,11 +180,11 @@ async def my_target(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
-    target = db.get_today_target(user_id)
+    target = db.get_today_target(user_id, group_id)
     
     if target:
         status = "✅ Completed" if target.get("completed") else "⏳ Pending"
@@ -177,7 +211,7 @@ async def today_targets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_id = update.message.chat.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -187,8 +221,53 @@ async def today_targets(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("📭 No targets set for today!")
         return
     
-    message = format_targets_message(targets)
-    await update.message.reply_text(message, parse_mode="Markdown")
+    with span("format_targets_pages", targets=len(targets)):
+        pages = format_targets_pages(targets)
+    
+    # With the live board on, point to it (and repost it if it was deleted) instead of another copy,
+    # unless the targets take more than the one page the board shows
+    if len(pages) == 1 and is_board_enabled(group_id):
+        request_board_refresh(context, group_id, delay=0)
+        await update.message.reply_text("📌 Today's targets are on the pinned live board.")
+        return
+    
+    sent = await update.message.reply_text(
+        pages[0], parse_mode="Markdown", reply_markup=_today_page_keyboard(0, len(pages))
+    )
+    if len(pages) > 1:
+        today_pages.set((group_id, sent.message_id), pages)
+
+
+def _today_page_keyboard(page: int, count: int):
+    """Previous/next buttons for a /today page (None for a single page)"""
+    if count <= 1:
+        return None
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("⬅️ Previous", callback_data=encode_callback(TODAY_PAGE_CALLBACK, page - 1)))
+    if page < count - 1:
+        row.append(InlineKeyboardButton("Next ➡️", callback_data=encode_callback(TODAY_PAGE_CALLBACK, page + 1)))
+    return InlineKeyboardMarkup([row])
+
+
+async def today_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Show another page of a /today message"""
+    query = update.callback_query
+    group_id = query.message.chat.id
+    key = (group_id, query.message.message_id)
+    
+    pages = today_pages.get(key)
+    if pages is None:
+        # Evicted or the bot restarted: render the current targets again
+        targets = await asyncio.to_thread(db.get_all_targets, group_id)
+        pages = format_targets_pages(targets)
+        today_pages.set(key, pages)
+    
+    page = max(0, min(page, len(pages) - 1))
+    await query.answer()
+    await query.edit_message_text(
+        pages[page], parse_mode="Markdown", reply_markup=_today_page_keyboard(page, len(pages))
+    )
 
 
 async def my_targets(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -200,7 +279,7 @@ async def my_targets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -221,6 +300,78 @@ async def my_targets(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(message, parse_mode="Markdown")
 
 
+async def my_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show user's target statistics; `/stats all` includes archived history."""
+    if not update.message:
+        return
+    
+    group_id = update.message.chat.id
+    user_id = update.message.from_user.id
+    
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+    
+    include_archive = bool(context.args) and context.args[0].lower() == "all"
+    
+    # Archive partitions make this a slower query, keep it off the event loop
+    stats = await asyncio.to_thread(db.get_target_stats, user_id, group_id, include_archive)
+    
+    if not stats["total"]:
+        await update.message.reply_text("📭 You haven't set any targets yet!")
+        return
+    
+    rate = int(stats["completed"] / stats["total"] * 100)
+    message = (
+        f"📈 *Your Target Stats*{' (all time)' if include_archive else ''}\n\n"
+        f"🎯 *Targets set:* {stats['total']}\n"
+        f"✅ *Completed:* {stats['completed']} ({rate}%)\n"
+        f"📅 *Since:* {stats['first_date'].strftime('%Y-%m-%d')}"
+    )
+    if not include_archive:
+        message += "\n\nUse `/stats all` to include archived history."
+    
+    await update.message.reply_text(message, parse_mode="Markdown")
+
+
+async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the group's top members for this week (or `/leaderboard month`)."""
+    if not update.message:
+        return
+    
+    group_id = update.message.chat.id
+    
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+    
+    kind = context.args[0].lower() if context.args else "week"
+    if kind not in LEADERBOARD_PERIODS:
+        await update.message.reply_text("❌ Usage: /leaderboard [week|month]")
+        return
+    
+    # Entries are kept ranked as targets change, so this reads just the top rows
+    entries = db.get_leaderboard(group_id, leaderboard_period(kind, datetime.now()), LEADERBOARD_SIZE)
+    if not entries:
+        await update.message.reply_text(f"📭 No targets set this {kind} yet!")
+        return
+    
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    message = f"🏆 *Leaderboard - this {kind}*\n\n"
+    for i, entry in enumerate(entries, 1):
+        message += (
+            f"{medals.get(i, f'{i}.')} @{entry['username']}: "
+            f"{int(entry['rate'] * 100)}% ({entry['completed']}/{entry['targets_set']})"
+        )
+        if entry["streak"] > 1:
+            message += f" 🔥{entry['streak']}"
+        message += "\n"
+    
+    await update.message.reply_text(message, parse_mode="Markdown")
+
+
 async def mark_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mark today's target as completed."""
     if not update.message:
@@ -231,11 +382,11 @@ async def mark_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = update.message.from_user.username or update.message.from_user.first_name
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
-    target = db.get_today_target(user_id)
+    target = db.get_today_target(user_id, group_id)
     
     if not target:
         await update.message.reply_text("📭 You don't have a target for today!")
@@ -245,7 +396,8 @@ async def mark_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("✅ You've already completed today's target!")
         return
     
-    if db.mark_target_completed(user_id):
+    if db.mark_target_completed(user_id, group_id=group_id):
+        request_board_refresh(context, group_id)
         await update.message.reply_text(f"🎉 Congratulations @{username}! Target marked as completed!")
     else:
         await update.message.reply_text("❌ Failed to mark target as completed.")
@@ -259,7 +411,7 @@ async def reset_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_id = update.message.chat.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -271,35 +423,111 @@ async def reset_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Create confirmation keyboard
     keyboard = [
         [
-            InlineKeyboardButton("✅ Yes, reset all data", callback_data="reset_confirm"),
-            InlineKeyboardButton("❌ Cancel", callback_data="reset_cancel")
+            InlineKeyboardButton("✅ Yes, reset all data", callback_data=encode_callback(RESET_CALLBACK, "confirm")),
+            InlineKeyboardButton("❌ Cancel", callback_data=encode_callback(RESET_CALLBACK, "cancel"))
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     await update.message.reply_text(
-        "⚠️ *WARNING: This will delete ALL bot data!*\n\n"
+        "⚠️ *WARNING: This will delete ALL bot data for this group!*\n\n"
         "Are you sure you want to continue?",
         parse_mode="Markdown",
         reply_markup=reply_markup
     )
 
 
-async def reset_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def reset_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
     """Handle reset confirmation callback."""
     query = update.callback_query
     await query.answer()
     
-    if query.data == "reset_confirm":
+    if action == "confirm":
         group_id = query.message.chat.id
-        if db.reset_all_data(group_id):
-            await query.edit_message_text("✅ All bot data has been reset!")
+        await query.edit_message_text("🔄 Resetting data...")
+        
+        # Deletions run in worker threads; this coroutine only reports their progress
+        deleted = {}
+        reset_task = asyncio.create_task(asyncio.to_thread(
+            db.reset_all_data, group_id, progress=deleted.__setitem__
+        ))
+        
+        last_text = None
+        while not reset_task.done():
+            await asyncio.wait({reset_task}, timeout=RESET_PROGRESS_INTERVAL)
+            if reset_task.done() or not deleted:
+                continue
+            
+            # Snapshot: the workers keep adding collections while we render
+            text = "🔄 Resetting data...\n\n" + "\n".join(
+                f"🗑️ {collection}: {count} deleted" for collection, count in sorted(dict(deleted).items())
+            )
+            if text != last_text:
+                try:
+                    await query.edit_message_text(text)
+                    last_text = text
+                except Exception as e:
+                    logger.warning(f"Couldn't update reset progress: {e}")
+        
+        invalidate_triggers(group_id)
+        # The reminder time was stored in the group settings that were just deleted
+        unschedule_nudge(context.job_queue, group_id)
+        if reset_task.result():
+            await query.edit_message_text(
+                f"✅ All bot data has been reset! ({sum(deleted.values())} records deleted)"
+            )
         else:
             await query.edit_message_text("❌ Failed to reset data.")
     else:
         await query.edit_message_text("Reset cancelled.")
 
 
+async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send the group's history as gzipped CSV/NDJSON documents (admin only)."""
+    if not update.message:
+        return
+    
+    group_id = update.message.chat.id
+    user_id = update.message.from_user.id
+    
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+    
+    # Check if user is admin
+    if not await is_admin(update, context):
+        await update.message.reply_text("🚫 This command is for admins only!")
+        return
+    
+    fmt = context.args[0].lower() if context.args else "csv"
+    if fmt not in EXPORT_FORMATS:
+        await update.message.reply_text("❌ Usage: /export [csv|ndjson]")
+        return
+    
+    await update.message.reply_text("📦 Preparing export, the files will be sent to you in DM...")
+    
+    stamp = datetime.now().strftime("%Y%m%d")
+    for collection in EXPORT_COLUMNS:
+        # Cursor reading, encoding and compression all block, so they run in a worker thread
+        export_file, rows = await asyncio.to_thread(build_export, group_id, collection, fmt)
+        try:
+            await context.bot.send_document(
+                chat_id=user_id,
+                document=export_file,
+                filename=f"{collection}_{group_id}_{stamp}.{fmt}.gz",
+                caption=f"📦 {collection}: {rows} rows"
+            )
+        except Exception as e:
+            logger.warning(f"Couldn't send export to admin {user_id}: {e}")
+            await update.message.reply_text(
+                "❌ Couldn't send you the export. Please start a private chat with me first."
+            )
+            return
+        finally:
+            export_file.close()
+
+
 async def bot_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show bot status (admin only)."""
     if not update.message:
@@ -308,7 +536,7 @@ async def bot_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_id = update.message.chat.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -356,7 +584,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     group_id = update.message.chat.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -372,18 +600,27 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "📌 /mytarget - View your today's target\n"
         "📌 /today - View all targets for today\n"
         "📌 /mytargets - View your recent targets\n"
-        "📌 /done - Mark target as completed\n\n"
+        "📌 /done - Mark target as completed\n"
+        "📌 /stats [all] - Your statistics (all = include archive)\n"
+        "📌 /leaderboard [week|month] - Top members by completion rate\n\n"
         
         "*📝 SENTENCE COMMANDS:*\n"
         "📖 /addsentence <text> - Add sentence with category\n"
         "📖 /sentences - View all sentences\n"
         "📖 /mysentences - View your sentences\n"
+        "📖 /search <words> - Search sentences\n"
         "📖 Use #hashtag for categories\n\n"
         
         "*🛠 ADMIN COMMANDS:*\n"
         "⚙️ /addtargetfor @user <target> - Add target for user\n"
         "⚙️ /reset - Reset all bot data\n"
         "⚙️ /status - Check bot status\n"
+        "⚙️ /export [csv|ndjson] - Export group history\n"
+        "⚙️ /triggers - List keyword triggers\n"
+        "⚙️ /addtrigger <word> | <reply> - Add keyword trigger\n"
+        "⚙️ /deltrigger <word> - Remove keyword trigger\n"
+        "⚙️ /nudgetime <HH:MM|off> - Daily reminder for missing targets\n"
+        "⚙️ /liveboard <on|off> - Pinned /today board, updated live\n"
         "⚙️ /help - Show this help\n\n"
         
         "*🔐 REGISTRATION SYSTEM:*\n"
@@ -420,54 +657,39 @@ async def handle_group_message(update: Update, context: ContextTypes.DEFAULT_TYP
     # Check if message is in a group
     if update.message.chat.type in ["group", "supergroup"]:
         group_id = update.message.chat.id
+        gate = update_gate(update, context)
         
         # Check if group is allowed
-        if not db.is_group_allowed(group_id):
+        if not gate.group_allowed:
             # Silently ignore messages from unauthorized groups
             return
         
         # Check if user is verified (for new members)
         user_id = update.message.from_user.id
-        if not db.is_user_verified(user_id, group_id):
+        if not gate.user_verified:
             # User is not verified, check if they're muted
-            if db.is_user_muted(user_id, group_id):
-                # User is still muted, try to delete their message
-                try:
-                    await update.message.delete()
-                    print(f"🗑️ Deleted message from unverified user {user_id}")
-                    
-                    # Send reminder to user
-                    try:
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text=(
-                                "⚠️ *You are not registered yet!*\n\n"
-                                "You need to complete registration before you can send messages.\n"
-                                "Check the group for the registration button."
-                            ),
-                            parse_mode="Markdown"
-                        )
-                    except:
-                        pass  # User might have blocked bot
-                except Exception as e:
-                    print(f"Couldn't delete message from unverified user: {e}")
+            if gate.user_muted:
+                # User is still muted: delete in the chat's next batch and remind (rate limited)
+                queue_deletion(context, group_id, update.message.message_id)
+                await remind_unverified(context, user_id)
             return
         
-        # Verified users can continue
-        
-        # You can add additional message handling here
-        # For example, reacting to certain keywords
-        text = update.message.text.lower()
-        
-        if any(word in text for word in ["target", "goal", "task", "todo"]):
-            await update.message.reply_text(
-                "🎯 Don't forget to set your daily target with /addtarget !"
-            )
+        # Verified users can continue: react to the group's keyword triggers
+        await reply_to_triggers(update)
+
+
+async def archive_old_data_job(context: ContextTypes.DEFAULT_TYPE):
+    """Move old targets and sentences into the cold archive (scheduled job)"""
+    try:
+        moved = await asyncio.to_thread(db.archive_old_data)
+        logger.info(f"🗄️ Archived old data: {moved}")
+    except Exception as e:
+        logger.error(f"Error in archive_old_data_job: {e}")
 
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Log errors."""
-    print(f"Update {update} caused error {context.error}")
+    logger.error(f"Update {update} caused error {context.error}", exc_info=context.error)
     
     # Try to notify admin if possible
     if update and update.effective_chat:
@@ -0,0 +1,119 @@
+"""
+Durable scheduled jobs: persisted schedule, misfire grace, coalescing and a per-job lease
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, time, timedelta, timezone
+
+from telegram.ext import ContextTypes
+
+from src.cache import REPLICA_ID
+from src.database import db
+
+logger = logging.getLogger(__name__)
+
+# A run that is late by more than this many seconds (e.g. the bot was down) is skipped, not caught up
+JOB_MISFIRE_GRACE = int(os.getenv("JOB_MISFIRE_GRACE", "600"))
+# Seconds a replica holds a job while running it; a crashed replica's lease simply expires
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+# Lets a replica whose clock is slightly behind still claim its occurrence
+JOB_CLOCK_TOLERANCE = timedelta(seconds=30)
+EVERY_DAY = tuple(range(7))
+
+# Missed runs are merged into one, and late runs within the grace still happen
+JOB_KWARGS = {"misfire_grace_time": JOB_MISFIRE_GRACE, "coalesce": True}
+
+
+def _utcnow() -> datetime:
+    """Current time as the naive UTC datetime the job store keeps"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _next_daily(after: datetime, at: time, days) -> datetime:
+    """First occurrence of a daily job strictly after `after` (both naive UTC)"""
+    tz = at.tzinfo or timezone.utc
+    local = after.replace(tzinfo=timezone.utc).astimezone(tz)
+    for offset in range(8):
+        day = local.date() + timedelta(days=offset)
+        candidate = datetime.combine(day, at.replace(tzinfo=None), tzinfo=tz)
+        # PTB numbers days from Sunday = 0
+        if (day.weekday() + 1) % 7 in days and candidate > local:
+            return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+    raise ValueError(f"No run day in {days}")
+
+
+def _durable(name: str, callback, next_run_after, guard=None):
+    """Wrap a job callback so each occurrence runs once, on whichever replica claims it first.
+    An async guard(context) returning False skips the occurrence before anything is claimed.
+    """
+    async def run(context: ContextTypes.DEFAULT_TYPE):
+        if guard is not None and not await guard(context):
+            return
+
+        now = _utcnow()
+        try:
+            claimed = await asyncio.to_thread(
+                db.claim_job, name, now + JOB_CLOCK_TOLERANCE, next_run_after(now), REPLICA_ID, JOB_LEASE_SECONDS
+            )
+        except Exception as e:
+            logger.error(f"Error claiming job {name}: {e}")
+            return
+        if not claimed:
+            return  # Already run by another replica, or still running
+
+        try:
+            await callback(context)
+        finally:
+            try:
+                await asyncio.to_thread(db.release_job, name, REPLICA_ID, _utcnow())
+            except Exception as e:
+                logger.error(f"Error releasing job {name}: {e}")
+
+    return run
+
+
+def _missed_run(name: str):
+    """How late the persisted next run of a job is, in seconds (None if not due or unknown)"""
+    try:
+        state = db.get_job_state(name)
+    except Exception as e:
+        logger.error(f"Error loading job state of {name}: {e}")
+        return None
+    if not state or not state.get("next_run"):
+        return None
+    return (_utcnow() - state["next_run"]).total_seconds()
+
+
+def run_repeating(job_queue, callback, interval: float, name: str, first: float = 0, **kwargs):
+    """Durable run_repeating: keeps the persisted cadence across restarts instead of restarting it"""
+    late = _missed_run(name)
+    if late is not None:
+        if late <= 0:
+            first = -late
+        elif late <= JOB_MISFIRE_GRACE:
+            first = 0  # One coalesced catch-up run
+        else:
+            first = interval - late % interval  # Skip what was missed, keep the cadence
+
+    job = _durable(name, callback, lambda now: now + timedelta(seconds=interval))
+    return job_queue.run_repeating(job, interval, first=first, name=name, job_kwargs=JOB_KWARGS, **kwargs)
+
+
+def run_daily(job_queue, callback, at: time, name: str, days=EVERY_DAY, guard=None, **kwargs):
+    """Durable run_daily: a run missed while the bot was down is caught up once, within the grace"""
+    job = _durable(name, callback, lambda now: _next_daily(now, at, days), guard)
+
+    late = _missed_run(name)
+    if late is not None and 0 < late <= JOB_MISFIRE_GRACE:
+        job_queue.run_once(job, 0, name=name, **kwargs)
+
+    return job_queue.run_daily(job, at, days=days, name=name, job_kwargs=JOB_KWARGS, **kwargs)
+
+
+def forget_job(name: str):
+    """Drop a job's persisted schedule, e.g. after its time was changed"""
+    try:
+        db.delete_job_state(name)
+    except Exception as e:
+        logger.error(f"Error deleting job state of {name}: {e}")
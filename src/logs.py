@@ -0,0 +1,130 @@
+"""
+Structured JSON logging, written by a background thread so handlers never block on stdout
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from src.tracing import current_trace_id
+
+# Root level, and per-logger overrides, e.g. LOG_LEVELS="src.registration:DEBUG,telegram:WARNING"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+DEFAULT_LOG_LEVELS = "httpx:WARNING,apscheduler:WARNING"
+
+# Fraction of high-volume INFO/DEBUG events that is kept, by the event's `sample` key;
+# override with e.g. LOG_SAMPLE_RATES="rate_limited:0.5,member_event:1"
+DEFAULT_SAMPLE_RATES = {
+    "rate_limited": 0.1,
+    "member_event": 0.2,
+    "private_start": 0.2,
+    "unverified_deleted": 0.1,
+}
+
+# LogRecord attributes that aren't user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "sample"}
+
+_listener = None
+
+
+def _parse_overrides(value: str) -> dict:
+    """Parse "name:value,name:value" into a dict"""
+    overrides = {}
+    for entry in filter(None, value.split(",")):
+        name, _, setting = entry.partition(":")
+        overrides[name.strip()] = setting.strip()
+    return overrides
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of the INFO/DEBUG records tagged with extra={"sample": key}"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or record.levelno > logging.INFO:
+            return True
+        rate = self.rates.get(key, 1.0)
+        if rate < 1.0:
+            # Lets readers scale counts of sampled events back up
+            record.sample_rate = rate
+        return random.random() < rate
+
+
+class StructuredQueueHandler(QueueHandler):
+    """QueueHandler that renders message and traceback in the caller's thread but keeps them apart"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _add_trace_id(record: logging.LogRecord) -> bool:
+    """Tag records logged while handling an update with its trace id"""
+    trace_id = current_trace_id()
+    if trace_id:
+        record.trace_id = trace_id
+    return True
+
+
+def setup_logging():
+    """Route all logging through a queue to a JSON stdout handler on a listener thread (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    rates.update({key: float(rate) for key, rate in _parse_overrides(os.getenv("LOG_SAMPLE_RATES", "")).items()})
+
+    # The queue handler only enqueues; sampling runs first, so dropped records cost nothing more
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(rates))
+    queue_handler.addFilter(_add_trace_id)
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    levels = _parse_overrides(DEFAULT_LOG_LEVELS)
+    levels.update(_parse_overrides(os.getenv("LOG_LEVELS", "")))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
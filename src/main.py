@@ -27,11 +27,12 @@ def main():
     from src.handlers import (
         start, add_target, add_target_for_user, my_target,
         today_targets, my_targets, mark_done, reset_data,
-        reset_callback, bot_status, help_command,
+        RESET_CALLBACK, reset_callback, bot_status, help_command,
         handle_message, error_handler
     )
     from src.registration import setup_registration_handlers, check_muted_users
     from health_check import start_health_server
+    from src.callbacks import router
     
     # Start health check server in background
     health_thread = start_health_server()
@@ -51,8 +52,9 @@ def main():
     application.add_handler(CommandHandler("reset", reset_data))
     application.add_handler(CommandHandler("status", bot_status))
     
-    # Register callback handler for reset confirmation
-    application.add_handler(CallbackQueryHandler(reset_callback, pattern="^reset_"))
+    # Register the callback dispatcher and the reset confirmation route
+    application.add_handler(CallbackQueryHandler(router.dispatch))
+    router.add(RESET_CALLBACK, reset_callback, str, legacy="reset_")
     
     # Register message handler for groups
     application.add_handler(MessageHandler(filters.ChatType.GROUP & filters.TEXT & ~filters.COMMAND, handle_message))
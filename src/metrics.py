@@ -0,0 +1,114 @@
+"""
+In-process counters for the /metrics endpoint, including storage calls per update
+"""
+import functools
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from telegram.ext import Application
+
+from src.tracing import SPAN_KIND_CLIENT, span, trace_update
+
+# Upper bounds of the "storage calls per update" histogram buckets (the last bucket is unbounded)
+DB_CALL_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+
+class UpdateStats:
+    """What handling one update cost"""
+
+    __slots__ = ("db_calls",)
+
+    def __init__(self):
+        self.db_calls = 0
+
+
+# Stats of the update being handled; to_thread and create_task carry it along
+current_update = ContextVar("current_update", default=None)
+# Set while a storage method runs, so the methods it calls itself aren't counted again
+_in_storage_call = threading.local()
+
+
+class Metrics:
+    """Counters shared with the health server thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._db_calls_per_update = [0] * (len(DB_CALL_BUCKETS) + 1)
+
+    def inc(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe_update(self, stats: UpdateStats):
+        bucket = bisect_left(DB_CALL_BUCKETS, stats.db_calls)
+        with self._lock:
+            self._counters["updates"] = self._counters.get("updates", 0) + 1
+            self._counters["update_db_calls"] = self._counters.get("update_db_calls", 0) + stats.db_calls
+            self._db_calls_per_update[bucket] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f"le_{bound}" for bound in DB_CALL_BUCKETS] + ["inf"]
+            return {
+                "counters": dict(self._counters),
+                "db_calls_per_update": dict(zip(labels, self._db_calls_per_update)),
+            }
+
+
+metrics = Metrics()
+
+
+def _counted(method, system: str):
+    span_name = f"db.{method.__name__}"
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if getattr(_in_storage_call, "active", False):
+            return method(*args, **kwargs)
+
+        stats = current_update.get()
+        if stats is not None:
+            stats.db_calls += 1
+        metrics.inc("db_calls")
+
+        _in_storage_call.active = True
+        try:
+            with span(span_name, SPAN_KIND_CLIENT, **{"db.system": system}):
+                return method(*args, **kwargs)
+        finally:
+            _in_storage_call.active = False
+
+    return wrapper
+
+
+def _does_io(backend, name: str) -> bool:
+    if name.startswith("_find_"):
+        return True
+    return not name.startswith("_") and name not in backend.IN_MEMORY_METHODS
+
+
+def count_db_calls(backend):
+    """Wrap the backend's storage methods so each call is counted against the current update and traced.
+    Cached reads are counted only when they miss, through the `_find_*` or load method they fall back to.
+    """
+    system = type(backend).__name__
+    for name in dir(type(backend)):
+        if _does_io(backend, name) and callable(getattr(type(backend), name)):
+            setattr(backend, name, _counted(getattr(backend, name), system))
+    return backend
+
+
+class MeteredApplication(Application):
+    """Application that traces each update and records its storage calls once its blocking handlers are done"""
+
+    async def process_update(self, update: object):
+        stats = UpdateStats()
+        token = current_update.set(stats)
+        try:
+            with trace_update(update):
+                await super().process_update(update)
+        finally:
+            current_update.reset(token)
+            metrics.observe_update(stats)
@@ -0,0 +1,84 @@
+"""
+Batched moderation of messages from unverified users
+"""
+import logging
+import os
+import time
+
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# Seconds deletions are collected per chat before one deleteMessages call
+DELETE_FLUSH_DELAY = float(os.getenv("DELETE_FLUSH_DELAY", "2"))
+# Minimum seconds between two "you are not registered" DMs to the same user
+UNVERIFIED_REMINDER_COOLDOWN = float(os.getenv("UNVERIFIED_REMINDER_COOLDOWN", "3600"))
+# Telegram accepts at most 100 message ids per deleteMessages call
+MAX_DELETE_BATCH = 100
+# Reminder timestamps are pruned once the map grows past this size
+MAX_TRACKED_REMINDERS = 10000
+
+_pending_deletions = {}
+_last_reminders = {}
+
+UNVERIFIED_REMINDER_TEXT = (
+    "⚠️ *You are not registered yet!*\n\n"
+    "You need to complete registration before you can send messages.\n"
+    "Check the group for the registration button."
+)
+
+
+async def _flush_deletions(context: ContextTypes.DEFAULT_TYPE):
+    """Delete every message queued for a chat (scheduled once per batch)"""
+    chat_id = context.job.chat_id
+    message_ids = _pending_deletions.pop(chat_id, [])
+
+    for start in range(0, len(message_ids), MAX_DELETE_BATCH):
+        batch = message_ids[start:start + MAX_DELETE_BATCH]
+        try:
+            await context.bot.delete_messages(chat_id=chat_id, message_ids=batch)
+            logger.info(
+                "🗑️ Deleted %s message(s) from unverified users in %s", len(batch), chat_id,
+                extra={"sample": "unverified_deleted", "group_id": chat_id}
+            )
+        except Exception as e:
+            logger.warning(f"Couldn't delete messages from unverified users: {e}")
+
+
+def queue_deletion(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_id: int):
+    """Queue a message for the chat's next bulk deletion"""
+    pending = _pending_deletions.setdefault(chat_id, [])
+    if not pending:
+        context.job_queue.run_once(_flush_deletions, DELETE_FLUSH_DELAY, chat_id=chat_id)
+    pending.append(message_id)
+
+
+def _reminder_due(user_id: int) -> bool:
+    """Tell whether a user may get a reminder now, recording it if so"""
+    now = time.monotonic()
+    last = _last_reminders.get(user_id)
+    if last is not None and now - last < UNVERIFIED_REMINDER_COOLDOWN:
+        return False
+
+    if len(_last_reminders) >= MAX_TRACKED_REMINDERS:
+        for tracked_user, sent_at in list(_last_reminders.items()):
+            if now - sent_at >= UNVERIFIED_REMINDER_COOLDOWN:
+                del _last_reminders[tracked_user]
+
+    _last_reminders[user_id] = now
+    return True
+
+
+async def remind_unverified(context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """DM an unverified user a registration reminder, at most once per cooldown"""
+    if not _reminder_due(user_id):
+        return
+
+    try:
+        await context.bot.send_message(
+            chat_id=user_id,
+            text=UNVERIFIED_REMINDER_TEXT,
+            parse_mode="Markdown"
+        )
+    except Exception:
+        pass  # User might have blocked bot
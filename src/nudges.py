@@ -0,0 +1,174 @@
+"""
+Per-group daily reminders for members who haven't set today's target
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from src import jobs
+from src.database import db
+from src.gate import update_gate
+from src.utils import is_admin
+
+logger = logging.getLogger(__name__)
+
+# Zone the configured HH:MM reminder times are in
+NUDGE_TIMEZONE = ZoneInfo(os.getenv("NUDGE_TIMEZONE", "UTC"))
+# Members mentioned per reminder message; larger groups get several messages
+NUDGE_MENTIONS_PER_MESSAGE = 50
+
+
+def _job_name(group_id: int) -> str:
+    return f"nudge_{group_id}"
+
+
+def _parse_nudge_time(value: str):
+    """Parse HH:MM into a time in NUDGE_TIMEZONE, or None if malformed"""
+    try:
+        return datetime.strptime(value, "%H:%M").time().replace(tzinfo=NUDGE_TIMEZONE)
+    except ValueError:
+        return None
+
+
+async def nudge_missing_members(context: ContextTypes.DEFAULT_TYPE):
+    """Remind a group's verified members who have no target today (one daily job per group)"""
+    group_id = context.job.chat_id
+
+    try:
+        missing = await asyncio.to_thread(db.get_members_without_target, group_id)
+    except Exception as e:
+        logger.error(f"Error computing target reminders for {group_id}: {e}")
+        return
+
+    if not missing:
+        return
+
+    mentions = [f"@{member['username']}" for member in missing if member.get("username")]
+    for start in range(0, len(mentions), NUDGE_MENTIONS_PER_MESSAGE):
+        try:
+            await context.bot.send_message(
+                chat_id=group_id,
+                text=(
+                    "⏰ Reminder: you haven't set today's target yet!\n"
+                    f"{', '.join(mentions[start:start + NUDGE_MENTIONS_PER_MESSAGE])}\n\n"
+                    "Use /addtarget <target> to set it."
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Couldn't send target reminder to {group_id}: {e}")
+            return
+    logger.info(f"⏰ Reminded {len(missing)} member(s) in {group_id}")
+
+
+async def _nudge_time_unchanged(context: ContextTypes.DEFAULT_TYPE) -> bool:
+    """Guard of the reminder job: another replica may have changed or disabled the time since it was
+    scheduled here. Such a stale job is moved to the persisted time (or dropped) instead of running,
+    so it never claims the day's run away from the current schedule.
+    """
+    group_id, scheduled_time = context.job.chat_id, context.job.data
+    try:
+        nudge_time = await asyncio.to_thread(db.get_nudge_time, group_id)
+    except Exception as e:
+        logger.error(f"Error loading reminder time of {group_id}: {e}")
+        return False
+
+    if nudge_time == scheduled_time:
+        return True
+
+    logger.info(f"⏰ Reminder time of {group_id} changed from {scheduled_time} to {nudge_time}, rescheduling")
+    if nudge_time:
+        schedule_nudge(context.job_queue, group_id, nudge_time)
+    else:
+        unschedule_nudge(context.job_queue, group_id)
+    return False
+
+
+def unschedule_nudge(job_queue, group_id: int):
+    """Cancel a group's daily reminder job, if any"""
+    for job in job_queue.get_jobs_by_name(_job_name(group_id)):
+        job.schedule_removal()
+
+
+def schedule_nudge(job_queue, group_id: int, nudge_time: str) -> bool:
+    """(Re)schedule a group's daily reminder at HH:MM"""
+    at = _parse_nudge_time(nudge_time)
+    if at is None:
+        logger.warning(f"⚠️ Ignoring invalid reminder time {nudge_time!r} for {group_id}")
+        return False
+
+    unschedule_nudge(job_queue, group_id)
+    jobs.run_daily(
+        job_queue, nudge_missing_members, at, name=_job_name(group_id), guard=_nudge_time_unchanged,
+        chat_id=group_id, data=nudge_time
+    )
+    return True
+
+
+def schedule_all_nudges(job_queue) -> int:
+    """Schedule the reminder of every group that configured one; returns how many"""
+    try:
+        settings = db.get_nudge_times()
+    except Exception as e:
+        logger.error(f"Error loading reminder times: {e}")
+        return 0
+    return sum(schedule_nudge(job_queue, group["group_id"], group["nudge_time"]) for group in settings)
+
+
+async def nudge_time_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Set or disable the group's daily target reminder (admin only)"""
+    if not update.message:
+        return
+
+    group_id = update.message.chat.id
+
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+
+    # Check if user is admin
+    if not await is_admin(update, context):
+        await update.message.reply_text("🚫 This command is for admins only!")
+        return
+
+    if not context.args:
+        await update.message.reply_text(
+            "❌ Usage: /nudgetime <HH:MM> or /nudgetime off\n"
+            f"Times are in {NUDGE_TIMEZONE.key}."
+        )
+        return
+
+    value = context.args[0].lower()
+    if value == "off":
+        db.set_nudge_time(group_id, None)
+        unschedule_nudge(context.job_queue, group_id)
+        jobs.forget_job(_job_name(group_id))
+        await update.message.reply_text("🔕 Daily target reminder disabled.")
+        return
+
+    if _parse_nudge_time(value) is None:
+        await update.message.reply_text("❌ Invalid time. Use 24h format, e.g. /nudgetime 18:30")
+        return
+
+    if not db.set_nudge_time(group_id, value):
+        await update.message.reply_text("❌ This group isn't set up yet. Use /start first.")
+        return
+
+    # The persisted next run belongs to the old time
+    jobs.forget_job(_job_name(group_id))
+    schedule_nudge(context.job_queue, group_id, value)
+    await update.message.reply_text(
+        f"⏰ Members without a target will be reminded daily at {value} ({NUDGE_TIMEZONE.key})."
+    )
+
+
+def setup_nudge_handlers(application):
+    """Setup daily reminder handlers and schedule the configured reminders"""
+    application.add_handler(CommandHandler("nudgetime", nudge_time_command))
+    if application.job_queue:
+        logger.info(f"✅ Scheduled {schedule_all_nudges(application.job_queue)} daily target reminder(s)")
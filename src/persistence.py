@@ -0,0 +1,181 @@
+"""
+PTB persistence on the bot's database, with write-behind batching and idle eviction
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from src.database import db
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two runs of PTB's persistence update (which hands us the changed entries)
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "60"))
+# Seconds staged changes wait, so one update run becomes one batched write
+PERSISTENCE_FLUSH_DELAY = 1
+# Users and chats inactive for this long are dropped from memory (they stay in the DB)
+PERSISTENCE_IDLE_SECONDS = max(float(os.getenv("PERSISTENCE_IDLE_SECONDS", "3600")), 10 * PERSISTENCE_UPDATE_INTERVAL)
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+EMPTY_DIGEST = _digest(pickle.dumps({}))
+
+
+class DatabasePersistence(BasePersistence):
+    """Stores user_data, chat_data, callback_data and conversations through `db`.
+
+    - Write-behind: update_* calls only stage entries; everything staged within
+      PERSISTENCE_FLUSH_DELAY goes out as one batch.
+    - Dirty tracking: an entry is staged only if its serialized form differs from
+      what was last loaded or written, so unchanged entries are never rewritten.
+    - Bounded memory: nothing is loaded at startup. A user's or chat's data is
+      loaded on its first update (refresh_*), and emptied again once idle. The
+      application keeps an empty dict for it until it is used again.
+    """
+
+    def __init__(self):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False),
+            update_interval=PERSISTENCE_UPDATE_INTERVAL
+        )
+        # kind -> key -> digest of the persisted data (for users and chats, present = loaded)
+        self._digests = {"user_data": {}, "chat_data": {}, "callback_data": {}, "conversations": {}}
+        # kind -> key -> (last use, the application's dict for it)
+        self._live = {"user_data": {}, "chat_data": {}}
+        self._conversations = {}
+        # (kind, key) -> serialized data, or None to delete
+        self._pending = {}
+        self._flush_task = None
+
+    # === STAGING ===
+
+    def _stage(self, kind: str, key, data):
+        blob = pickle.dumps(data)
+        digest = _digest(blob)
+        if self._digests[kind].get(key) == digest:
+            return
+        self._digests[kind][key] = digest
+        self._pending[(kind, str(key))] = blob
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        await asyncio.sleep(PERSISTENCE_FLUSH_DELAY)
+        await self._write_pending()
+        self._evict_idle()
+
+    async def _write_pending(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(db.save_persisted, [(kind, key, data) for (kind, key), data in batch.items()])
+        except Exception as e:
+            logger.error(f"Error writing persistence batch of {len(batch)}: {e}")
+            # Keep the failed entries for the next batch, unless they changed again since
+            self._pending = {**batch, **self._pending}
+
+    def _evict_idle(self):
+        deadline = time.monotonic() - PERSISTENCE_IDLE_SECONDS
+        for kind, live in self._live.items():
+            for key in [key for key, (last_used, _) in live.items() if last_used < deadline]:
+                _, data = live.pop(key)
+                data.clear()
+                self._digests[kind].pop(key, None)
+
+    async def _load(self, kind: str, key, data: dict):
+        """Load an entry into the application's dict on first use, and track its activity"""
+        live = self._live[kind]
+        live[key] = (time.monotonic(), data)
+        if key in self._digests[kind]:
+            return
+
+        blob = await asyncio.to_thread(db.load_persisted, kind, str(key))
+        if blob is None:
+            self._digests[kind][key] = EMPTY_DIGEST
+            return
+        data.update(pickle.loads(blob))
+        self._digests[kind][key] = _digest(blob)
+
+    # === BasePersistence ===
+
+    async def get_user_data(self):
+        return {}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        blob = await asyncio.to_thread(db.load_persisted, "callback_data", "")
+        if not blob:
+            return None
+        self._digests["callback_data"][""] = _digest(blob)
+        return pickle.loads(blob)
+
+    async def get_conversations(self, name: str):
+        blob = await asyncio.to_thread(db.load_persisted, "conversations", name)
+        self._conversations[name] = pickle.loads(blob) if blob else {}
+        if blob:
+            self._digests["conversations"][name] = _digest(blob)
+        return dict(self._conversations[name])
+
+    async def update_conversation(self, name: str, key, new_state):
+        conversation = self._conversations.setdefault(name, {})
+        if new_state is None:
+            conversation.pop(key, None)
+        else:
+            conversation[key] = new_state
+        self._stage("conversations", name, conversation)
+
+    async def update_user_data(self, user_id: int, data):
+        self._stage("user_data", user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data):
+        self._stage("chat_data", chat_id, data)
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        self._stage("callback_data", "", data)
+
+    async def drop_user_data(self, user_id: int):
+        self._live["user_data"].pop(user_id, None)
+        self._digests["user_data"].pop(user_id, None)
+        self._pending[("user_data", str(user_id))] = None
+        self._schedule_flush()
+
+    async def drop_chat_data(self, chat_id: int):
+        self._live["chat_data"].pop(chat_id, None)
+        self._digests["chat_data"].pop(chat_id, None)
+        self._pending[("chat_data", str(chat_id))] = None
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data):
+        await self._load("user_data", user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data):
+        await self._load("chat_data", chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        # Let a running batch finish (cancelling it mid-write would lose it), then write the rest
+        if self._flush_task and not self._flush_task.done():
+            await self._flush_task
+        await self._write_pending()
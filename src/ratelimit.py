@@ -0,0 +1,123 @@
+"""
+Token-bucket rate limiting in front of the command handlers
+"""
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from collections import OrderedDict
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Per-user bucket: burst size and tokens regained per second
+USER_BUCKET_CAPACITY = float(os.getenv("RATE_LIMIT_USER_CAPACITY", "10"))
+USER_REFILL_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "0.2"))
+# Per-group bucket, shared by all members of a group
+GROUP_BUCKET_CAPACITY = float(os.getenv("RATE_LIMIT_GROUP_CAPACITY", "60"))
+GROUP_REFILL_RATE = float(os.getenv("RATE_LIMIT_GROUP_RATE", "1"))
+# Seconds between two "slow down" notices to the same user; anything in between is dropped
+NOTICE_COOLDOWN = float(os.getenv("RATE_LIMIT_NOTICE_COOLDOWN", "30"))
+# Buckets tracked per limiter; beyond that the least recently used one is forgotten
+MAX_TRACKED_BUCKETS = 10000
+
+# Aggregation-heavy commands cost more; anything else costs 1
+COMMAND_COSTS = {
+    "today": 3,
+    "sentences": 3,
+    "targetsentences": 3,
+    "search": 3,
+    "stats": 4,
+    "leaderboard": 2,
+    "status": 3,
+    "export": 10,
+}
+# Overrides, e.g. RATE_LIMIT_COSTS="today:5,search:2"
+for _entry in filter(None, os.getenv("RATE_LIMIT_COSTS", "").split(",")):
+    _command, _, _cost = _entry.partition(":")
+    COMMAND_COSTS[_command.strip().lower()] = float(_cost)
+
+SLOW_DOWN_TEXT = "⏳ You're sending commands too fast. Please wait a moment and try again."
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to capacity tokens, refilled continuously"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+
+class RateLimiter:
+    """Keyed token buckets that all share one capacity and refill rate"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        # Least recently used first
+        self._buckets = OrderedDict()
+
+    def bucket(self, key) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            self._buckets.move_to_end(key)
+            return bucket
+
+        if len(self._buckets) >= MAX_TRACKED_BUCKETS:
+            # Idle the longest, so it has most likely refilled, and a full bucket carries no state
+            self._buckets.popitem(last=False)
+        bucket = self._buckets[key] = TokenBucket(self.capacity, self.rate)
+        return bucket
+
+
+user_limiter = RateLimiter(USER_BUCKET_CAPACITY, USER_REFILL_RATE)
+group_limiter = RateLimiter(GROUP_BUCKET_CAPACITY, GROUP_REFILL_RATE)
+_last_notices = {}
+
+
+def _command_name(text: str) -> str:
+    """Extract the command from '/cmd@BotName args'"""
+    return text.split(maxsplit=1)[0][1:].split("@", 1)[0].lower()
+
+
+async def rate_limit_commands(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Stop over-limit commands before any command handler runs (handler group -1)"""
+    message = update.message
+    if not message or not message.text or not message.text.startswith("/") or not message.from_user:
+        return
+
+    cost = COMMAND_COSTS.get(_command_name(message.text), 1)
+    user_bucket = user_limiter.bucket(message.from_user.id)
+    group_bucket = group_limiter.bucket(message.chat.id)
+
+    # Only charge when both buckets can pay, so a rejected command costs nothing
+    if user_bucket.refill() >= cost and group_bucket.refill() >= cost:
+        user_bucket.tokens -= cost
+        group_bucket.tokens -= cost
+        return
+
+    now = time.monotonic()
+    if now - _last_notices.get(message.from_user.id, float("-inf")) >= NOTICE_COOLDOWN:
+        _last_notices[message.from_user.id] = now
+        if len(_last_notices) > MAX_TRACKED_BUCKETS:
+            _last_notices.clear()
+        try:
+            await message.reply_text(SLOW_DOWN_TEXT)
+        except Exception as e:
+            logger.warning(f"Couldn't send rate limit notice: {e}")
+
+    logger.info(
+        "⏳ Rate limited /%s from user %s in %s", _command_name(message.text), message.from_user.id, message.chat.id,
+        extra={"sample": "rate_limited", "user_id": message.from_user.id, "group_id": message.chat.id}
+    )
+    raise ApplicationHandlerStop
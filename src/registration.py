@@ -2,15 +2,41 @@
 Registration module for new members with inline button declaration acceptance
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CallbackQueryHandler, MessageHandler, filters, CommandHandler
+from telegram.ext import ContextTypes, MessageHandler, filters, CommandHandler
 from datetime import datetime, timedelta
+from collections import deque
+import asyncio
 import logging
+import os
+import time
 
+from src.callbacks import encode_callback, router
 from src.database import db
+from src.gate import update_gate
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Join-burst handling: this many joins within the window switches a group to batched admission
+JOIN_BURST_THRESHOLD = int(os.getenv("JOIN_BURST_THRESHOLD", "5"))
+JOIN_BURST_WINDOW = float(os.getenv("JOIN_BURST_WINDOW", "10"))
+# Seconds a burst buffer collects members before they are admitted together
+JOIN_BURST_FLUSH_DELAY = float(os.getenv("JOIN_BURST_FLUSH_DELAY", "3"))
+# Concurrent restrict_chat_member calls, to stay under Telegram's limits
+RESTRICT_CONCURRENCY = int(os.getenv("RESTRICT_CONCURRENCY", "5"))
+MAX_WELCOME_MENTIONS = 50
+# Hours after joining at which pending users get a DM reminder; every 12 hours after the first day
+REMINDER_HOURS = [1, 6, 12, 18, 23]
+
+# Callback route codes (see src/callbacks.py)
+VIEW_RULES_CALLBACK = "r"
+ACCEPT_CALLBACK = "a"
+DECLINE_CALLBACK = "d"
+
+_recent_joins = {}
+_pending_joins = {}
+_restrict_limiter = asyncio.Semaphore(RESTRICT_CONCURRENCY)
+
 # Declaration text that users must accept
 DECLARATION_TEXT = """📋 *GROUP DECLARATION & RULES*
 
@@ -29,57 +55,24 @@ By joining this group, you agree to:
 """
 
 
-async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle new member joining - Mute them and ask for registration"""
-    if not update.message or not update.message.new_chat_members:
-        return
-    
-    group_id = update.message.chat.id
-    print(f"👥 New member event in group {group_id}")
-    
-    # Check if group is allowed
-    if not db.is_group_allowed(group_id):
-        print(f"❌ Group {group_id} not allowed")
-        return
+def _in_join_burst(group_id: int, joined: int) -> bool:
+    """Record joins for a group and tell whether it is currently in a join burst"""
+    now = time.monotonic()
+    recent = _recent_joins.setdefault(group_id, deque())
+    recent.extend([now] * joined)
+    while recent and now - recent[0] > JOIN_BURST_WINDOW:
+        recent.popleft()
     
-    for new_member in update.message.new_chat_members:
-        # Skip if the new member is the bot itself
-        if new_member.id == context.bot.id:
-            continue
-        
-        user_id = new_member.id
-        username = new_member.username or new_member.first_name
-        
-        print(f"👤 New member: {username} (ID: {user_id}) in group {group_id}")
-        
-        # Check if user is already verified
-        if db.is_user_verified(user_id, group_id):
-            print(f"✅ User {username} is already verified")
-            await update.message.reply_text(
-                f"👋 Welcome back @{username}! You're already verified."
-            )
-            continue
-        
-        # Create registration record
-        registration_success = db.create_registration(user_id, group_id, username)
-        
-        if not registration_success:
-            print(f"❌ Failed to create registration for {username}")
-            await update.message.reply_text(
-                f"❌ Failed to create registration for @{username}. Please contact admin."
-            )
-            continue
-        
-        print(f"📝 Created registration record for {username}")
-        
-        # Mute the user permanently (until they register)
-        db.mute_user(user_id, group_id)
-        print(f"🔇 Permanently muted user {username} until registration")
-        
-        # Try to restrict user permanently (requires admin permissions)
+    # Once a burst buffer is open, keep feeding it until it is flushed
+    return group_id in _pending_joins or len(recent) >= JOIN_BURST_THRESHOLD
+
+
+async def _restrict_new_member(bot, group_id: int, user_id: int) -> bool:
+    """Restrict a new member permanently, bounded by the shared restriction limiter"""
+    async with _restrict_limiter:
         try:
-            # Restrict user permanently (no until_date = permanent)
-            await context.bot.restrict_chat_member(
+            # No until_date = permanent restriction
+            await bot.restrict_chat_member(
                 chat_id=group_id,
                 user_id=user_id,
                 permissions={
@@ -92,96 +85,192 @@ async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     'can_invite_users': False,
                     'can_pin_messages': False
                 }
-                # No until_date = permanent restriction
             )
-            print(f"✅ Successfully restricted user {username} permanently")
+            return True
         except Exception as e:
-            print(f"⚠️ Could not restrict user (bot needs admin): {e}")
-            await update.message.reply_text(
+            logger.warning(f"⚠️ Could not restrict user {user_id} (bot needs admin): {e}")
+            return False
+
+
+def _mention_list(usernames) -> str:
+    """Join usernames into mentions, truncated so the message stays short"""
+    mentions = ", ".join(f"@{username}" for username in usernames[:MAX_WELCOME_MENTIONS])
+    if len(usernames) > MAX_WELCOME_MENTIONS:
+        mentions += f" and {len(usernames) - MAX_WELCOME_MENTIONS} more"
+    return mentions
+
+
+async def _admit_members(bot, group_id: int, members):
+    """Register, mute and welcome a batch of new members with one message"""
+    # Deduplicate (a user may appear twice within one burst)
+    members = list({member.id: member for member in members}.values())
+    usernames = {member.id: member.username or member.first_name for member in members}
+    
+    verified = db.get_verified_user_ids(group_id, list(usernames))
+    if verified:
+        logger.info(f"✅ {len(verified)} returning verified member(s) in group {group_id}")
+        await bot.send_message(
+            chat_id=group_id,
+            text=f"👋 Welcome back {_mention_list([usernames[user_id] for user_id in verified])}! You're already verified."
+        )
+    
+    new_members = [(user_id, username) for user_id, username in usernames.items() if user_id not in verified]
+    if not new_members:
+        return
+    
+    # Registrations and mutes for the whole batch in one bulk write each
+    if not db.register_new_members(group_id, new_members):
+        await bot.send_message(
+            chat_id=group_id,
+            text=f"❌ Failed to create registration for {_mention_list([username for _, username in new_members])}. Please contact admin."
+        )
+        return
+    logger.info(f"📝 Registered and muted {len(new_members)} new member(s) in group {group_id}")
+    
+    results = await asyncio.gather(*(
+        _restrict_new_member(bot, group_id, user_id) for user_id, _ in new_members
+    ))
+    if not any(results):
+        await bot.send_message(
+            chat_id=group_id,
+            text=(
                 "⚠️ *Bot Warning:* I need admin permissions to mute new members!\n"
                 "Please make me an admin with:\n"
                 "• Delete messages\n"
                 "• Restrict members\n"
-                "• Ban members",
-                parse_mode="Markdown"
-            )
-            continue
-        
-        # Get bot username safely
-        try:
-            bot_info = await context.bot.get_me()
-            bot_username = bot_info.username
-            registration_link = f"https://t.me/{bot_username}?start=register_{group_id}"
-            print(f"🔗 Registration link: {registration_link}")
-        except Exception as e:
-            print(f"❌ Could not get bot username: {e}")
-            # Fallback: user will need to start the bot manually
-            registration_link = f"https://t.me/{context.bot.username}?start=register_{group_id}" if context.bot.username else None
-        
-        if not registration_link:
-            await update.message.reply_text(
-                f"👋 Welcome @{username}!\n\n"
+                "• Ban members"
+            ),
+            parse_mode="Markdown"
+        )
+        return
+    restricted = [username for (_, username), ok in zip(new_members, results) if ok]
+    
+    # Bot identity is fetched once at startup (see src/warmup.py)
+    try:
+        registration_link = f"https://t.me/{bot.username}?start=register_{group_id}"
+    except RuntimeError as e:
+        logger.error(f"❌ Could not get bot username: {e}")
+        # Fallback: user will need to start the bot manually
+        registration_link = None
+    
+    if not registration_link:
+        await bot.send_message(
+            chat_id=group_id,
+            text=(
+                f"👋 Welcome {_mention_list(restricted)}!\n\n"
                 "⚠️ Please start a chat with me (DM) and send:\n"
                 f"/start register_{group_id}\n\n"
                 "To complete registration."
             )
-            return
-        
-        # Create registration button
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    "📝 Complete Registration (DM Bot)",
-                    url=registration_link
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    "📋 View Group Rules",
-                    callback_data=f"view_rules_{user_id}"
-                )
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        welcome_message = (
-            f"👋 Welcome @{username} to the group!\n\n"
-            "⚠️ *REGISTRATION REQUIRED*\n\n"
-            "📝 *Before participating, you must:*\n"
-            "1. Click the button below to open DM with bot\n"
-            "2. Read and accept the group declaration\n"
-            "3. You'll be automatically unmuted\n\n"
-            "🔒 *Important:* You will remain muted until you complete registration.\n"
-            "🔐 *Click the button below to start registration*"
         )
-        
-        # Send welcome message
-        try:
-            await update.message.reply_text(
-                welcome_message,
-                parse_mode="Markdown",
-                reply_markup=reply_markup
+        return
+    
+    # One registration button shared by everyone in the batch
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                "📝 Complete Registration (DM Bot)",
+                url=registration_link
             )
-            print(f"✅ Sent welcome message to {username}")
-            
-        except Exception as e:
-            print(f"❌ Error sending welcome message: {e}")
+        ],
+        [
+            InlineKeyboardButton(
+                "📋 View Group Rules",
+                callback_data=encode_callback(VIEW_RULES_CALLBACK, group_id)
+            )
+        ]
+    ]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    welcome_message = (
+        f"👋 Welcome {_mention_list(restricted)} to the group!\n\n"
+        "⚠️ *REGISTRATION REQUIRED*\n\n"
+        "📝 *Before participating, you must:*\n"
+        "1. Click the button below to open DM with bot\n"
+        "2. Read and accept the group declaration\n"
+        "3. You'll be automatically unmuted\n\n"
+        "🔒 *Important:* You will remain muted until you complete registration.\n"
+        "🔐 *Click the button below to start registration*"
+    )
+    
+    # Send welcome message
+    try:
+        await bot.send_message(
+            chat_id=group_id,
+            text=welcome_message,
+            parse_mode="Markdown",
+            reply_markup=reply_markup
+        )
+        logger.info(f"✅ Sent welcome message for {len(restricted)} new member(s)")
+    except Exception as e:
+        logger.error(f"❌ Error sending welcome message: {e}")
+
+
+async def _flush_join_burst(context: ContextTypes.DEFAULT_TYPE):
+    """Admit everyone buffered during a join burst (scheduled once per burst)"""
+    group_id = context.job.chat_id
+    members = _pending_joins.pop(group_id, [])
+    if members:
+        logger.info(f"🌊 Flushing join burst of {len(members)} member(s) in group {group_id}")
+        await _admit_members(context.bot, group_id, members)
+
+
+async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle new member joining - Mute them and ask for registration"""
+    if not update.message or not update.message.new_chat_members:
+        return
+    
+    group_id = update.message.chat.id
+    logger.info("👥 New member event in group %s", group_id, extra={"sample": "member_event", "group_id": group_id})
+    
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        logger.info(f"❌ Group {group_id} not allowed")
+        return
+    
+    # Skip the bot itself
+    members = [member for member in update.message.new_chat_members if member.id != context.bot.id]
+    if not members:
+        return
+    
+    if _in_join_burst(group_id, len(members)):
+        # Buffer the burst and admit it with one welcome message after a short delay
+        pending = _pending_joins.setdefault(group_id, [])
+        if not pending:
+            context.job_queue.run_once(_flush_join_burst, JOIN_BURST_FLUSH_DELAY, chat_id=group_id)
+        pending.extend(members)
+        return
+    
+    await _admit_members(context.bot, group_id, members)
 
 
-async def view_rules_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Callback for viewing rules in group"""
+async def view_rules_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: int):
+    """Callback for viewing rules in group: sent to the tapping user by DM, since the
+    welcome message (and its buttons) may be shared by a whole join burst
+    """
     query = update.callback_query
-    await query.answer()
     
-    await query.edit_message_text(
-        DECLARATION_TEXT + "\n\n" +
-        "📌 *To complete registration:*\n"
-        "1. Click 'Complete Registration' button\n"
-        "2. You'll be redirected to bot DM\n"
-        "3. Accept declaration with inline button\n"
-        "4. You'll be automatically unmuted",
-        parse_mode="Markdown"
-    )
+    try:
+        await context.bot.send_message(
+            chat_id=query.from_user.id,
+            text=DECLARATION_TEXT + "\n\n" +
+                 "📌 *To complete registration:*\n"
+                 "1. Click 'Complete Registration' button\n"
+                 "2. You'll be redirected to bot DM\n"
+                 "3. Accept declaration with inline button\n"
+                 "4. You'll be automatically unmuted",
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        # The user hasn't started the bot yet, so it can't DM them
+        logger.info(f"Could not DM rules to {query.from_user.id}: {e}")
+        await query.answer(
+            "📋 Tap 'Complete Registration' to read the group rules and accept them in the bot's DM.",
+            show_alert=True
+        )
+        return
+    
+    await query.answer("📋 Rules sent to you in a private message.")
 
 
 async def handle_private_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -192,7 +281,9 @@ async def handle_private_start(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.message.from_user.id
     username = update.message.from_user.username or update.message.from_user.first_name
     
-    print(f"🔑 Private /start from {username} (ID: {user_id})")
+    logger.info(
+        "🔑 Private /start from %s (ID: %s)", username, user_id, extra={"sample": "private_start", "user_id": user_id}
+    )
     
     # Check if start command has registration parameters
     if context.args and len(context.args) > 0:
@@ -202,7 +293,7 @@ async def handle_private_start(update: Update, context: ContextTypes.DEFAULT_TYP
         if arg.startswith("register_"):
             try:
                 group_id = int(arg.split("_")[1])
-                print(f"📝 Registration attempt for group {group_id} by {username}")
+                logger.info(f"📝 Registration attempt for group {group_id} by {username}")
                 
                 # Check if user is already verified
                 if db.is_user_verified(user_id, group_id):
@@ -241,20 +332,20 @@ async def handle_private_start(update: Update, context: ContextTypes.DEFAULT_TYP
                     'username': username
                 }
                 
-                print(f"📋 Showing declaration to {username} for group {group_id}")
+                logger.info(f"📋 Showing declaration to {username} for group {group_id}")
                 
                 # Send declaration with inline buttons
                 keyboard = [
                     [
                         InlineKeyboardButton(
                             "✅ I ACCEPT THE DECLARATION",
-                            callback_data=f"accept_declaration_{group_id}"
+                            callback_data=encode_callback(ACCEPT_CALLBACK, group_id)
                         )
                     ],
                     [
                         InlineKeyboardButton(
                             "❌ I DECLINE",
-                            callback_data=f"decline_declaration_{group_id}"
+                            callback_data=encode_callback(DECLINE_CALLBACK, group_id)
                         )
                     ]
                 ]
@@ -270,7 +361,7 @@ async def handle_private_start(update: Update, context: ContextTypes.DEFAULT_TYP
                 return
                 
             except (ValueError, IndexError) as e:
-                print(f"❌ Error parsing registration link: {e}")
+                logger.error(f"❌ Error parsing registration link: {e}")
                 await update.message.reply_text(
                     "❌ Invalid registration link. Please use the registration button in the group."
                 )
@@ -291,20 +382,16 @@ async def handle_private_start(update: Update, context: ContextTypes.DEFAULT_TYP
     )
 
 
-async def handle_accept_declaration(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_accept_declaration(update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: int):
     """Handle declaration acceptance via inline button"""
     query = update.callback_query
     await query.answer()
     
-    if not query.data.startswith("accept_declaration_"):
-        return
-    
     try:
-        group_id = int(query.data.split("_")[-1])
         user_id = query.from_user.id
         username = query.from_user.username or query.from_user.first_name
         
-        print(f"✅ User {username} accepting declaration for group {group_id}")
+        logger.info(f"✅ User {username} accepting declaration for group {group_id}")
         
         # Check if registration exists
         registration = db.get_registration(user_id, group_id)
@@ -325,7 +412,7 @@ async def handle_accept_declaration(update: Update, context: ContextTypes.DEFAUL
         
         # Verify registration
         success = db.verify_registration(user_id, group_id)
-        print(f"✅ Verified registration for {username}: {success}")
+        logger.info(f"✅ Verified registration for {username}: {success}")
         
         # Try to get group info
         try:
@@ -351,7 +438,7 @@ async def handle_accept_declaration(update: Update, context: ContextTypes.DEFAUL
                     'can_pin_messages': False
                 }
             )
-            print(f"✅ Unmuted user {username} in group {group_id}")
+            logger.info(f"✅ Unmuted user {username} in group {group_id}")
             
             # Update message in DM
             await query.edit_message_text(
@@ -383,16 +470,16 @@ async def handle_accept_declaration(update: Update, context: ContextTypes.DEFAUL
                          f"*Reminder:* Don't forget to set your daily target with `/addtarget` !",
                     parse_mode="Markdown"
                 )
-                print(f"✅ Sent welcome announcement for {username} in group")
+                logger.info(f"✅ Sent welcome announcement for {username} in group")
             except Exception as e:
-                print(f"⚠️ Could not send welcome message in group: {e}")
+                logger.warning(f"⚠️ Could not send welcome message in group: {e}")
             
             # Clear registration data from user_data
             if 'registration' in context.user_data:
                 del context.user_data['registration']
                 
         except Exception as e:
-            print(f"❌ Error unmuting user: {e}")
+            logger.error(f"❌ Error unmuting user: {e}")
             # Still update registration status even if unmute fails
             await query.edit_message_text(
                 f"✅ Declaration accepted!\n"
@@ -407,24 +494,20 @@ async def handle_accept_declaration(update: Update, context: ContextTypes.DEFAUL
             )
     
     except (ValueError, IndexError) as e:
-        print(f"❌ Error processing acceptance: {e}")
+        logger.error(f"❌ Error processing acceptance: {e}")
         await query.answer("❌ Error processing your acceptance", show_alert=True)
 
 
-async def handle_decline_declaration(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def handle_decline_declaration(update: Update, context: ContextTypes.DEFAULT_TYPE, group_id: int):
     """Handle declaration decline via inline button"""
     query = update.callback_query
     await query.answer()
     
-    if not query.data.startswith("decline_declaration_"):
-        return
-    
     try:
-        group_id = int(query.data.split("_")[-1])
         user_id = query.from_user.id
         
         # Remove registration record
-        db.db.registrations.delete_one({"user_id": user_id, "group_id": group_id})
+        db.delete_registration(user_id, group_id)
         
         # Also remove mute record
         db.unmute_user(user_id, group_id)
@@ -440,10 +523,10 @@ async def handle_decline_declaration(update: Update, context: ContextTypes.DEFAU
             "Thank you for your time!",
             parse_mode="Markdown"
         )
-        print(f"❌ User {user_id} declined declaration for group {group_id}")
+        logger.info(f"❌ User {user_id} declined declaration for group {group_id}")
     
     except Exception as e:
-        print(f"Error processing decline: {e}")
+        logger.error(f"Error processing decline: {e}")
 
 
 async def handle_member_left(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -462,14 +545,20 @@ async def handle_member_left(update: Update, context: ContextTypes.DEFAULT_TYPE)
     db.unmute_user(left_member.id, group_id)
     
     # Update registration status
-    registration = db.get_registration(left_member.id, group_id)
-    if registration:
-        db.db.registrations.update_one(
-            {"user_id": left_member.id, "group_id": group_id},
-            {"$set": {"status": "left_group", "left_at": datetime.now()}}
-        )
+    db.mark_registration_left(left_member.id, group_id)
     
-    print(f"👋 User {left_member.username or left_member.first_name} left group {group_id}")
+    logger.info(
+        "👋 User %s left group %s", left_member.username or left_member.first_name, group_id,
+        extra={"sample": "member_event", "group_id": group_id}
+    )
+
+
+def _reminder_slot(hours: int):
+    """Latest reminder slot (in hours since joining) that is due, or None before the first one"""
+    if hours >= 24:
+        return hours - hours % 12
+    due = [slot for slot in REMINDER_HOURS if slot <= hours]
+    return due[-1] if due else None
 
 
 async def check_muted_users(context: ContextTypes.DEFAULT_TYPE):
@@ -489,52 +578,48 @@ async def check_muted_users(context: ContextTypes.DEFAULT_TYPE):
             # Calculate time since registration
             time_since_registration = datetime.now() - registration['created_at']
             hours = int(time_since_registration.total_seconds() // 3600)
-            minutes = int((time_since_registration.total_seconds() % 3600) // 60)
             
-            # Send reminders at specific intervals
-            reminder_sent = False
+            # Send reminders at specific intervals, each slot only once (the job runs twice an hour)
+            slot = _reminder_slot(hours)
+            if slot is None or slot <= (registration.get('reminder_hour') or 0):
+                continue
             
             # First 24 hours: reminders at 1, 6, 12, 18, 23 hours
             if hours < 24:
-                if hours in [1, 6, 12, 18, 23]:
-                    reminder_text = (
-                        f"⏰ *REGISTRATION REMINDER*\n\n"
-                        f"You've been in the group for {hours} hours.\n\n"
-                        f"*To complete registration:*\n"
-                        f"1. Click the registration button in the group\n"
-                        f"2. Read and accept the declaration in DM\n\n"
-                        f"*Note:* You will remain muted until you register."
-                    )
-                    reminder_sent = True
+                reminder_text = (
+                    f"⏰ *REGISTRATION REMINDER*\n\n"
+                    f"You've been in the group for {hours} hours.\n\n"
+                    f"*To complete registration:*\n"
+                    f"1. Click the registration button in the group\n"
+                    f"2. Read and accept the declaration in DM\n\n"
+                    f"*Note:* You will remain muted until you register."
+                )
             # After 24 hours: reminders every 12 hours
             else:
-                # Send reminder every 12 hours
-                if hours % 12 == 0:
-                    reminder_text = (
-                        f"⏰ *REGISTRATION REMINDER*\n\n"
-                        f"You've been in the group for {hours} hours.\n"
-                        f"You are still muted until you complete registration.\n\n"
-                        f"*To complete registration:*\n"
-                        f"1. Click the registration button in the group\n"
-                        f"2. Read and accept the declaration in DM\n\n"
-                        f"*Note:* You will remain muted until you register."
-                    )
-                    reminder_sent = True
+                reminder_text = (
+                    f"⏰ *REGISTRATION REMINDER*\n\n"
+                    f"You've been in the group for {hours} hours.\n"
+                    f"You are still muted until you complete registration.\n\n"
+                    f"*To complete registration:*\n"
+                    f"1. Click the registration button in the group\n"
+                    f"2. Read and accept the declaration in DM\n\n"
+                    f"*Note:* You will remain muted until you register."
+                )
             
-            # Send reminder if needed
-            if reminder_sent:
-                try:
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=reminder_text,
-                        parse_mode="Markdown"
-                    )
-                    print(f"⏰ Sent reminder to user {user_id} after {hours} hours")
-                except Exception as e:
-                    print(f"⚠️ Could not send reminder to user {user_id}: {e}")
+            try:
+                await context.bot.send_message(
+                    chat_id=user_id,
+                    text=reminder_text,
+                    parse_mode="Markdown"
+                )
+                logger.info(f"⏰ Sent reminder to user {user_id} after {hours} hours")
+            except Exception as e:
+                logger.warning(f"⚠️ Could not send reminder to user {user_id}: {e}")
+            # Recorded either way, so neither a rerun nor a restart resends this slot
+            db.mark_reminder_sent(user_id, group_id, slot)
                     
     except Exception as e:
-        print(f"Error in check_muted_users: {e}")
+        logger.error(f"Error in check_muted_users: {e}")
 
 
 def setup_registration_handlers(application):
@@ -559,22 +644,11 @@ def setup_registration_handlers(application):
         handle_member_left
     ))
     
-    # Callback for viewing rules in group
-    application.add_handler(CallbackQueryHandler(
-        view_rules_callback,
-        pattern="^view_rules_"
-    ))
+    # Button for viewing rules in group
+    router.add(VIEW_RULES_CALLBACK, view_rules_callback, int, legacy="view_rules_")
     
-    # Callback for accepting declaration in DM
-    application.add_handler(CallbackQueryHandler(
-        handle_accept_declaration,
-        pattern="^accept_declaration_"
-    ))
-    
-    # Callback for declining declaration in DM
-    application.add_handler(CallbackQueryHandler(
-        handle_decline_declaration,
-        pattern="^decline_declaration_"
-    ))
+    # Buttons for accepting / declining the declaration in DM
+    router.add(ACCEPT_CALLBACK, handle_accept_declaration, int, legacy="accept_declaration_")
+    router.add(DECLINE_CALLBACK, handle_decline_declaration, int, legacy="decline_declaration_")
     
-    print("✅ Registration handlers setup complete")
\ No newline at end of file
+    logger.info("✅ Registration handlers setup complete")
\ No newline at end of file
@@ -2,11 +2,34 @@
 Sentence/Target management functions
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters, CallbackQueryHandler
+from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 from datetime import datetime
+import asyncio
+import logging
+import os
 import re
 
+from src.callbacks import encode_callback, router
 from src.database import db
+from src.gate import update_gate
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 5
+MAX_STORED_SEARCHES = 50
+# Seconds like taps on a message are collected before its keyboard is redrawn once
+LIKE_REDRAW_DELAY = float(os.getenv("LIKE_REDRAW_DELAY", "3"))
+
+# Callback route codes (see src/callbacks.py)
+LIKE_CALLBACK = "l"
+CATEGORY_CALLBACK = "c"
+SEARCH_PAGE_CALLBACK = "s"
+ADD_SENTENCE_CALLBACK = "n"
+MY_SENTENCES_CALLBACK = "m"
+SHOW_SENTENCES_CALLBACK = "w"
+
+# (chat_id, message_id) -> {"keyboard": latest inline keyboard seen, "likes": {callback data: sentence id}}
+_pending_redraws = {}
 
 
 async def add_sentence_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -19,12 +42,12 @@ async def add_sentence_command(update: Update, context: ContextTypes.DEFAULT_TYP
     username = update.message.from_user.username or update.message.from_user.first_name
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
     # Check if user is verified
-    if not db.is_user_verified(user_id, group_id):
+    if not update_gate(update, context).user_verified:
         await update.message.reply_text(
             "🚫 *You need to complete registration first!*\n\n"
             "New members must:\n"
@@ -74,8 +97,8 @@ async def add_sentence_command(update: Update, context: ContextTypes.DEFAULT_TYP
         # Create inline keyboard for like
         keyboard = [
             [
-                InlineKeyboardButton("👍 Like (0)", callback_data=f"like_{sentence_id}"),
-                InlineKeyboardButton("📋 My Sentences", callback_data="my_sentences")
+                InlineKeyboardButton("👍 Like (0)", callback_data=encode_callback(LIKE_CALLBACK, sentence_id)),
+                InlineKeyboardButton("📋 My Sentences", callback_data=encode_callback(MY_SENTENCES_CALLBACK))
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -101,7 +124,7 @@ async def show_sentences_command(update: Update, context: ContextTypes.DEFAULT_T
     group_id = update.message.chat.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
@@ -131,7 +154,7 @@ async def show_sentences_command(update: Update, context: ContextTypes.DEFAULT_T
     category_buttons = []
     row = []
     for cat in categories[:5]:  # Show top 5 categories
-        row.append(InlineKeyboardButton(f"#{cat['name']} ({cat['count']})", callback_data=f"cat_{cat['name']}"))
+        row.append(InlineKeyboardButton(f"#{cat['name']} ({cat['count']})", callback_data=encode_callback(CATEGORY_CALLBACK, cat['name'])))
         if len(row) == 2:  # 2 buttons per row
             category_buttons.append(row)
             row = []
@@ -139,8 +162,8 @@ async def show_sentences_command(update: Update, context: ContextTypes.DEFAULT_T
         category_buttons.append(row)
     
     category_buttons.append([
-        InlineKeyboardButton("📋 All Categories", callback_data="cat_all"),
-        InlineKeyboardButton("➕ Add Sentence", callback_data="add_sentence_btn")
+        InlineKeyboardButton("📋 All Categories", callback_data=encode_callback(CATEGORY_CALLBACK, "all")),
+        InlineKeyboardButton("➕ Add Sentence", callback_data=encode_callback(ADD_SENTENCE_CALLBACK))
     ])
     
     reply_markup = InlineKeyboardMarkup(category_buttons)
@@ -176,12 +199,12 @@ async def my_sentences_command(update: Update, context: ContextTypes.DEFAULT_TYP
     user_id = update.message.from_user.id
     
     # Check if group is allowed
-    if not db.is_group_allowed(group_id):
+    if not update_gate(update, context).group_allowed:
         await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
         return
     
     # Check if user is verified
-    if not db.is_user_verified(user_id, group_id):
+    if not update_gate(update, context).user_verified:
         await update.message.reply_text("🚫 You need to complete registration first!")
         return
     
@@ -213,8 +236,8 @@ async def my_sentences_command(update: Update, context: ContextTypes.DEFAULT_TYP
     
     keyboard = [
         [
-            InlineKeyboardButton("➕ Add New Sentence", callback_data="add_sentence_btn"),
-            InlineKeyboardButton("📚 All Sentences", callback_data="show_sentences_btn")
+            InlineKeyboardButton("➕ Add New Sentence", callback_data=encode_callback(ADD_SENTENCE_CALLBACK)),
+            InlineKeyboardButton("📚 All Sentences", callback_data=encode_callback(SHOW_SENTENCES_CALLBACK))
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -222,59 +245,66 @@ async def my_sentences_command(update: Update, context: ContextTypes.DEFAULT_TYP
     await update.message.reply_text(message, parse_mode="Markdown", reply_markup=reply_markup)
 
 
-async def like_sentence_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle like button callback"""
-    query = update.callback_query
-    await query.answer()
-    
-    if not query.data.startswith("like_"):
+async def redraw_like_buttons(context: ContextTypes.DEFAULT_TYPE):
+    """Redraw a message's like buttons with the current counts (one edit per LIKE_REDRAW_DELAY window)"""
+    chat_id, message_id = context.job.data
+    pending = _pending_redraws.pop((chat_id, message_id), None)
+    if not pending:
         return
     
-    sentence_id = query.data.split("_")[1]
+    try:
+        counts = {
+            data: await asyncio.to_thread(db.get_sentence_likes, sentence_id)
+            for data, sentence_id in pending["likes"].items()
+        }
+        new_keyboard = [
+            [
+                InlineKeyboardButton(f"👍 Like ({counts[button.callback_data]})", callback_data=button.callback_data)
+                if counts.get(button.callback_data) is not None else button
+                for button in row
+            ]
+            for row in pending["keyboard"]
+        ]
+        await context.bot.edit_message_reply_markup(
+            chat_id=chat_id, message_id=message_id, reply_markup=InlineKeyboardMarkup(new_keyboard)
+        )
+    except Exception as e:
+        # "message is not modified" when likes and unlikes cancelled out
+        logger.info(f"Couldn't redraw like buttons of {chat_id}/{message_id}: {e}")
+
+
+async def like_sentence_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, sentence_id: str):
+    """Handle like button callback"""
+    query = update.callback_query
     user_id = query.from_user.id
     
     # Like/unlike sentence
-    success = db.like_sentence(sentence_id, user_id)
-    
-    if success:
-        # Update button text
-        sentence = db.db.sentences.find_one({"_id": sentence_id})
-        if sentence:
-            like_count = sentence.get("likes", 0)
-            
-            # Update button
-            keyboard = query.message.reply_markup.inline_keyboard
-            new_keyboard = []
-            
-            for row in keyboard:
-                new_row = []
-                for button in row:
-                    if button.callback_data == query.data:
-                        new_row.append(InlineKeyboardButton(
-                            f"👍 Like ({like_count})",
-                            callback_data=button.callback_data
-                        ))
-                    else:
-                        new_row.append(button)
-                new_keyboard.append(new_row)
-            
-            reply_markup = InlineKeyboardMarkup(new_keyboard)
-            
-            # Edit message
-            await query.edit_message_reply_markup(reply_markup=reply_markup)
-    else:
+    liked = db.like_sentence(sentence_id, user_id)
+    
+    if liked is None:
         await query.answer("❌ Failed to like sentence", show_alert=True)
+        return
+    
+    # Acknowledge right away; the count on the button is redrawn once per window for all taps
+    await query.answer("👍 Liked!" if liked else "👎 Like removed")
+    
+    message = query.message
+    if not message or not message.reply_markup or not context.job_queue:
+        return
+    
+    key = (message.chat.id, message.message_id)
+    pending = _pending_redraws.get(key)
+    if pending is None:
+        pending = _pending_redraws[key] = {"keyboard": message.reply_markup.inline_keyboard, "likes": {}}
+        context.job_queue.run_once(redraw_like_buttons, LIKE_REDRAW_DELAY, data=key, name=f"likes_{key[0]}_{key[1]}")
+    pending["likes"][query.data] = sentence_id
 
 
-async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, category: str):
     """Handle category filter callback"""
     query = update.callback_query
     await query.answer()
     
-    if not query.data.startswith("cat_"):
-        return
-    
-    category = query.data.split("_", 1)[1]
     group_id = query.message.chat.id
     
     # Get sentences for category
@@ -296,7 +326,7 @@ async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     category_buttons = []
     row = []
     for cat in categories[:5]:
-        row.append(InlineKeyboardButton(f"#{cat['name']} ({cat['count']})", callback_data=f"cat_{cat['name']}"))
+        row.append(InlineKeyboardButton(f"#{cat['name']} ({cat['count']})", callback_data=encode_callback(CATEGORY_CALLBACK, cat['name'])))
         if len(row) == 2:
             category_buttons.append(row)
             row = []
@@ -304,8 +334,8 @@ async def category_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         category_buttons.append(row)
     
     category_buttons.append([
-        InlineKeyboardButton("📋 All Categories", callback_data="cat_all"),
-        InlineKeyboardButton("➕ Add Sentence", callback_data="add_sentence_btn")
+        InlineKeyboardButton("📋 All Categories", callback_data=encode_callback(CATEGORY_CALLBACK, "all")),
+        InlineKeyboardButton("➕ Add Sentence", callback_data=encode_callback(ADD_SENTENCE_CALLBACK))
     ])
     
     reply_markup = InlineKeyboardMarkup(category_buttons)
@@ -382,8 +412,8 @@ async def my_sentences_button_callback(update: Update, context: ContextTypes.DEF
     
     keyboard = [
         [
-            InlineKeyboardButton("➕ Add New Sentence", callback_data="add_sentence_btn"),
-            InlineKeyboardButton("📚 All Sentences", callback_data="show_sentences_btn")
+            InlineKeyboardButton("➕ Add New Sentence", callback_data=encode_callback(ADD_SENTENCE_CALLBACK)),
+            InlineKeyboardButton("📚 All Sentences", callback_data=encode_callback(SHOW_SENTENCES_CALLBACK))
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -402,6 +432,89 @@ async def show_sentences_button_callback(update: Update, context: ContextTypes.D
     await show_sentences_command(update, context)
 
 
+def _format_search_results(terms: str, sentences, page: int, has_more: bool):
+    """Build the text and navigation keyboard for one page of search results"""
+    message = f"🔍 *Search:* {terms}\n📄 *Page {page + 1}*\n\n"
+    
+    offset = page * SEARCH_PAGE_SIZE
+    for i, sentence in enumerate(sentences, offset + 1):
+        message += (
+            f"{i}. *{sentence['sentence']}*\n"
+            f"   👤 @{sentence['username']} • 👍 {sentence.get('likes', 0)} • 🏷️ #{sentence.get('category', 'general')}\n"
+            f"   📅 {sentence['created_at'].strftime('%Y-%m-%d %H:%M')}\n\n"
+        )
+    
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton("⬅️ Previous", callback_data=encode_callback(SEARCH_PAGE_CALLBACK, page - 1)))
+    if has_more:
+        row.append(InlineKeyboardButton("Next ➡️", callback_data=encode_callback(SEARCH_PAGE_CALLBACK, page + 1)))
+    
+    reply_markup = InlineKeyboardMarkup([row]) if row else None
+    return message, reply_markup
+
+
+async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Search sentences in the group by words"""
+    if not update.message:
+        return
+    
+    group_id = update.message.chat.id
+    
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "🔍 *Search Sentences*\n\n"
+            "Usage: `/search <words>`\n\n"
+            "*Example:*\n"
+            "• `/search workout morning`",
+            parse_mode="Markdown"
+        )
+        return
+    
+    terms = " ".join(context.args)
+    sentences, has_more = db.search_sentences(group_id, terms, page=0, page_size=SEARCH_PAGE_SIZE)
+    
+    if not sentences:
+        await update.message.reply_text(f"📭 No sentences found for: {terms}")
+        return
+    
+    message, reply_markup = _format_search_results(terms, sentences, 0, has_more)
+    sent = await update.message.reply_text(message, parse_mode="Markdown", reply_markup=reply_markup)
+    
+    # Remember the terms per results message so page buttons stay within callback_data limits
+    searches = context.chat_data.setdefault("searches", {})
+    searches[sent.message_id] = terms
+    while len(searches) > MAX_STORED_SEARCHES:
+        searches.pop(next(iter(searches)))
+
+
+async def search_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
+    """Handle search result page navigation"""
+    query = update.callback_query
+    
+    terms = context.chat_data.get("searches", {}).get(query.message.message_id)
+    if not terms:
+        await query.answer("⌛ This search has expired. Please run /search again.", show_alert=True)
+        return
+    
+    group_id = query.message.chat.id
+    sentences, has_more = db.search_sentences(group_id, terms, page=page, page_size=SEARCH_PAGE_SIZE)
+    
+    if not sentences:
+        await query.answer("No more results", show_alert=True)
+        return
+    
+    await query.answer()
+    
+    message, reply_markup = _format_search_results(terms, sentences, page, has_more)
+    await query.edit_message_text(message, parse_mode="Markdown", reply_markup=reply_markup)
+
+
 def setup_sentence_handlers(application):
     """Setup sentence handlers"""
     # Add sentence command
@@ -416,9 +529,13 @@ def setup_sentence_handlers(application):
     application.add_handler(CommandHandler("mysentences", my_sentences_command))
     application.add_handler(CommandHandler("mytargetsentences", my_sentences_command))  # Alias
     
-    # Callback handlers
-    application.add_handler(CallbackQueryHandler(like_sentence_callback, pattern="^like_"))
-    application.add_handler(CallbackQueryHandler(category_callback, pattern="^cat_"))
-    application.add_handler(CallbackQueryHandler(add_sentence_button_callback, pattern="^add_sentence_btn$"))
-    application.add_handler(CallbackQueryHandler(my_sentences_button_callback, pattern="^my_sentences$"))
-    application.add_handler(CallbackQueryHandler(show_sentences_button_callback, pattern="^show_sentences_btn$"))
+    # Search command
+    application.add_handler(CommandHandler("search", search_command))
+    
+    # Button routes (legacy = callback data of buttons sent before the compact codec)
+    router.add(LIKE_CALLBACK, like_sentence_callback, str, legacy="like_")
+    router.add(CATEGORY_CALLBACK, category_callback, str, legacy="cat_")
+    router.add(ADD_SENTENCE_CALLBACK, add_sentence_button_callback, legacy="add_sentence_btn")
+    router.add(MY_SENTENCES_CALLBACK, my_sentences_button_callback, legacy="my_sentences")
+    router.add(SHOW_SENTENCES_CALLBACK, show_sentences_button_callback, legacy="show_sentences_btn")
+    router.add(SEARCH_PAGE_CALLBACK, search_page_callback, int, legacy="search_")
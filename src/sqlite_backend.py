@@ -0,0 +1,982 @@
+"""
+Embedded SQLite storage backend (STORAGE_BACKEND=sqlite)
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from src.storage import LEADERBOARD_PERIODS, STREAK_PERIOD, StorageBackend, leaderboard_period
+
+logger = logging.getLogger(__name__)
+
+# Store datetimes as ISO text and read "timestamp" columns back as datetimes
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("timestamp", lambda value: datetime.fromisoformat(value.decode()))
+
+TARGET_COLUMNS = """
+    id INTEGER PRIMARY KEY,
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    target TEXT,
+    date timestamp NOT NULL,
+    created_at timestamp,
+    completed INTEGER NOT NULL DEFAULT 0,
+    completed_at timestamp
+"""
+
+SENTENCE_COLUMNS = """
+    id INTEGER PRIMARY KEY,
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    sentence TEXT NOT NULL,
+    category TEXT,
+    created_at timestamp NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0
+"""
+
+# table -> statements creating it and its indexes; all idempotent
+SCHEMA = {
+    "targets": [
+        f"CREATE TABLE IF NOT EXISTS targets ({TARGET_COLUMNS}, UNIQUE (user_id, date))",
+        "CREATE INDEX IF NOT EXISTS targets_group_date ON targets (group_id, date)",
+        # Oldest-first batches of the archive job
+        "CREATE INDEX IF NOT EXISTS targets_date ON targets (date)",
+    ],
+    "group_settings": [
+        """CREATE TABLE IF NOT EXISTS group_settings (
+            group_id INTEGER PRIMARY KEY,
+            group_name TEXT,
+            updated_at timestamp,
+            nudge_time TEXT,
+            live_board INTEGER NOT NULL DEFAULT 0,
+            board_message_id INTEGER,
+            board_date timestamp,
+            last_digest timestamp
+        )""",
+    ],
+    "registrations": [
+        """CREATE TABLE IF NOT EXISTS registrations (
+            user_id INTEGER NOT NULL,
+            group_id INTEGER NOT NULL,
+            username TEXT,
+            status TEXT NOT NULL,
+            created_at timestamp,
+            updated_at timestamp,
+            verified_at timestamp,
+            left_at timestamp,
+            reminder_hour INTEGER,
+            PRIMARY KEY (user_id, group_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS registrations_group_status ON registrations (group_id, status)",
+    ],
+    "muted_users": [
+        """CREATE TABLE IF NOT EXISTS muted_users (
+            user_id INTEGER NOT NULL,
+            group_id INTEGER NOT NULL,
+            muted_at timestamp,
+            muted_until timestamp NOT NULL,
+            reason TEXT,
+            PRIMARY KEY (user_id, group_id)
+        )""",
+        "CREATE INDEX IF NOT EXISTS muted_users_group_until ON muted_users (group_id, muted_until)",
+    ],
+    "sentences": [
+        f"CREATE TABLE IF NOT EXISTS sentences ({SENTENCE_COLUMNS})",
+        "CREATE INDEX IF NOT EXISTS sentences_group_created ON sentences (group_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS sentences_user_group_created ON sentences (user_id, group_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS sentences_created ON sentences (created_at)",
+        """CREATE TABLE IF NOT EXISTS sentence_likes (
+            sentence_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (sentence_id, user_id)
+        )""",
+        # External-content FTS5 index for /search, kept in sync by triggers
+        "CREATE VIRTUAL TABLE IF NOT EXISTS sentences_fts USING fts5(sentence, content='sentences', content_rowid='id')",
+        """CREATE TRIGGER IF NOT EXISTS sentences_fts_insert AFTER INSERT ON sentences BEGIN
+            INSERT INTO sentences_fts (rowid, sentence) VALUES (new.id, new.sentence);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS sentences_fts_delete AFTER DELETE ON sentences BEGIN
+            INSERT INTO sentences_fts (sentences_fts, rowid, sentence) VALUES ('delete', old.id, old.sentence);
+        END""",
+    ],
+    "sentence_categories": [
+        """CREATE TABLE IF NOT EXISTS sentence_categories (
+            group_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            created_at timestamp,
+            PRIMARY KEY (group_id, name)
+        )""",
+    ],
+    "triggers": [
+        """CREATE TABLE IF NOT EXISTS triggers (
+            group_id INTEGER NOT NULL,
+            keyword TEXT NOT NULL,
+            response TEXT NOT NULL,
+            cooldown INTEGER,
+            updated_at timestamp,
+            PRIMARY KEY (group_id, keyword)
+        )""",
+    ],
+    "leaderboard": [
+        """CREATE TABLE IF NOT EXISTS leaderboard (
+            group_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            username TEXT,
+            targets_set INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            rate REAL NOT NULL DEFAULT 0,
+            streak INTEGER NOT NULL DEFAULT 0,
+            last_completed timestamp,
+            PRIMARY KEY (group_id, period, user_id)
+        )""",
+        # Ranked order of a group's period: top-N reads walk the first N entries and stop
+        "CREATE INDEX IF NOT EXISTS leaderboard_rank ON leaderboard (group_id, period, rate DESC, streak DESC)",
+    ],
+    "scheduled_jobs": [
+        """CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name TEXT PRIMARY KEY,
+            next_run timestamp,
+            last_run timestamp,
+            lease_owner TEXT,
+            lease_until timestamp
+        )""",
+    ],
+    "persistence": [
+        """CREATE TABLE IF NOT EXISTS persistence (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data BLOB NOT NULL,
+            updated_at timestamp,
+            PRIMARY KEY (kind, key)
+        )""",
+    ],
+    "targets_archive": [
+        f"CREATE TABLE IF NOT EXISTS targets_archive ({TARGET_COLUMNS})",
+        "CREATE INDEX IF NOT EXISTS targets_archive_user_group ON targets_archive (user_id, group_id)",
+    ],
+    "sentences_archive": [
+        f"CREATE TABLE IF NOT EXISTS sentences_archive ({SENTENCE_COLUMNS})",
+        "CREATE INDEX IF NOT EXISTS sentences_archive_group ON sentences_archive (group_id)",
+    ],
+}
+
+# Columns added after a table was first released: table -> [(column, declaration)]
+ADDED_COLUMNS = {
+    "group_settings": [
+        ("nudge_time", "TEXT"),
+        ("live_board", "INTEGER NOT NULL DEFAULT 0"),
+        ("board_message_id", "INTEGER"),
+        ("board_date", "timestamp"),
+        ("last_digest", "timestamp"),
+    ],
+    "registrations": [("reminder_hour", "INTEGER")],
+}
+
+# Tables holding per-group data, all cleared by a group reset
+GROUP_TABLES = [
+    "targets", "group_settings", "registrations", "muted_users", "sentences",
+    "sentence_categories", "triggers", "leaderboard", "targets_archive", "sentences_archive",
+]
+# Hot table -> column that decides a row's age for archiving
+ARCHIVED_TABLES = {"targets": "date", "sentences": "created_at"}
+
+TARGET_SELECT = "SELECT username, target, date, created_at, completed, completed_at FROM targets"
+SENTENCE_SELECT = "SELECT id, sentence, username, category, likes, created_at FROM sentences"
+
+
+def _target(row) -> Optional[Dict]:
+    """Map a targets row to the document shape the handlers use"""
+    if row is None:
+        return None
+    target = dict(row)
+    target["completed"] = bool(target["completed"])
+    if target.get("completed_at") is None:
+        target.pop("completed_at", None)
+    return target
+
+
+class SQLiteDB(StorageBackend):
+    def __init__(self):
+        super().__init__()
+        self.path = os.getenv("SQLITE_PATH", "data/bot.db")
+        # One connection per thread; WAL lets readers run alongside the writer
+        self._local = threading.local()
+        self.client = None
+        self.connect()
+
+    def connect(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not self.path.startswith("file:"):
+                os.makedirs(directory, exist_ok=True)
+            self.client = self._conn()
+            # Schema creation is cheap here, so the backend is usable right away
+            self.index_timings = self.ensure_indexes()
+            logger.info(f"✅ Connected to SQLite ({self.path}) successfully!")
+        except sqlite3.Error as e:
+            logger.error(f"❌ SQLite connection failed: {e}")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                timeout=30,
+                uri=self.path.startswith("file:"),
+                check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return self._conn().execute(sql, params).fetchall()
+
+    def _query_one(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        return self._conn().execute(sql, params).fetchone()
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        conn = self._conn()
+        with conn:
+            return conn.execute(sql, params)
+
+    def ensure_indexes(self) -> Dict[str, float]:
+        """Create any missing table, index and trigger; returns seconds taken per table"""
+        timings = {}
+        conn = self._conn()
+        for table, statements in SCHEMA.items():
+            started = time.perf_counter()
+            with conn:
+                for statement in statements:
+                    conn.execute(statement)
+                # Bring tables created by older versions up to date
+                existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                for column, declaration in ADDED_COLUMNS.get(table, []):
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+            timings[table] = time.perf_counter() - started
+        return timings
+
+    # === TARGET FUNCTIONS ===
+
+    def add_target(self, group_id: int, user_id: int, username: str, target: str, date: datetime = None):
+        """Add a target for a user on a specific date"""
+        if date is None:
+            date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        created_at = datetime.now()
+
+        try:
+            conn = self._conn()
+            with conn:
+                previous = conn.execute(
+                    "SELECT completed FROM targets WHERE user_id = ? AND date = ?", (user_id, date)
+                ).fetchone()
+                conn.execute(
+                    """INSERT INTO targets (group_id, user_id, username, target, date, created_at, completed)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                    ON CONFLICT (user_id, date) DO UPDATE SET
+                        group_id = excluded.group_id, username = excluded.username, target = excluded.target,
+                        created_at = excluded.created_at, completed = 0, completed_at = NULL""",
+                    (group_id, user_id, username, target, date, created_at)
+                )
+                # A new target counts as set; replacing a completed one takes the completion back
+                if previous is None:
+                    self._update_leaderboard(conn, group_id, user_id, username, date, targets_set=1)
+                elif previous["completed"]:
+                    self._update_leaderboard(conn, group_id, user_id, username, date, completed=-1)
+            self._cache_target(user_id, date, {
+                "username": username,
+                "target": target,
+                "date": date,
+                "created_at": created_at,
+                "completed": False
+            })
+            self._publish_invalidation("target", group_id, user_id)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error adding target: {e}")
+            return False
+
+    def _find_target(self, user_id: int, date: datetime):
+        return _target(self._query_one(f"{TARGET_SELECT} WHERE user_id = ? AND date = ?", (user_id, date)))
+
+    def get_all_targets(self, group_id: int, date: datetime = None):
+        """Get all targets for a group on a specific date"""
+        if date is None:
+            date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        rows = self._query(f"{TARGET_SELECT} WHERE group_id = ? AND date = ? ORDER BY id", (group_id, date))
+        return [_target(row) for row in rows]
+
+    def get_user_targets(self, user_id: int, limit: int = 7):
+        """Get recent targets for a user"""
+        rows = self._query(f"{TARGET_SELECT} WHERE user_id = ? ORDER BY date DESC LIMIT ?", (user_id, limit))
+        return [_target(row) for row in rows]
+
+    def mark_target_completed(self, user_id: int, date: datetime = None, group_id: int = None):
+        """Mark a target as completed, returning the updated target (None if there was none)"""
+        if date is None:
+            date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        conn = self._conn()
+        with conn:
+            previous = conn.execute(
+                "SELECT group_id, username, completed FROM targets WHERE user_id = ? AND date = ?", (user_id, date)
+            ).fetchone()
+            # RETURNING rows must be read before the transaction commits
+            target = _target(conn.execute(
+                """UPDATE targets SET completed = 1, completed_at = ? WHERE user_id = ? AND date = ?
+                RETURNING username, target, date, created_at, completed, completed_at""",
+                (datetime.now(), user_id, date)
+            ).fetchone())
+            if previous and not previous["completed"]:
+                self._update_leaderboard(conn, previous["group_id"], user_id, previous["username"], date, completed=1)
+        self._cache_target(user_id, date, target)
+        self._publish_invalidation("target", group_id, user_id)
+        return target
+
+    # === SENTENCE FUNCTIONS ===
+
+    def add_sentence(self, group_id: int, user_id: int, username: str, sentence: str, category: str = "general"):
+        """Add a sentence for a user"""
+        try:
+            cursor = self._execute(
+                """INSERT INTO sentences (group_id, user_id, username, sentence, category, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)""",
+                (group_id, user_id, username, sentence, category, datetime.now())
+            )
+            return str(cursor.lastrowid)
+        except sqlite3.Error as e:
+            logger.error(f"Error adding sentence: {e}")
+            return None
+
+    def get_user_sentences(self, user_id: int, group_id: int = None, limit: int = 10):
+        """Get sentences for a user"""
+        if group_id:
+            rows = self._query(
+                f"{SENTENCE_SELECT} WHERE user_id = ? AND group_id = ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, group_id, limit)
+            )
+        else:
+            rows = self._query(f"{SENTENCE_SELECT} WHERE user_id = ? ORDER BY created_at DESC LIMIT ?", (user_id, limit))
+        return [dict(row) for row in rows]
+
+    def get_group_sentences(self, group_id: int, category: str = None, limit: int = 20):
+        """Get recent sentences for a group"""
+        if category and category != "all":
+            rows = self._query(
+                f"{SENTENCE_SELECT} WHERE group_id = ? AND category = ? ORDER BY created_at DESC LIMIT ?",
+                (group_id, category, limit)
+            )
+        else:
+            rows = self._query(f"{SENTENCE_SELECT} WHERE group_id = ? ORDER BY created_at DESC LIMIT ?", (group_id, limit))
+        return [dict(row) for row in rows]
+
+    def search_sentences(self, group_id: int, terms: str, page: int = 0, page_size: int = 5) -> Tuple[List[Dict], bool]:
+        """Full-text search over a group's sentences, ranked by relevance then recency"""
+        # Quote every word so user input can't be parsed as FTS5 syntax; any word may match
+        match = " OR ".join('"' + word.replace('"', '""') + '"' for word in terms.split())
+        if not match:
+            return [], False
+
+        rows = self._query(
+            """SELECT s.id, s.sentence, s.username, s.category, s.likes, s.created_at
+            FROM sentences_fts JOIN sentences s ON s.id = sentences_fts.rowid
+            WHERE sentences_fts MATCH ? AND s.group_id = ?
+            ORDER BY bm25(sentences_fts), s.created_at DESC
+            LIMIT ? OFFSET ?""",
+            (match, group_id, page_size + 1, page * page_size)
+        )
+        results = [dict(row) for row in rows]
+        return results[:page_size], len(results) > page_size
+
+    def like_sentence(self, sentence_id: str, user_id: int) -> Optional[bool]:
+        """Like a sentence, or unlike it if the user already liked it.
+
+        Returns True if the user now likes it, False if the like was removed, None on failure.
+        """
+        try:
+            conn = self._conn()
+            with conn:
+                if not conn.execute("SELECT 1 FROM sentences WHERE id = ?", (int(sentence_id),)).fetchone():
+                    return None
+                liked = conn.execute(
+                    "INSERT OR IGNORE INTO sentence_likes (sentence_id, user_id) VALUES (?, ?)",
+                    (int(sentence_id), user_id)
+                ).rowcount
+                if not liked:
+                    # Already liked: unlike
+                    conn.execute("DELETE FROM sentence_likes WHERE sentence_id = ? AND user_id = ?", (int(sentence_id), user_id))
+                conn.execute(
+                    "UPDATE sentences SET likes = likes + ? WHERE id = ?",
+                    (1 if liked else -1, int(sentence_id))
+                )
+            return bool(liked)
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error liking sentence: {e}")
+            return None
+
+    def get_sentence_likes(self, sentence_id: str) -> Optional[int]:
+        """Get the like count of a sentence"""
+        try:
+            row = self._query_one("SELECT likes FROM sentences WHERE id = ?", (int(sentence_id),))
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error getting sentence likes: {e}")
+            return None
+        return row["likes"] if row else None
+
+    def get_sentence_categories(self, group_id: int):
+        """Get all sentence categories for a group"""
+        rows = self._query(
+            "SELECT category AS name, COUNT(*) AS count FROM sentences WHERE group_id = ? GROUP BY category ORDER BY count DESC",
+            (group_id,)
+        )
+        return [dict(row) for row in rows]
+
+    def add_sentence_category(self, group_id: int, category_name: str):
+        """Add a new sentence category"""
+        try:
+            self._execute(
+                """INSERT INTO sentence_categories (group_id, name, created_at) VALUES (?, ?, ?)
+                ON CONFLICT (group_id, name) DO UPDATE SET created_at = excluded.created_at""",
+                (group_id, category_name, datetime.now())
+            )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error adding category: {e}")
+            return False
+
+    # === REGISTRATION FUNCTIONS ===
+
+    def create_registration(self, user_id: int, group_id: int, username: str = None):
+        """Create a new registration record for user"""
+        return self.register_new_members(group_id, [(user_id, username)], hours=None) or None
+
+    def register_new_members(self, group_id: int, members: List[Tuple[int, str]], hours: int = 24):
+        """Create pending registrations (and mutes, unless hours is None) for many users at once"""
+        now = datetime.now()
+        try:
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    """INSERT INTO registrations (user_id, group_id, username, status, created_at, updated_at)
+                    VALUES (?, ?, ?, 'pending', ?, ?)
+                    ON CONFLICT (user_id, group_id) DO UPDATE SET
+                        username = excluded.username, status = 'pending', reminder_hour = NULL,
+                        created_at = excluded.created_at, updated_at = excluded.updated_at""",
+                    [(user_id, group_id, username, now, now) for user_id, username in members]
+                )
+                if hours is not None:
+                    conn.executemany(
+                        """INSERT INTO muted_users (user_id, group_id, muted_at, muted_until, reason)
+                        VALUES (?, ?, ?, ?, 'pending_registration')
+                        ON CONFLICT (user_id, group_id) DO UPDATE SET
+                            muted_at = excluded.muted_at, muted_until = excluded.muted_until, reason = excluded.reason""",
+                        [(user_id, group_id, now, now + timedelta(hours=hours)) for user_id, _ in members]
+                    )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error registering new members: {e}")
+            return False
+
+    def get_verified_user_ids(self, group_id: int, user_ids: List[int]) -> set:
+        """Get which of the given users are verified in group"""
+        if not user_ids:
+            return set()
+        placeholders = ",".join("?" * len(user_ids))
+        rows = self._query(
+            f"SELECT user_id FROM registrations WHERE group_id = ? AND status = 'verified' AND user_id IN ({placeholders})",
+            (group_id, *user_ids)
+        )
+        return {row["user_id"] for row in rows}
+
+    def get_registration(self, user_id: int, group_id: int):
+        """Get registration status for user"""
+        row = self._query_one("SELECT status FROM registrations WHERE user_id = ? AND group_id = ?", (user_id, group_id))
+        return dict(row) if row else None
+
+    def get_pending_registrations(self, group_id: int) -> List[Dict]:
+        """Get registrations still waiting for declaration acceptance"""
+        rows = self._query(
+            "SELECT user_id, username, created_at, reminder_hour FROM registrations WHERE group_id = ? AND status = 'pending'",
+            (group_id,)
+        )
+        return [dict(row) for row in rows]
+
+    def mark_reminder_sent(self, user_id: int, group_id: int, hour: int) -> bool:
+        """Record the registration reminder slot a pending user was last sent"""
+        cursor = self._execute(
+            "UPDATE registrations SET reminder_hour = ? WHERE user_id = ? AND group_id = ?",
+            (hour, user_id, group_id)
+        )
+        return cursor.rowcount > 0
+
+    def verify_registration(self, user_id: int, group_id: int):
+        """Verify registration"""
+        now = datetime.now()
+        conn = self._conn()
+        with conn:
+            matched = conn.execute(
+                """UPDATE registrations SET status = 'verified', verified_at = ?, updated_at = ?
+                WHERE user_id = ? AND group_id = ?""",
+                (now, now, user_id, group_id)
+            ).rowcount
+            if matched:
+                # Remove from muted users
+                conn.execute("DELETE FROM muted_users WHERE user_id = ? AND group_id = ?", (user_id, group_id))
+
+        if matched:
+            self._remember_verified(user_id, group_id)
+            return True
+        return False
+
+    def _find_verified(self, user_id: int, group_id: int) -> bool:
+        row = self._query_one(
+            "SELECT 1 FROM registrations WHERE user_id = ? AND group_id = ? AND status = 'verified'",
+            (user_id, group_id)
+        )
+        return row is not None
+
+    def load_verified_members(self, group_id: int) -> int:
+        """Load every verified member of a group into the membership cache"""
+        rows = self._query("SELECT user_id FROM registrations WHERE group_id = ? AND status = 'verified'", (group_id,))
+        self.verified_members[group_id] = {row["user_id"] for row in rows}
+        return len(self.verified_members[group_id])
+
+    def mark_registration_left(self, user_id: int, group_id: int) -> bool:
+        """Mark a user's registration as left (user left the group)"""
+        self._forget_verified(user_id, group_id)
+        cursor = self._execute(
+            "UPDATE registrations SET status = 'left_group', left_at = ? WHERE user_id = ? AND group_id = ?",
+            (datetime.now(), user_id, group_id)
+        )
+        self._publish_invalidation("verified", group_id, user_id)
+        return cursor.rowcount > 0
+
+    def delete_registration(self, user_id: int, group_id: int) -> bool:
+        """Delete a user's registration record"""
+        self._forget_verified(user_id, group_id)
+        cursor = self._execute("DELETE FROM registrations WHERE user_id = ? AND group_id = ?", (user_id, group_id))
+        self._publish_invalidation("verified", group_id, user_id)
+        return cursor.rowcount > 0
+
+    # === MUTE FUNCTIONS ===
+
+    def mute_user(self, user_id: int, group_id: int, hours: int = 24):
+        """Mute user for specified hours"""
+        now = datetime.now()
+        try:
+            self._execute(
+                """INSERT INTO muted_users (user_id, group_id, muted_at, muted_until, reason)
+                VALUES (?, ?, ?, ?, 'pending_registration')
+                ON CONFLICT (user_id, group_id) DO UPDATE SET
+                    muted_at = excluded.muted_at, muted_until = excluded.muted_until, reason = excluded.reason""",
+                (user_id, group_id, now, now + timedelta(hours=hours))
+            )
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error muting user: {e}")
+            return False
+
+    def is_user_muted(self, user_id: int, group_id: int) -> bool:
+        """Check if user is currently muted"""
+        row = self._query_one(
+            "SELECT 1 FROM muted_users WHERE user_id = ? AND group_id = ? AND muted_until > ?",
+            (user_id, group_id, datetime.now())
+        )
+        return row is not None
+
+    def unmute_user(self, user_id: int, group_id: int):
+        """Unmute user"""
+        cursor = self._execute("DELETE FROM muted_users WHERE user_id = ? AND group_id = ?", (user_id, group_id))
+        return cursor.rowcount > 0
+
+    def get_muted_users(self, group_id: int):
+        """Get all muted users in group"""
+        rows = self._query(
+            "SELECT user_id, muted_until FROM muted_users WHERE group_id = ? AND muted_until > ?",
+            (group_id, datetime.now())
+        )
+        return [dict(row) for row in rows]
+
+    # === GROUP SETTINGS FUNCTIONS ===
+
+    def set_allowed_group(self, group_id: int, group_name: str):
+        """Set the allowed group for the bot"""
+        self._execute(
+            """INSERT INTO group_settings (group_id, group_name, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT (group_id) DO UPDATE SET group_name = excluded.group_name, updated_at = excluded.updated_at""",
+            (group_id, group_name, datetime.now())
+        )
+        if self.allowed_groups is not None:
+            self.allowed_groups.add(group_id)
+        self._publish_invalidation("allowed", group_id)
+
+    def load_allowed_groups(self) -> set:
+        """Load the authorized group ids into memory"""
+        self.allowed_groups = {row["group_id"] for row in self._query("SELECT group_id FROM group_settings")}
+        return self.allowed_groups
+
+    def get_allowed_group(self):
+        """Get the allowed group info"""
+        row = self._query_one("SELECT group_id, group_name FROM group_settings LIMIT 1")
+        return dict(row) if row else None
+
+    def get_allowed_groups(self) -> List[Dict]:
+        """Get info for every authorized group"""
+        return [dict(row) for row in self._query("SELECT group_id, group_name FROM group_settings")]
+
+    def set_nudge_time(self, group_id: int, nudge_time: Optional[str]) -> bool:
+        """Set (HH:MM) or clear (None) the time of a group's daily target reminder"""
+        cursor = self._execute("UPDATE group_settings SET nudge_time = ? WHERE group_id = ?", (nudge_time, group_id))
+        return cursor.rowcount > 0
+
+    def get_nudge_times(self) -> List[Dict]:
+        """Get every group with a daily target reminder and its time"""
+        rows = self._query("SELECT group_id, nudge_time FROM group_settings WHERE nudge_time IS NOT NULL")
+        return [dict(row) for row in rows]
+
+    def get_nudge_time(self, group_id: int) -> Optional[str]:
+        """Get the HH:MM time of a group's daily target reminder, None if disabled"""
+        row = self._query_one("SELECT nudge_time FROM group_settings WHERE group_id = ?", (group_id,))
+        return row["nudge_time"] if row else None
+
+    def set_live_board(self, group_id: int, enabled: bool) -> bool:
+        """Opt a group in (with no board message yet) or out of the live /today board"""
+        cursor = self._execute(
+            "UPDATE group_settings SET live_board = ?, board_message_id = NULL, board_date = NULL WHERE group_id = ?",
+            (int(enabled), group_id)
+        )
+        return cursor.rowcount > 0
+
+    def get_live_board(self, group_id: int) -> Optional[Dict]:
+        """Get a group's live board ({message_id, date} of its current message), None if not enabled"""
+        row = self._query_one(
+            "SELECT board_message_id AS message_id, board_date AS date FROM group_settings WHERE group_id = ? AND live_board",
+            (group_id,)
+        )
+        return dict(row) if row else None
+
+    def set_live_board_message(self, group_id: int, message_id: int, date: datetime):
+        """Remember the message currently showing a group's live board (only while enabled)"""
+        self._execute(
+            "UPDATE group_settings SET board_message_id = ?, board_date = ? WHERE group_id = ? AND live_board",
+            (message_id, date, group_id)
+        )
+
+    def claim_live_board_post(self, group_id: int, date: datetime, stale_message_id: int = None) -> bool:
+        """Claim posting a group's board for a date: only one caller wins while the board isn't on that
+        date yet, or still points at stale_message_id (e.g. a deleted message). The winner posts it."""
+        cursor = self._execute(
+            """UPDATE group_settings SET board_message_id = NULL, board_date = ?
+            WHERE group_id = ? AND live_board AND (board_date IS NULL OR board_date != ? OR board_message_id = ?)""",
+            (date, group_id, date, stale_message_id)
+        )
+        return cursor.rowcount > 0
+
+    def get_members_without_target(self, group_id: int, date: datetime = None) -> List[Dict]:
+        """Get the verified members of a group who have no target on a date (today by default)"""
+        if date is None:
+            date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        rows = self._query(
+            """SELECT user_id, username FROM registrations r
+            WHERE group_id = ? AND status = 'verified'
+            AND NOT EXISTS (SELECT 1 FROM targets t WHERE t.user_id = r.user_id AND t.date = ?)""",
+            (group_id, date)
+        )
+        return [dict(row) for row in rows]
+
+    # === TRIGGER FUNCTIONS ===
+
+    def add_trigger(self, group_id: int, keyword: str, response: str, cooldown: int):
+        """Add or replace a keyword trigger for a group"""
+        try:
+            self._execute(
+                """INSERT INTO triggers (group_id, keyword, response, cooldown, updated_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (group_id, keyword) DO UPDATE SET
+                    response = excluded.response, cooldown = excluded.cooldown, updated_at = excluded.updated_at""",
+                (group_id, keyword, response, cooldown, datetime.now())
+            )
+            self._publish_invalidation("triggers", group_id)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error adding trigger: {e}")
+            return False
+
+    def remove_trigger(self, group_id: int, keyword: str) -> bool:
+        """Remove a keyword trigger from a group"""
+        cursor = self._execute("DELETE FROM triggers WHERE group_id = ? AND keyword = ?", (group_id, keyword))
+        self._publish_invalidation("triggers", group_id)
+        return cursor.rowcount > 0
+
+    def get_triggers(self, group_id: int) -> List[Dict]:
+        """Get all keyword triggers of a group"""
+        rows = self._query(
+            "SELECT keyword, response, cooldown FROM triggers WHERE group_id = ? ORDER BY keyword",
+            (group_id,)
+        )
+        return [dict(row) for row in rows]
+
+    # === LEADERBOARD FUNCTIONS ===
+
+    def _update_streak(self, conn: sqlite3.Connection, group_id: int, user_id: int, username: str,
+                       date: datetime, completed: int) -> int:
+        """Apply a completion (completed > 0) or a taken back completion of date to the member's
+        running streak, inside the caller's transaction; returns the new streak"""
+        key = (group_id, STREAK_PERIOD, user_id)
+        conn.execute(
+            """INSERT INTO leaderboard (group_id, period, user_id, username) VALUES (?, ?, ?, ?)
+            ON CONFLICT (group_id, period, user_id) DO UPDATE SET username = excluded.username""",
+            (*key, username)
+        )
+        if completed > 0:
+            # Completing the day after the last completion extends the streak, a gap restarts it
+            conn.execute(
+                """UPDATE leaderboard SET
+                    streak = CASE WHEN last_completed = ? THEN streak
+                                  WHEN last_completed = ? THEN streak + 1
+                                  ELSE 1 END,
+                    last_completed = MAX(COALESCE(last_completed, ?), ?)
+                WHERE group_id = ? AND period = ? AND user_id = ?""",
+                (date, date - timedelta(days=1), date, date, *key)
+            )
+        else:
+            # Only the latest completion can be taken back: the run then ends the day before
+            conn.execute(
+                """UPDATE leaderboard SET
+                    streak = CASE WHEN last_completed = ? THEN MAX(streak - 1, 0) ELSE streak END,
+                    last_completed = CASE WHEN last_completed = ? THEN (CASE WHEN streak > 1 THEN ? END)
+                                          ELSE last_completed END
+                WHERE group_id = ? AND period = ? AND user_id = ?""",
+                (date, date, date - timedelta(days=1), *key)
+            )
+        return conn.execute(
+            "SELECT streak FROM leaderboard WHERE group_id = ? AND period = ? AND user_id = ?", key
+        ).fetchone()["streak"]
+
+    def _update_leaderboard(self, conn: sqlite3.Connection, group_id: int, user_id: int, username: str,
+                            date: datetime, targets_set: int = 0, completed: int = 0):
+        """Apply one target change to the user's streak and their week and month entries, inside the caller's transaction"""
+        streak = self._update_streak(conn, group_id, user_id, username, date, completed) if completed else None
+        for kind in LEADERBOARD_PERIODS:
+            key = (group_id, leaderboard_period(kind, date), user_id)
+            conn.execute(
+                "INSERT OR IGNORE INTO leaderboard (group_id, period, user_id) VALUES (?, ?, ?)", key
+            )
+            conn.execute(
+                """UPDATE leaderboard SET
+                    username = ?, targets_set = targets_set + ?, completed = completed + ?,
+                    rate = CASE WHEN targets_set + ? > 0
+                                THEN CAST(completed + ? AS REAL) / (targets_set + ?) ELSE 0 END,
+                    streak = COALESCE(?, streak)
+                WHERE group_id = ? AND period = ? AND user_id = ?""",
+                (username, targets_set, completed, targets_set, completed, targets_set, streak, *key)
+            )
+
+    def get_leaderboard(self, group_id: int, period: str, limit: int = 10) -> List[Dict]:
+        """Get the top members of a group for a period key, best completion rate then streak first"""
+        rows = self._query(
+            """SELECT user_id, username, targets_set, completed, rate, streak FROM leaderboard
+            WHERE group_id = ? AND period = ? ORDER BY rate DESC, streak DESC LIMIT ?""",
+            (group_id, period, limit)
+        )
+        return [dict(row) for row in rows]
+
+    # === DIGEST FUNCTIONS ===
+
+    def get_weekly_digest(self, group_id: int, since: datetime, limit: int = 3) -> Dict:
+        """Summarize a group's week: completion, top streaks, most liked sentences and newly verified members"""
+        completion = self._query_one(
+            "SELECT COUNT(*) AS total, COALESCE(SUM(completed), 0) AS completed FROM targets WHERE group_id = ? AND date >= ?",
+            (group_id, since)
+        )
+        top_streaks = self._query(
+            """SELECT username, streak FROM leaderboard
+            WHERE group_id = ? AND period = ? AND streak > 1 AND last_completed >= ?
+            ORDER BY streak DESC LIMIT ?""",
+            (group_id, STREAK_PERIOD, since, limit)
+        )
+        top_sentences = self._query(
+            """SELECT username, sentence, likes FROM sentences WHERE group_id = ? AND created_at >= ? AND likes > 0
+            ORDER BY likes DESC LIMIT ?""",
+            (group_id, since, limit)
+        )
+        new_members = self._query(
+            "SELECT username FROM registrations WHERE group_id = ? AND status = 'verified' AND verified_at >= ?",
+            (group_id, since)
+        )
+        return {
+            **dict(completion),
+            "top_streaks": [dict(row) for row in top_streaks],
+            "top_sentences": [dict(row) for row in top_sentences],
+            "new_members": [dict(row) for row in new_members],
+        }
+
+    def claim_digest(self, group_id: int, round_at: datetime) -> bool:
+        """Claim sending a group's digest of a round: only the first caller wins, even across restarts"""
+        cursor = self._execute(
+            "UPDATE group_settings SET last_digest = ? WHERE group_id = ? AND (last_digest IS NULL OR last_digest != ?)",
+            (round_at, group_id, round_at)
+        )
+        return cursor.rowcount > 0
+
+    # === SCHEDULED JOB FUNCTIONS ===
+
+    def get_job_state(self, name: str) -> Optional[Dict]:
+        """Get the persisted schedule of a job"""
+        row = self._query_one("SELECT next_run, last_run FROM scheduled_jobs WHERE name = ?", (name,))
+        return dict(row) if row else None
+
+    def claim_job(self, name: str, now: datetime, next_run: datetime, owner: str, lease_seconds: int) -> bool:
+        """Claim a job's due run: only succeeds if the run is due and no other replica holds the lease.
+        The claim moves next_run forward, so a replica firing the same run later gets False."""
+        cursor = self._execute(
+            """INSERT INTO scheduled_jobs (name, next_run, lease_owner, lease_until) VALUES (?, ?, ?, ?)
+            ON CONFLICT (name) DO UPDATE SET
+                next_run = excluded.next_run, lease_owner = excluded.lease_owner, lease_until = excluded.lease_until
+            WHERE scheduled_jobs.next_run <= ? AND (scheduled_jobs.lease_until IS NULL OR scheduled_jobs.lease_until <= ?)""",
+            (name, next_run, owner, now + timedelta(seconds=lease_seconds), now, now)
+        )
+        return cursor.rowcount > 0
+
+    def release_job(self, name: str, owner: str, now: datetime):
+        """Release a job's lease after a run; now is on the caller's clock, like claim_job's"""
+        self._execute(
+            "UPDATE scheduled_jobs SET lease_until = NULL, last_run = ? WHERE name = ? AND lease_owner = ?",
+            (now, name, owner)
+        )
+
+    def delete_job_state(self, name: str):
+        """Forget a job's persisted schedule"""
+        self._execute("DELETE FROM scheduled_jobs WHERE name = ?", (name,))
+
+    # === PERSISTENCE FUNCTIONS ===
+
+    def load_persisted(self, kind: str, key: str) -> Optional[bytes]:
+        """Get a serialized bot persistence entry (user_data, chat_data...)"""
+        row = self._query_one("SELECT data FROM persistence WHERE kind = ? AND key = ?", (kind, key))
+        return row["data"] if row else None
+
+    def save_persisted(self, entries: List[Tuple[str, str, Optional[bytes]]]):
+        """Write (kind, key, data) persistence entries in one transaction; data None deletes the entry"""
+        now = datetime.now()
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "DELETE FROM persistence WHERE kind = ? AND key = ?",
+                [(kind, key) for kind, key, data in entries if data is None]
+            )
+            conn.executemany(
+                """INSERT INTO persistence (kind, key, data, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (kind, key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at""",
+                [(kind, key, data, now) for kind, key, data in entries if data is not None]
+            )
+
+    # === ARCHIVE FUNCTIONS ===
+
+    def get_archive_collections(self, collection: str) -> List[str]:
+        """List the archive tables of a table (SQLite keeps a single one)"""
+        return [f"{collection}_archive"]
+
+    def archive_old_data(self, horizon_days: int = None, batch_size: int = 1000) -> Dict[str, int]:
+        """Move targets and sentences older than the horizon into the archive tables"""
+        if horizon_days is None:
+            horizon_days = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+        cutoff = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=horizon_days)
+
+        moved = {}
+        conn = self._conn()
+        for table, date_column in ARCHIVED_TABLES.items():
+            moved[table] = 0
+            while True:
+                ids = [row["id"] for row in conn.execute(
+                    f"SELECT id FROM {table} WHERE {date_column} < ? ORDER BY {date_column} LIMIT ?",
+                    (cutoff, batch_size)
+                )]
+                if not ids:
+                    break
+
+                placeholders = ",".join("?" * len(ids))
+                # Copy and delete in one transaction, so a crash can't lose or duplicate rows
+                with conn:
+                    conn.execute(f"INSERT OR IGNORE INTO {table}_archive SELECT * FROM {table} WHERE id IN ({placeholders})", ids)
+                    conn.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+                    if table == "sentences":
+                        conn.execute(f"DELETE FROM sentence_likes WHERE sentence_id IN ({placeholders})", ids)
+                moved[table] += len(ids)
+
+        return moved
+
+    def get_target_stats(self, user_id: int, group_id: int, include_archive: bool = False) -> Dict:
+        """Get target totals for a user; archived history is included on request (slower)"""
+        source = "targets"
+        if include_archive:
+            source = "(SELECT date, completed, user_id, group_id FROM targets UNION ALL SELECT date, completed, user_id, group_id FROM targets_archive)"
+
+        row = self._query_one(
+            f"""SELECT COUNT(*) AS total, COALESCE(SUM(completed), 0) AS completed, MIN(date) AS "first_date [timestamp]"
+            FROM {source} WHERE user_id = ? AND group_id = ?""",
+            (user_id, group_id)
+        )
+        return dict(row)
+
+    # === EXPORT FUNCTIONS ===
+
+    def iter_group_documents(self, collection: str, group_id: int, fields: List[str], batch_size: int = 500):
+        """Stream a group's rows from a table, fetching only the given columns"""
+        columns = {row["name"] for row in self._query(f"PRAGMA table_info({collection})")}
+        selected = [field for field in fields if field in columns]
+
+        cursor = self._conn().execute(f"SELECT {', '.join(selected)} FROM {collection} WHERE group_id = ?", (group_id,))
+        cursor.arraysize = batch_size
+        while True:
+            rows = cursor.fetchmany()
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+
+    # === RESET FUNCTION ===
+
+    def reset_all_data(self, group_id: int, batch_size: int = 1000, progress=None):
+        """Reset all data of a group (for testing).
+
+        SQLite has a single writer, so tables are cleared one after another in one
+        transaction; progress(table, deleted) is still reported per table.
+        """
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute(
+                    "DELETE FROM sentence_likes WHERE sentence_id IN (SELECT id FROM sentences WHERE group_id = ?)",
+                    (group_id,)
+                )
+                for table in GROUP_TABLES:
+                    deleted = conn.execute(f"DELETE FROM {table} WHERE group_id = ?", (group_id,)).rowcount
+                    if progress:
+                        progress(table, deleted)
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Error resetting data: {e}")
+            return False
+        finally:
+            self.invalidate_group(group_id)
+            self._publish_invalidation("group", group_id)
+
+    def close(self):
+        """Close this thread's SQLite connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn:
+            conn.close()
+            self._local.conn = None
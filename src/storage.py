@@ -0,0 +1,362 @@
+"""
+Storage backend interface shared by the MongoDB and SQLite implementations
+"""
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.cache import DailyLRUCache, shared_cache
+
+# Marks a cached "no target today" so repeated misses don't hit the DB either
+NO_TARGET = object()
+# Leaderboard periods, each kept as its own ranked set of entries per group
+LEADERBOARD_PERIODS = ("week", "month")
+# Leaderboard "period" of each member's running streak, which spans weeks and months;
+# the period entries get a copy of it whenever it changes
+STREAK_PERIOD = "streak"
+
+
+def leaderboard_period(kind: str, date: datetime) -> str:
+    """Key of the week ("week:2024-W07") or month ("month:2024-02") containing date"""
+    if kind == "week":
+        year, week, _ = date.isocalendar()
+        return f"week:{year}-W{week:02d}"
+    return f"month:{date:%Y-%m}"
+
+
+class StorageBackend(ABC):
+    """Public data API of the bot plus the in-process caches in front of it.
+
+    Backends implement the storage methods below; the cache-aware reads
+    (get_today_target, is_user_verified, is_group_allowed) are shared and call
+    the backend's `_find_*` primitives on a miss.
+    """
+
+    # Methods that don't do I/O themselves; count_db_calls counts the primitives they fall back to instead
+    IN_MEMORY_METHODS = ("get_today_target", "is_user_verified", "is_group_allowed", "invalidate_group")
+
+    def __init__(self):
+        # Today's targets keyed by (user_id, day), like the targets' unique index; written through by target updates
+        self.target_cache = DailyLRUCache(int(os.getenv("TARGET_CACHE_SIZE", "2048")))
+        # Authorized group ids, loaded on first use and kept in sync by set_allowed_group
+        self.allowed_groups = None
+        # Verified user ids per group (positive entries only), pre-warmed at startup
+        self.verified_members = {}
+        # Seconds ensure_indexes took per collection when the backend connected
+        self.index_timings = {}
+        # Other replicas tell us which of these entries their writes made stale
+        self.shared_cache = shared_cache
+        self.shared_cache.subscribe(self._on_invalidation)
+
+    # === CACHE HELPERS ===
+
+    def _cache_target(self, user_id: int, date: datetime, target: Optional[Dict]):
+        self.target_cache.set((user_id, date.date()), target if target else NO_TARGET)
+
+    def _remember_verified(self, user_id: int, group_id: int):
+        self.verified_members.setdefault(group_id, set()).add(user_id)
+
+    def _forget_verified(self, user_id: int, group_id: int):
+        self.verified_members.get(group_id, set()).discard(user_id)
+
+    def invalidate_group(self, group_id: int):
+        """Drop every in-memory cache entry belonging to a group"""
+        # Target entries aren't keyed by group, and a reset is rare: drop them all
+        self.target_cache.clear()
+        self.verified_members.pop(group_id, None)
+        # Reloaded on next use
+        self.allowed_groups = None
+
+    def _publish_invalidation(self, kind: str, group_id: int = None, user_id: int = None):
+        """Tell the other replicas to drop cache entries made stale by a write"""
+        self.shared_cache.publish({"kind": kind, "group_id": group_id, "user_id": user_id})
+
+    def _on_invalidation(self, message: dict):
+        """Apply an invalidation published by another replica"""
+        kind, group_id, user_id = message.get("kind"), message.get("group_id"), message.get("user_id")
+        if kind == "target":
+            self.target_cache.discard_where(lambda key: key[0] == user_id)
+        elif kind == "verified":
+            self._forget_verified(user_id, group_id)
+        elif kind == "allowed":
+            self.allowed_groups = None
+        elif kind == "group":
+            self.invalidate_group(group_id)
+        elif kind == "all":
+            self.target_cache.clear()
+            self.verified_members.clear()
+            self.allowed_groups = None
+
+    # === CACHED READS ===
+
+    def get_today_target(self, user_id: int, group_id: int = None):
+        """Get today's target for a user"""
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        cached = self.target_cache.get((user_id, today.date()))
+        if cached is not None:
+            return None if cached is NO_TARGET else cached
+
+        target = self._find_target(user_id, today)
+        self._cache_target(user_id, today, target)
+        return target
+
+    def is_user_verified(self, user_id: int, group_id: int) -> bool:
+        """Check if user is verified in group"""
+        if user_id in self.verified_members.get(group_id, ()):
+            return True
+
+        if not self._find_verified(user_id, group_id):
+            return False
+
+        self._remember_verified(user_id, group_id)
+        return True
+
+    def is_group_allowed(self, group_id: int) -> bool:
+        """Check if a group is allowed"""
+        if self.allowed_groups is None:
+            self.load_allowed_groups()
+
+        # If no groups are set, allow all (for initial setup)
+        return not self.allowed_groups or group_id in self.allowed_groups
+
+    # === BACKEND PRIMITIVES ===
+
+    @abstractmethod
+    def _find_target(self, user_id: int, date: datetime) -> Optional[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _find_verified(self, user_id: int, group_id: int) -> bool:
+        raise NotImplementedError
+
+    # === STORAGE METHODS ===
+
+    @abstractmethod
+    def ensure_indexes(self) -> Dict[str, float]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_target(self, group_id: int, user_id: int, username: str, target: str, date: datetime = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_all_targets(self, group_id: int, date: datetime = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_targets(self, user_id: int, limit: int = 7):
+        raise NotImplementedError
+
+    @abstractmethod
+    def mark_target_completed(self, user_id: int, date: datetime = None, group_id: int = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_sentence(self, group_id: int, user_id: int, username: str, sentence: str, category: str = "general"):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_sentences(self, user_id: int, group_id: int = None, limit: int = 10):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_group_sentences(self, group_id: int, category: str = None, limit: int = 20):
+        raise NotImplementedError
+
+    @abstractmethod
+    def search_sentences(self, group_id: int, terms: str, page: int = 0, page_size: int = 5) -> Tuple[List[Dict], bool]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def like_sentence(self, sentence_id: str, user_id: int) -> Optional[bool]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_sentence_likes(self, sentence_id: str) -> Optional[int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_sentence_categories(self, group_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_sentence_category(self, group_id: int, category_name: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_registration(self, user_id: int, group_id: int, username: str = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def register_new_members(self, group_id: int, members: List[Tuple[int, str]], hours: int = 24):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_verified_user_ids(self, group_id: int, user_ids: List[int]) -> set:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_registration(self, user_id: int, group_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_pending_registrations(self, group_id: int) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mark_reminder_sent(self, user_id: int, group_id: int, hour: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def verify_registration(self, user_id: int, group_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_verified_members(self, group_id: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mark_registration_left(self, user_id: int, group_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_registration(self, user_id: int, group_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def mute_user(self, user_id: int, group_id: int, hours: int = 24):
+        raise NotImplementedError
+
+    @abstractmethod
+    def is_user_muted(self, user_id: int, group_id: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def unmute_user(self, user_id: int, group_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_muted_users(self, group_id: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_allowed_group(self, group_id: int, group_name: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_allowed_groups(self) -> set:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_allowed_group(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_allowed_groups(self) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_nudge_time(self, group_id: int, nudge_time: Optional[str]) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_nudge_times(self) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_nudge_time(self, group_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_members_without_target(self, group_id: int, date: datetime = None) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_live_board(self, group_id: int, enabled: bool) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_live_board(self, group_id: int) -> Optional[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_live_board_message(self, group_id: int, message_id: int, date: datetime):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_live_board_post(self, group_id: int, date: datetime, stale_message_id: int = None) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_trigger(self, group_id: int, keyword: str, response: str, cooldown: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def remove_trigger(self, group_id: int, keyword: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_triggers(self, group_id: int) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_leaderboard(self, group_id: int, period: str, limit: int = 10) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_weekly_digest(self, group_id: int, since: datetime, limit: int = 3) -> Dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_digest(self, group_id: int, round_at: datetime) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job_state(self, name: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_job(self, name: str, now: datetime, next_run: datetime, owner: str, lease_seconds: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def release_job(self, name: str, owner: str, now: datetime):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_job_state(self, name: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_persisted(self, kind: str, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_persisted(self, entries: List[Tuple[str, str, Optional[bytes]]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_archive_collections(self, collection: str) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def archive_old_data(self, horizon_days: int = None, batch_size: int = 1000) -> Dict[str, int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_target_stats(self, user_id: int, group_id: int, include_archive: bool = False) -> Dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_group_documents(self, collection: str, group_id: int, fields: List[str], batch_size: int = 500):
+        raise NotImplementedError
+
+    @abstractmethod
+    def reset_all_data(self, group_id: int, batch_size: int = 1000, progress=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError
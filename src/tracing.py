@@ -0,0 +1,204 @@
+"""
+Per-update tracing: a root span per update with child spans for storage and Telegram API calls,
+sampled into a rotating file of OTLP JSON (one ExportTraceServiceRequest per line)
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from telegram.request import HTTPXRequest
+
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = 3
+# Fraction of updates whose trace is written; updates slower than TRACE_SLOW_MS are always written
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "2000"))
+SERVICE_NAME = "telegram-target-bot"
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+_current_span = ContextVar("current_span", default=None)
+_export_logger = None
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start", "end", "attributes", "error")
+
+    def __init__(self, trace, name: str, kind: int, parent_id, attributes: dict):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.error = None
+        self.start = time.time_ns()
+        self.end = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start),
+            "endTimeUnixNano": str(self.end),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+class Trace:
+    """All spans of one update. It is exported when its last open span ends, so spans
+    of non-blocking handlers still running when process_update returns are included;
+    spans that only start after the export are dropped.
+    """
+
+    __slots__ = ("trace_id", "sampled", "spans", "open_spans", "root", "exported", "_lock")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        self.spans = []
+        self.open_spans = 0
+        self.root = None
+        self.exported = False
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, kind: int, parent_id, attributes: dict) -> Span:
+        span = Span(self, name, kind, parent_id, attributes)
+        with self._lock:
+            self.open_spans += 1
+        return span
+
+    def end_span(self, span: Span):
+        span.end = time.time_ns()
+        with self._lock:
+            self.open_spans -= 1
+            if self.exported:
+                return
+            self.spans.append(span)
+            finished = self.exported = self.open_spans == 0
+        if finished:
+            self._export()
+
+    def _export(self):
+        duration_ms = (self.root.end - self.root.start) / 1e6
+        if not self.sampled and duration_ms < TRACE_SLOW_MS:
+            return
+        _exporter().info(json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for span in self.spans],
+                }],
+            }],
+        }))
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _exporter() -> logging.Logger:
+    """Logger that appends finished traces to TRACE_FILE from a background thread"""
+    global _export_logger
+    if _export_logger is None:
+        file_handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS)
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        trace_queue = queue.SimpleQueue()
+        QueueListener(trace_queue, file_handler).start()
+
+        export_logger = logging.getLogger(f"{__name__}.export")
+        export_logger.handlers[:] = [QueueHandler(trace_queue)]
+        export_logger.setLevel(logging.INFO)
+        export_logger.propagate = False
+        _export_logger = export_logger
+    return _export_logger
+
+
+def current_trace_id():
+    """Trace id of the update being handled, or None"""
+    current = _current_span.get()
+    return current.trace.trace_id if current else None
+
+
+@contextmanager
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+    """Child span of the current span; a no-op outside a traced update"""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.trace.start_span(name, kind, parent.span_id, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        parent.trace.end_span(child)
+
+
+@contextmanager
+def trace_update(update):
+    """Root span of one update"""
+    trace = Trace()
+    attributes = {"update.id": getattr(update, "update_id", 0)}
+    chat = getattr(update, "effective_chat", None)
+    if chat:
+        attributes["chat.id"] = chat.id
+    message = getattr(update, "effective_message", None)
+    if message and message.text and message.text.startswith("/"):
+        attributes["command"] = message.text.split(maxsplit=1)[0]
+
+    root = trace.root = trace.start_span("update", SPAN_KIND_SERVER, None, attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.error = repr(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.end_span(root)
+
+
+class TracedRequest(HTTPXRequest):
+    """Bot API request that records each call as a client span of the current update"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        with span(f"telegram.{url.rsplit('/', 1)[-1]}", SPAN_KIND_CLIENT) as current:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            if current:
+                current.set_attribute("http.status_code", code)
+            return code, payload
@@ -0,0 +1,212 @@
+"""
+Per-group keyword triggers matched with an Aho-Corasick automaton
+"""
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+from collections import deque
+import os
+import time
+
+from src.database import db
+from src.gate import update_gate
+from src.utils import is_admin
+
+# Default seconds between two replies of the same trigger in a group
+DEFAULT_TRIGGER_COOLDOWN = int(os.getenv("DEFAULT_TRIGGER_COOLDOWN", "300"))
+
+# Built into every group, next to its own triggers; a group can replace or delete them
+DEFAULT_TRIGGERS = [
+    {"keyword": keyword, "response": "🎯 Don't forget to set your daily target with /addtarget !", "cooldown": DEFAULT_TRIGGER_COOLDOWN}
+    for keyword in ["target", "goal", "task", "todo"]
+]
+# Response stored for a deleted default trigger, so it stays off in that group
+DISABLED_RESPONSE = ""
+
+_matchers = {}
+_last_fired = {}
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton: one pass over the text finds every keyword,
+    whatever the number of keywords."""
+
+    def __init__(self, triggers):
+        self.triggers = {trigger["keyword"]: trigger for trigger in triggers}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for keyword in self.triggers:
+            state = 0
+            for char in keyword:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state].append(keyword)
+
+        # Breadth-first failure links; outputs inherit their fallback's outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                # Children of the root always fall back to the root
+                self._fail[child] = self._goto[fallback].get(char, 0) if state else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str):
+        """Yield the triggers whose keyword occurs in text, in order of appearance"""
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                yield self.triggers[keyword]
+
+
+def _group_triggers(group_id: int):
+    """The default triggers, overridden or disabled by the group's own"""
+    triggers = {trigger["keyword"]: trigger for trigger in DEFAULT_TRIGGERS}
+    triggers.update((trigger["keyword"], trigger) for trigger in db.get_triggers(group_id))
+    return [trigger for trigger in triggers.values() if trigger["response"] != DISABLED_RESPONSE]
+
+
+def get_matcher(group_id: int) -> KeywordMatcher:
+    """Get the compiled matcher of a group, building it on first use"""
+    matcher = _matchers.get(group_id)
+    if matcher is None:
+        matcher = _matchers[group_id] = KeywordMatcher(_group_triggers(group_id))
+    return matcher
+
+
+def invalidate_triggers(group_id: int):
+    """Drop a group's compiled matcher so the next message rebuilds it"""
+    _matchers.pop(group_id, None)
+
+
+def _on_invalidation(message: dict):
+    """Drop matchers made stale by trigger edits or resets on another replica"""
+    if message.get("kind") in ("triggers", "group"):
+        invalidate_triggers(message.get("group_id"))
+    elif message.get("kind") == "all":
+        _matchers.clear()
+
+
+db.shared_cache.subscribe(_on_invalidation)
+
+
+async def reply_to_triggers(update: Update):
+    """Reply with the first matching trigger that is not cooling down"""
+    group_id = update.message.chat.id
+    now = time.monotonic()
+
+    for trigger in get_matcher(group_id).find(update.message.text.lower()):
+        key = (group_id, trigger["keyword"])
+        if now - _last_fired.get(key, float("-inf")) < trigger.get("cooldown", DEFAULT_TRIGGER_COOLDOWN):
+            continue
+        _last_fired[key] = now
+        await update.message.reply_text(trigger["response"])
+        return
+
+
+async def add_trigger_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Add a keyword trigger (admin only)"""
+    if not update.message:
+        return
+
+    group_id = update.message.chat.id
+
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+
+    # Check if user is admin
+    if not await is_admin(update, context):
+        await update.message.reply_text("🚫 This command is for admins only!")
+        return
+
+    keyword, _, response = " ".join(context.args).partition("|")
+    keyword, response = keyword.strip().lower(), response.strip()
+    if not keyword or not response:
+        await update.message.reply_text(
+            "❌ Usage: /addtrigger <keyword> | <response>\n"
+            "Example: /addtrigger workout | 💪 Log it with /addtarget !"
+        )
+        return
+
+    if db.add_trigger(group_id, keyword, response, DEFAULT_TRIGGER_COOLDOWN):
+        invalidate_triggers(group_id)
+        await update.message.reply_text(f"✅ Trigger added for \"{keyword}\"")
+    else:
+        await update.message.reply_text("❌ Failed to add trigger.")
+
+
+async def remove_trigger_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Remove a keyword trigger (admin only)"""
+    if not update.message:
+        return
+
+    group_id = update.message.chat.id
+
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+
+    # Check if user is admin
+    if not await is_admin(update, context):
+        await update.message.reply_text("🚫 This command is for admins only!")
+        return
+
+    if not context.args:
+        await update.message.reply_text("❌ Usage: /deltrigger <keyword>")
+        return
+
+    keyword = " ".join(context.args).strip().lower()
+    if any(trigger["keyword"] == keyword for trigger in DEFAULT_TRIGGERS):
+        # A default can't be deleted, only disabled for this group
+        removed = keyword in get_matcher(group_id).triggers and db.add_trigger(group_id, keyword, DISABLED_RESPONSE, 0)
+    else:
+        removed = db.remove_trigger(group_id, keyword)
+    if removed:
+        invalidate_triggers(group_id)
+        await update.message.reply_text(f"🗑️ Trigger \"{keyword}\" removed")
+    else:
+        await update.message.reply_text(f"📭 No trigger for \"{keyword}\"")
+
+
+async def list_triggers_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List the group's keyword triggers"""
+    if not update.message:
+        return
+
+    group_id = update.message.chat.id
+
+    # Check if group is allowed
+    if not update_gate(update, context).group_allowed:
+        await update.message.reply_text("🚫 This bot is not authorized to work in this group!")
+        return
+
+    triggers = get_matcher(group_id).triggers.values()
+    if not triggers:
+        await update.message.reply_text("📭 No keyword triggers in this group.")
+        return
+    message = "🔔 Keyword Triggers\n\n" + "\n".join(
+        f"• {trigger['keyword']} → {trigger['response']}" for trigger in triggers
+    )
+    await update.message.reply_text(message)
+
+
+def setup_trigger_handlers(application):
+    """Setup keyword trigger handlers"""
+    application.add_handler(CommandHandler("addtrigger", add_trigger_command))
+    application.add_handler(CommandHandler("deltrigger", remove_trigger_command))
+    application.add_handler(CommandHandler("triggers", list_triggers_command))
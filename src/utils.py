@@ -4,6 +4,30 @@ Utility functions for the bot
 from telegram import Update
 from telegram.ext import ContextTypes
 from datetime import datetime
+import asyncio
+import logging
+import os
+
+from src.cache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Chat administrators change rarely; cache them (shared by all replicas) instead of asking Telegram on every admin command
+ADMIN_CACHE_TTL = int(os.getenv("ADMIN_CACHE_TTL", "300"))
+# Telegram rejects messages over 4096 UTF-16 code units; pages stay below that, leaving room for a title
+TARGETS_PAGE_BUDGET = 3800
+
+async def get_admin_ids(bot, chat_id: int) -> set:
+    """Get the ids of a chat's administrators, cached for ADMIN_CACHE_TTL seconds."""
+    # The shared cache may be Redis: keep its socket calls off the event loop
+    cached = await asyncio.to_thread(shared_cache.get, f"admins:{chat_id}")
+    if cached is not None:
+        return set(cached)
+    
+    admins = await bot.get_chat_administrators(chat_id)
+    admin_ids = {admin.user.id for admin in admins}
+    await asyncio.to_thread(shared_cache.set, f"admins:{chat_id}", sorted(admin_ids), ttl=ADMIN_CACHE_TTL)
+    return admin_ids
 
 async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if the user is an admin in the chat."""
@@ -14,21 +38,30 @@ async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
         user_id = update.message.from_user.id
         chat_id = update.message.chat.id
         
-        # Get chat administrators
-        admins = await context.bot.get_chat_administrators(chat_id)
-        
         # Check if user is in admin list
-        return any(admin.user.id == user_id for admin in admins)
+        return user_id in await get_admin_ids(context.bot, chat_id)
     except Exception as e:
-        print(f"Error checking admin status: {e}")
+        logger.error(f"Error checking admin status: {e}")
         return False
 
-def format_targets_message(targets) -> str:
-    """Format targets list into a readable message."""
+def _text_size(text: str) -> int:
+    """Length of text as Telegram counts it against the message limit (UTF-16 code units)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _fit(line: str, limit: int) -> str:
+    """Shorten a single overlong line so it fits on a page by itself"""
+    if _text_size(line) <= limit:
+        return line
+    while _text_size(line) > limit - 2:
+        line = line[:max(len(line) - (_text_size(line) - limit) - 2, 0)]
+    return line + "…\n"
+
+
+def format_targets_pages(targets) -> list:
+    """Format targets into pages that each fit in one Telegram message."""
     if not targets:
-        return "📭 No targets set for today!"
-    
-    message = "🎯 *Today's Targets*\n\n"
+        return ["📭 No targets set for today!"]
     
     completed = []
     pending = []
@@ -39,28 +72,60 @@ def format_targets_message(targets) -> str:
         else:
             pending.append(target)
     
-    if pending:
-        message += "⏳ *Pending:*\n"
-        for i, target in enumerate(pending, 1):
-            message += f"{i}. @{target['username']}: {target['target']}\n"
-        message += "\n"
-    
-    if completed:
-        message += "✅ *Completed:*\n"
-        for i, target in enumerate(completed, 1):
-            completion_time = target.get('completed_at', datetime.now())
-            if isinstance(completion_time, datetime):
-                time_str = completion_time.strftime("%H:%M")
-            else:
-                time_str = "N/A"
-            message += f"{i}. @{target['username']}: {target['target']} ({time_str})\n"
+    sections = [
+        ("⏳ *Pending:*\n", [f"{i}. @{target['username']}: {target['target']}\n" for i, target in enumerate(pending, 1)]),
+        ("✅ *Completed:*\n", [
+            f"{i}. @{target['username']}: {target['target']} ({_completion_time(target)})\n"
+            for i, target in enumerate(completed, 1)
+        ]),
+    ]
     
     total = len(targets)
     completed_count = len(completed)
+    header = "🎯 *Today's Targets*\n\n"
+    footer = f"\n📊 *Progress:* {completed_count}/{total} completed ({int(completed_count/total*100 if total > 0 else 0)}%)"
+    budget = TARGETS_PAGE_BUDGET - _text_size(header) - _text_size(footer)
     
-    message += f"\n📊 *Progress:* {completed_count}/{total} completed ({int(completed_count/total*100 if total > 0 else 0)}%)"
+    # Stream entries into pages; a section title is repeated on each page the section continues on
+    pages = []
+    parts, used, page_title = [], 0, None
+    for title, lines in sections:
+        for line in lines:
+            line = _fit(line, budget - _text_size(title))
+            needed = _text_size(line)
+            if title != page_title:
+                needed += _text_size(title) + (1 if parts else 0)
+            if parts and used + needed > budget:
+                pages.append(parts)
+                parts, used, page_title = [], 0, None
+                needed = _text_size(title) + _text_size(line)
+            if title != page_title:
+                if parts:
+                    parts.append("\n")
+                parts.append(title)
+                page_title = title
+            parts.append(line)
+            used += needed
+    pages.append(parts)
     
-    return message
+    if len(pages) == 1:
+        return [header + "".join(pages[0]) + footer]
+    return [
+        header + "".join(parts) + footer + f"\n📄 Page {number}/{len(pages)}"
+        for number, parts in enumerate(pages, 1)
+    ]
+
+
+def _completion_time(target) -> str:
+    completion_time = target.get('completed_at', datetime.now())
+    if isinstance(completion_time, datetime):
+        return completion_time.strftime("%H:%M")
+    return "N/A"
+
+
+def format_targets_message(targets) -> str:
+    """Format targets list into a readable message (its first page, for very large groups)."""
+    return format_targets_pages(targets)[0]
 
 def validate_target_text(text: str, max_length: int = 500) -> tuple[bool, str]:
     """Validate target text."""
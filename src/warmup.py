@@ -0,0 +1,65 @@
+"""
+Startup warmup: fill caches before the first update is handled (indexes are ensured when the database connects)
+"""
+import asyncio
+import logging
+import time
+
+from src.database import db
+from src.utils import get_admin_ids
+
+logger = logging.getLogger(__name__)
+
+
+async def _timed(timings: dict, name: str, awaitable):
+    """Await a warmup step and record how long it took"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    except Exception as e:
+        logger.warning(f"⚠️ Warmup step '{name}' failed: {e}")
+        return None
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
+async def _warm_group(timings: dict, bot, group_id: int):
+    """Pre-warm the admin and membership caches of one group"""
+    await asyncio.gather(
+        _timed(timings, f"admins {group_id}", get_admin_ids(bot, group_id)),
+        _timed(timings, f"members {group_id}", asyncio.to_thread(db.load_verified_members, group_id)),
+    )
+
+
+async def warmup(application):
+    """post_init hook: fetch bot identity, load groups and warm caches concurrently"""
+    started = time.perf_counter()
+    timings = {}
+    bot = application.bot
+
+    me, groups = await asyncio.gather(
+        # get_me() refreshes the identity the bot caches, so bot.username needs no API call later
+        _timed(timings, "bot identity", bot.get_me()),
+        _timed(timings, "authorized groups", asyncio.to_thread(db.get_allowed_groups)),
+    )
+    if groups is None:
+        groups = []  # Registry stays unloaded and is fetched on first use
+    else:
+        db.allowed_groups = {group["group_id"] for group in groups}
+
+    await asyncio.gather(*(_warm_group(timings, bot, group["group_id"]) for group in groups))
+
+    logger.info(
+        f"🔥 Warmup finished in {time.perf_counter() - started:.2f}s",
+        extra={
+            "step_ms": {name: round(seconds * 1000) for name, seconds in timings.items()},
+            "index_ms": {collection: round(seconds * 1000) for collection, seconds in db.index_timings.items()},
+        }
+    )
+    if me:
+        logger.info(f"✅ Bot: @{me.username}")
+    if groups:
+        for group in groups:
+            logger.info(f"✅ Authorized Group: {group['group_name']} (ID: {group['group_id']})")
+    else:
+        logger.warning("⚠️ No group authorized yet. Bot will work in the first group it's added to.")
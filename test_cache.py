@@ -0,0 +1,227 @@
+"""
+Tests of the Redis shared cache against a minimal in-process RESP server
+"""
+import json
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+from src import cache
+from src.cache import REPLICA_ID, RedisCache
+
+
+class FakeRedis(socketserver.ThreadingTCPServer):
+    """Enough of Redis for RedisCache: GET, SET [EX], DEL, PUBLISH and SUBSCRIBE"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+        self.ttls = {}
+        self.published = []
+        self.subscribers = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def publish(self, channel: bytes, payload: bytes) -> int:
+        with self.lock:
+            self.published.append((channel, payload))
+            subscribers = [handler for handler in self.subscribers if channel in handler.channels]
+        for handler in subscribers:
+            handler.write([b"message", channel, payload])
+        return len(subscribers)
+
+    def drop_subscribers(self):
+        """Close every subscriber connection, like a Redis restart"""
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        for handler in subscribers:
+            handler.request.shutdown(socket.SHUT_RDWR)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.channels = set()
+        self.write_lock = threading.Lock()
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def write(self, reply):
+        with self.write_lock:
+            self.wfile.write(self.encode(reply))
+
+    def encode(self, reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, str):
+            return b"+%s\r\n" % reply.encode()
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(self.encode(item) for item in reply)
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                args = self.read_command()
+            except OSError:
+                return
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == b"GET":
+                self.write(server.data.get(args[1]))
+            elif command == b"SET":
+                server.data[args[1]] = args[2]
+                if len(args) > 4 and args[3].upper() == b"EX":
+                    server.ttls[args[1]] = int(args[4])
+                self.write("OK")
+            elif command == b"DEL":
+                self.write(int(server.data.pop(args[1], None) is not None))
+            elif command == b"PUBLISH":
+                self.write(server.publish(args[1], args[2]))
+            elif command == b"SUBSCRIBE":
+                self.channels.add(args[1])
+                with server.lock:
+                    server.subscribers.append(self)
+                self.write([b"subscribe", args[1], 1])
+            elif command == b"SELECT":
+                self.write("OK")
+            else:
+                with self.write_lock:
+                    self.wfile.write(b"-ERR unknown command\r\n")
+
+
+def wait_for(predicate, timeout: float = 3):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def server():
+    server = FakeRedis()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(cache, "SUBSCRIBE_RETRY_DELAY", 0.05)
+    monkeypatch.setattr(cache, "REDIS_TIMEOUT", 0.2)
+
+
+def test_get_set_delete(server):
+    shared = RedisCache(server.url, prefix="test:")
+
+    assert shared.get("missing") is None
+    shared.set("admins:1", [1, 2], ttl=300)
+    assert server.data[b"test:admins:1"] == b"[1, 2]"
+    assert server.ttls[b"test:admins:1"] == 300
+    assert shared.get("admins:1") == [1, 2]
+
+    shared.delete("admins:1")
+    assert shared.get("admins:1") is None
+
+
+def test_publish_tags_origin(server):
+    shared = RedisCache(server.url, channel="test:invalidate")
+
+    shared.publish({"kind": "target", "group_id": 1, "user_id": 2})
+
+    channel, payload = server.published[-1]
+    assert channel == b"test:invalidate"
+    assert json.loads(payload) == {"kind": "target", "group_id": 1, "user_id": 2, "origin": REPLICA_ID}
+
+
+def test_listener_ignores_own_replica(server):
+    shared = RedisCache(server.url, channel="test:invalidate")
+    received = []
+    shared.subscribe(received.append)
+    assert wait_for(lambda: server.subscribers)
+
+    server.publish(b"test:invalidate", json.dumps({"kind": "allowed", "origin": REPLICA_ID}).encode())
+    server.publish(b"test:invalidate", json.dumps({"kind": "group", "group_id": 1, "origin": "other"}).encode())
+
+    assert wait_for(lambda: received)
+    time.sleep(0.05)
+    assert received == [{"kind": "group", "group_id": 1, "origin": "other"}]
+
+
+def test_resubscribe_drops_everything(server):
+    shared = RedisCache(server.url, channel="test:invalidate")
+    received = []
+    shared.subscribe(received.append)
+    assert wait_for(lambda: server.subscribers)
+    assert received == []
+
+    # Messages published while disconnected are lost, so listeners must drop all their entries
+    server.drop_subscribers()
+    assert wait_for(lambda: received)
+    assert received == [{"kind": "all"}]
+    assert wait_for(lambda: server.subscribers)
+
+
+def test_unresponsive_server_is_skipped():
+    # Accepts connections but never replies
+    silent = socket.socket()
+    silent.bind(("127.0.0.1", 0))
+    silent.listen()
+    shared = RedisCache(f"redis://127.0.0.1:{silent.getsockname()[1]}/0")
+    try:
+        started = time.monotonic()
+        assert shared.get("admins:1") is None
+        assert time.monotonic() - started < 1
+
+        # Backing off: no more round trips until REDIS_FAILURE_BACKOFF has passed
+        started = time.monotonic()
+        shared.set("admins:1", [1])
+        shared.publish({"kind": "all"})
+        assert shared.get("admins:1") is None
+        assert time.monotonic() - started < 0.05
+    finally:
+        silent.close()
+
+
+def test_recovers_after_backoff(server, monkeypatch):
+    monkeypatch.setattr(cache, "REDIS_FAILURE_BACKOFF", 0.1)
+    refused = socket.socket()
+    refused.bind(("127.0.0.1", 0))
+    port = refused.getsockname()[1]
+    refused.close()
+
+    shared = RedisCache(f"redis://127.0.0.1:{port}/0")
+    assert shared.get("key") is None
+
+    shared.url = server.url
+    assert shared.get("key") is None  # Still backing off
+    server.data[b"studybot:key"] = b"1"
+    time.sleep(0.15)
+    assert shared.get("key") == 1
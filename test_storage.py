@@ -0,0 +1,169 @@
+"""
+Contract tests of the storage backends: every test runs against a fresh SQLite file,
+and against MongoDB too when MONGODB_TEST_URI points at a server
+"""
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.storage import STREAK_PERIOD, leaderboard_period
+
+GROUP = -100
+OTHER_GROUP = -200
+ALICE = 1
+BOB = 2
+
+
+def _day(days_ago: int = 0) -> datetime:
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+
+
+@pytest.fixture(params=["sqlite", "mongodb"])
+def storage(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "bot.db"))
+        from src.sqlite_backend import SQLiteDB
+        backend = SQLiteDB()
+        yield backend
+        backend.close()
+        return
+
+    uri = os.getenv("MONGODB_TEST_URI")
+    if not uri:
+        pytest.skip("MONGODB_TEST_URI is not set")
+    monkeypatch.setenv("MONGODB_URI", uri)
+    monkeypatch.setenv("DB_NAME", f"bot_test_{uuid.uuid4().hex[:12]}")
+    from src.database import MongoDB
+    backend = MongoDB()
+    yield backend
+    backend.client.drop_database(backend.db_name)
+    backend.close()
+
+
+def test_targets(storage):
+    assert storage.add_target(GROUP, ALICE, "alice", "Run 5k")
+    assert storage.get_today_target(ALICE)["target"] == "Run 5k"
+    assert [target["username"] for target in storage.get_all_targets(GROUP)] == ["alice"]
+
+    completed = storage.mark_target_completed(ALICE, group_id=GROUP)
+    assert completed["completed"]
+    assert storage.get_today_target(ALICE)["completed"]
+
+    # Replacing a target starts it over
+    assert storage.add_target(GROUP, ALICE, "alice", "Read a chapter")
+    target = storage.get_today_target(ALICE)
+    assert target["target"] == "Read a chapter" and not target["completed"]
+    assert storage.mark_target_completed(BOB, group_id=GROUP) is None
+
+
+def test_leaderboard_streak_across_weeks(storage):
+    # Three days in a row, the last one in the next ISO week
+    days = [_day(2), _day(1), _day(0)]
+    while days[-1].isocalendar()[1] == days[0].isocalendar()[1]:
+        days = [day - timedelta(days=1) for day in days]
+    for day in days:
+        storage.add_target(GROUP, ALICE, "alice", "Stretch", date=day)
+        storage.mark_target_completed(ALICE, date=day, group_id=GROUP)
+
+    [entry] = storage.get_leaderboard(GROUP, leaderboard_period("week", days[-1]))
+    assert (entry["user_id"], entry["targets_set"], entry["completed"], entry["streak"]) == (ALICE, 1, 1, 3)
+    assert storage.get_leaderboard(GROUP, STREAK_PERIOD)[0]["streak"] == 3
+
+    # Replacing the last completed target takes its completion and streak day back
+    storage.add_target(GROUP, ALICE, "alice", "Stretch longer", date=days[-1])
+    [entry] = storage.get_leaderboard(GROUP, leaderboard_period("week", days[-1]))
+    assert (entry["targets_set"], entry["completed"], entry["streak"]) == (1, 0, 2)
+    assert storage.get_leaderboard(OTHER_GROUP, leaderboard_period("week", days[-1])) == []
+
+
+def test_sentences_search_and_likes(storage):
+    sentence_id = storage.add_sentence(GROUP, ALICE, "alice", "Running every morning clears the mind")
+    storage.add_sentence(GROUP, BOB, "bob", "Reading before bed helps me sleep")
+    storage.add_sentence(OTHER_GROUP, BOB, "bob", "Running in another group")
+
+    results, has_more = storage.search_sentences(GROUP, "running")
+    assert [result["username"] for result in results] == ["alice"] and not has_more
+    assert storage.search_sentences(GROUP, "   ") == ([], False)
+
+    assert storage.like_sentence(sentence_id, BOB) is True
+    assert storage.get_sentence_likes(sentence_id) == 1
+    assert storage.like_sentence(sentence_id, BOB) is False
+    assert storage.get_sentence_likes(sentence_id) == 0
+
+
+def test_registrations(storage):
+    assert storage.register_new_members(GROUP, [(ALICE, "alice"), (BOB, "bob")])
+    assert {entry["user_id"] for entry in storage.get_pending_registrations(GROUP)} == {ALICE, BOB}
+    assert storage.is_user_muted(ALICE, GROUP)
+
+    assert storage.verify_registration(ALICE, GROUP)
+    assert storage.get_verified_user_ids(GROUP, [ALICE, BOB]) == {ALICE}
+    assert storage.is_user_verified(ALICE, GROUP)
+    assert not storage.is_user_muted(ALICE, GROUP)
+    assert [entry["user_id"] for entry in storage.get_pending_registrations(GROUP)] == [BOB]
+    assert not storage.verify_registration(ALICE, OTHER_GROUP)
+
+
+def test_claim_and_release_job(storage):
+    # Naive UTC, as the job store keeps it; whole seconds survive every backend's precision
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    next_run = now + timedelta(hours=1)
+
+    assert storage.claim_job("nightly", now, next_run, "replica-a", 60)
+    # The occurrence is taken: the schedule moved past it
+    assert not storage.claim_job("nightly", now, next_run, "replica-b", 60)
+    storage.release_job("nightly", "replica-a", now)
+    state = storage.get_job_state("nightly")
+    assert (state["next_run"], state["last_run"]) == (next_run, now)
+
+    # Due again, but another replica still holds the lease
+    assert storage.claim_job("nightly", next_run, next_run, "replica-b", 60)
+    assert not storage.claim_job("nightly", next_run + timedelta(seconds=10), next_run, "replica-a", 60)
+    # Releasing someone else's lease changes nothing
+    storage.release_job("nightly", "replica-a", next_run)
+    assert storage.get_job_state("nightly")["last_run"] == now
+
+    storage.delete_job_state("nightly")
+    assert storage.get_job_state("nightly") is None
+
+
+def test_claim_digest(storage):
+    storage.set_allowed_group(GROUP, "Group")
+    week = datetime(2026, 10, 18, 18)
+    assert storage.claim_digest(GROUP, week)
+    assert not storage.claim_digest(GROUP, week)
+    assert storage.claim_digest(GROUP, week + timedelta(weeks=1))
+
+
+def test_archive_and_stats(storage):
+    old = _day(200)
+    storage.add_target(GROUP, ALICE, "alice", "Old target", date=old)
+    storage.mark_target_completed(ALICE, date=old, group_id=GROUP)
+    storage.add_target(GROUP, ALICE, "alice", "New target")
+
+    moved = storage.archive_old_data(horizon_days=90)
+    assert moved["targets"] == 1
+
+    stats = storage.get_target_stats(ALICE, GROUP)
+    assert (stats["total"], stats["completed"]) == (1, 0)
+    stats = storage.get_target_stats(ALICE, GROUP, include_archive=True)
+    assert (stats["total"], stats["completed"], stats["first_date"]) == (2, 1, old)
+
+
+def test_reset_all_data(storage):
+    storage.set_allowed_group(GROUP, "Group")
+    storage.add_target(GROUP, ALICE, "alice", "Run")
+    storage.add_target(OTHER_GROUP, BOB, "bob", "Swim")
+    storage.add_sentence(GROUP, ALICE, "alice", "Keep going")
+    storage.register_new_members(GROUP, [(BOB, "bob")])
+
+    deleted = {}
+    assert storage.reset_all_data(GROUP, progress=lambda collection, count: deleted.__setitem__(collection, count))
+    assert (deleted["targets"], deleted["sentences"], deleted["registrations"]) == (1, 1, 1)
+
+    assert storage.get_all_targets(GROUP) == []
+    assert storage.get_pending_registrations(GROUP) == []
+    assert storage.get_today_target(ALICE) is None
+    assert [target["username"] for target in storage.get_all_targets(OTHER_GROUP)] == ["bob"]